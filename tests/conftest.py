@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# A fake `wg` for SandboxTransport roots: keys are random base64, pubkey is a hash of
+# the private key (not X25519, but stable), show/set/syncconf succeed quietly.
+FAKE_WG = """#!/usr/bin/env python3
+import base64, hashlib, os, sys
+a = sys.argv[1:]
+if a[:1] in (["genkey"], ["genpsk"]):
+    print(base64.b64encode(os.urandom(32)).decode())
+elif a[:1] == ["pubkey"]:
+    print(base64.b64encode(hashlib.sha256(sys.stdin.read().strip().encode()).digest()).decode())
+elif a[:1] == ["show"]:
+    sys.exit("Unable to access interface: No such device")
+"""
+
+
+@pytest.fixture
+def sandbox(tmp_path):
+    """A SandboxTransport root with an empty /etc/wireguard and the fake wg in bin/."""
+    from wireme import transport
+
+    (tmp_path / "etc" / "wireguard").mkdir(parents=True)
+    (tmp_path / "bin").mkdir()
+    wg = tmp_path / "bin" / "wg"
+    wg.write_text(FAKE_WG)
+    wg.chmod(0o755)
+    return transport.SandboxTransport(tmp_path)
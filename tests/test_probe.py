@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import struct
+
+from wireme import crypto, probe
+
+
+class Responder(asyncio.DatagramProtocol):
+    """
+    Local UDP stand-in for a WireGuard server: answers every initiation-shaped
+    datagram with a response-shaped one after `delay` seconds (None: never answers).
+    With wrong_index the reply names another sender, which a prober must ignore.
+    """
+
+    def __init__(self, delay: float | None = 0.0, wrong_index: bool = False):
+        self.delay = delay
+        self.wrong_index = wrong_index
+        self.transport = None
+        self.seen = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) != 148 or data[0] != 1:
+            return
+        self.seen += 1
+        if self.delay is None:
+            return
+        sender = struct.unpack_from("<I", data, 4)[0] ^ (1 if self.wrong_index else 0)
+        reply = struct.pack("<BxxxII", 2, int.from_bytes(os.urandom(4), "little"), sender) + b"\x00" * 80
+        if self.delay:
+            asyncio.get_running_loop().call_later(self.delay, self.transport.sendto, reply, addr)
+        else:
+            self.transport.sendto(reply, addr)
+
+
+async def _serve(**kw) -> tuple[asyncio.DatagramTransport, Responder, str]:
+    loop = asyncio.get_running_loop()
+    tr, proto = await loop.create_datagram_endpoint(lambda: Responder(**kw), local_addr=("127.0.0.1", 0))
+    host, port = tr.get_extra_info("sockname")[:2]
+    return tr, proto, f"{host}:{port}"
+
+
+KEYS = (crypto.genkey(), crypto.pubkey(crypto.genkey()))
+
+
+def test_probe_endpoint_measures_rtt():
+    async def go():
+        tr, proto, ep = await _serve(delay=0.05)
+        try:
+            return await probe.probe_all([ep], *KEYS, timeout=1.0, tries=2), proto.seen, ep
+        finally:
+            tr.close()
+
+    (res,), seen, ep = asyncio.run(go())
+    assert seen == 2
+    assert res["addr"] == ep and res["error"] == ""
+    assert 50 <= res["rtt_ms"] < 500
+
+
+def test_probe_endpoint_without_reply():
+    async def go():
+        silent, _, ep_silent = await _serve(delay=None)
+        wrong, proto, ep_wrong = await _serve(wrong_index=True)
+        try:
+            return await probe.probe_all([ep_silent, ep_wrong], *KEYS, timeout=0.2, tries=1), proto.seen
+        finally:
+            silent.close()
+            wrong.close()
+
+    results, seen = asyncio.run(go())
+    assert seen == 1  # it answered, but for another sender index
+    for res in results:
+        assert res["rtt_ms"] is None and res["error"] == "no reply"
+
+
+def test_probe_all_and_pick_best_switch_to_the_faster_server():
+    async def go():
+        fast, _, ep_fast = await _serve(delay=0.0)
+        slow, _, ep_slow = await _serve(delay=0.15)
+        try:
+            return await probe.probe_all([ep_slow, ep_fast], *KEYS, timeout=1.0, tries=1), ep_fast, ep_slow
+        finally:
+            fast.close()
+            slow.close()
+
+    results, ep_fast, ep_slow = asyncio.run(go())
+    assert [r["endpoint"] for r in results] == [ep_slow, ep_fast]
+    assert probe.pick_best(results)["addr"] == ep_fast
+    # currently on the slow one: more than HYSTERESIS faster, so switch
+    assert probe.pick_best(results, current_addr=ep_slow)["addr"] == ep_fast
+
+
+def _res(addr: str, rtt: float | None) -> dict:
+    return {"endpoint": addr, "addr": addr, "rtt_ms": rtt, "error": "" if rtt is not None else "no reply"}
+
+
+def test_pick_best_hysteresis():
+    cur, other = "192.0.2.1:51820", "192.0.2.2:51820"
+    # 15% faster is inside the default 20% band: stay
+    assert probe.pick_best([_res(cur, 20.0), _res(other, 17.0)], current_addr=cur)["addr"] == cur
+    # 25% faster: switch
+    assert probe.pick_best([_res(cur, 20.0), _res(other, 15.0)], current_addr=cur)["addr"] == other
+    assert probe.pick_best([_res(cur, 20.0), _res(other, 17.0)], current_addr=cur, hysteresis=0.1)["addr"] == other
+    # the current endpoint did not answer: take the fastest that did
+    assert probe.pick_best([_res(cur, None), _res(other, 90.0)], current_addr=cur)["addr"] == other
+    # unknown current endpoint: plain fastest
+    assert probe.pick_best([_res(cur, 20.0), _res(other, 19.0)])["addr"] == other
+    assert probe.pick_best([_res(cur, None), _res(other, None)], current_addr=cur) is None
+
+
+def test_split_endpoint():
+    assert probe.split_endpoint("vpn.example.org:51820") == ("vpn.example.org", 51820)
+    assert probe.split_endpoint("[2001:db8::1]:443") == ("2001:db8::1", 443)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from wireme import backups, crypto, ops, transport, wg
+
+CONF = Path("/etc/wireguard/wg0.conf")
+
+
+def test_sandbox_maps_absolute_paths_under_root(sandbox):
+    t = sandbox
+    t.write_atomic(CONF, b"[Interface]\n", mode=0o640)
+    real = t.root / "etc" / "wireguard" / "wg0.conf"
+    assert t.local_path(CONF) == real
+    assert real.read_bytes() == b"[Interface]\n"
+    assert t.read_bytes(CONF) == b"[Interface]\n"
+    assert t.mode(CONF) == 0o640
+    assert t.exists(CONF) and not t.exists(Path("/etc/wireguard/wg1.conf"))
+    assert t.glob(Path("/etc/wireguard"), "*.conf") == [CONF]
+    # a rewrite keeps the mode and moves the signature even at the same size
+    sig = t.stat_sig(CONF)
+    time.sleep(0.01)
+    t.write_atomic(CONF, b"[Interface]\r")
+    assert t.mode(CONF) == 0o640
+    assert t.stat_sig(CONF) != sig and t.stat_sig(CONF)[1] == sig[1]
+    t.rename(CONF, Path("/etc/wireguard/wg1.conf"))
+    assert t.glob(Path("/etc/wireguard"), "*.conf") == [Path("/etc/wireguard/wg1.conf")]
+    t.unlink(Path("/etc/wireguard/wg1.conf"))
+    assert t.stat_sig(CONF) == (0, 0) and t.mode(CONF) is None
+
+
+def test_sandbox_runs_commands_from_its_bin(sandbox):
+    assert sandbox.have("wg")
+    rc, out, _ = sandbox.run(["wg", "pubkey"], input_text="abc\n")
+    assert rc == 0 and len(out) == 44
+    assert sandbox.run(["wg", "show", "wg0"])[0] != 0
+
+
+def test_using_is_per_thread(sandbox):
+    seen = {}
+    with transport.using(sandbox):
+        assert transport.current() is sandbox
+        th = threading.Thread(target=lambda: seen.setdefault("other", transport.current()))
+        th.start()
+        th.join()
+    assert seen["other"] is not sandbox
+    assert transport.current() is not sandbox
+
+
+def _holds_out(lock_a, lock_b) -> bool:
+    """While lock_a is held, lock_b must wait; it gets in right after lock_a is released."""
+    entered = threading.Event()
+
+    def second():
+        with lock_b():
+            entered.set()
+
+    with lock_a():
+        th = threading.Thread(target=second)
+        th.start()
+        blocked = not entered.wait(0.3)
+    th.join(5)
+    return blocked and entered.is_set()
+
+
+def test_lock_excludes(sandbox):
+    assert _holds_out(lambda: sandbox.lock(CONF), lambda: sandbox.lock(CONF))
+
+
+def test_add_peer_in_sandbox(sandbox):
+    sandbox.write_atomic(CONF, f"[Interface]\nAddress = 10.9.0.1/24\nListenPort = 51820\nPrivateKey = {crypto.genkey()}\n".encode())
+    with transport.using(sandbox):
+        ok, msg, info = ops.add_peer("wg0", "laptop", "auto", "vpn.example.org:51820")
+        assert ok, msg
+        _, peers, _ = wg.parse_conf(wg.conf_path("wg0"))
+    assert [(p["name"], p["AllowedIPs"], p["PublicKey"]) for p in peers] == [("laptop", "10.9.0.2/32", info["pub"])]
+    assert "PrivateKey" in info["client_text"] and "Endpoint = vpn.example.org:51820" in info["client_text"]
+    # the backup store lives under the sandbox root as well
+    assert sandbox.exists(backups.store_dir("wg0") / "index")
+
+
+needs_tools = pytest.mark.skipif(not all(shutil.which(c) for c in ("flock", "base64", "stat")), reason="needs flock, base64 and stat")
+
+
+@needs_tools
+def test_command_transport_matches_local(tmp_path):
+    # argv mode with a no-op prefix: the same shell snippets a remote host would run
+    cmd = transport.CommandTransport(["env"], name="env")
+    loc = transport.LocalTransport()
+    path = tmp_path / "wg0.conf"
+    cmd.write_atomic(path, b"\x00binary\nand text\n", mode=0o600)
+    assert loc.read_bytes(path) == cmd.read_bytes(path) == b"\x00binary\nand text\n"
+    assert cmd.mode(path) == loc.mode(path) == 0o600
+    assert cmd.stat_sig(path) == loc.stat_sig(path)  # nanoseconds, not whole seconds
+    assert cmd.glob(tmp_path, "*.conf") == loc.glob(tmp_path, "*.conf") == [path]
+    cmd.rename(path, tmp_path / "wg1.conf")
+    assert not cmd.exists(path) and loc.exists(tmp_path / "wg1.conf")
+    cmd.unlink(tmp_path / "wg1.conf")
+    assert cmd.stat_sig(path) == (0, 0)
+    with pytest.raises(OSError):
+        cmd.read_bytes(path)
+
+
+@needs_tools
+def test_command_lock_excludes_local_lock(tmp_path):
+    cmd = transport.CommandTransport(["env"], name="env")
+    loc = transport.LocalTransport()
+    path = tmp_path / "wg0.conf"
+    assert _holds_out(lambda: cmd.lock(path), lambda: loc.lock(path))
+    assert _holds_out(lambda: loc.lock(path), lambda: cmd.lock(path))
+    assert os.path.exists(tmp_path / ".wg0.conf.lock")
@@ -3,8 +3,17 @@ from __future__ import annotations
 import argparse
 import sys
 
-from . import __version__
-from .tui import run as run_tui
+from . import __version__, backups, cli, daemon, fleet, history, snapshot
+
+
+def _add_filter_args(p: argparse.ArgumentParser):
+    g = p.add_argument_group("peer filters")
+    g.add_argument("--name", help="Peer name glob (e.g. 'phone-*').")
+    g.add_argument("--profile", choices=["desktop", "smartphone"])
+    g.add_argument("--since", help="Created at/after: 2026-09, 2026-09-01 or a duration ago (30d).")
+    g.add_argument("--until", help="Created before (same formats).")
+    g.add_argument("--ip", help="Client address (e.g. 10.8.0.7).")
+    g.add_argument("--key", help="Peer name, PublicKey or fingerprint.")
 
 
 def main(argv: list[str] | None = None) -> int:
@@ -13,12 +22,136 @@ def main(argv: list[str] | None = None) -> int:
         description="WireGuard TUI (add/delete peers, optional QR + optional save).",
     )
     parser.add_argument("--version", action="store_true", help="Print version and exit.")
+    sub = parser.add_subparsers(dest="cmd")
+
+    p = sub.add_parser("daemon", help="Run the resident daemon (Unix socket API used by the TUI/CLI).")
+    p.add_argument("--socket", default=str(daemon.SOCKET_PATH), help="Socket path.")
+    p.add_argument("--interval", type=float, default=daemon.REFRESH_INTERVAL, help="Live stats refresh (seconds).")
+    p.add_argument("--snapshot-path", default=str(snapshot.SNAPSHOT_PATH), help="Where to publish the status snapshot.")
+    p.add_argument("--no-snapshot", action="store_true", help="Do not publish a status snapshot.")
+    p.set_defaults(func=cli.cmd_daemon)
+
+    p = sub.add_parser("status", help="Print interfaces, or the peers of one interface.")
+    p.add_argument("iface", nargs="?", help="Interface name (e.g. wg0).")
+    p.add_argument(
+        "--snapshot", nargs="?", const=str(snapshot.SNAPSHOT_PATH), metavar="PATH", help="Read the published snapshot instead (no root needed)."
+    )
+    p.set_defaults(func=cli.cmd_status)
+
+    p = sub.add_parser("snapshot", help="Publish the world-readable status snapshot (once, e.g. from a timer, or every --interval).")
+    p.add_argument("--path", default=str(snapshot.SNAPSHOT_PATH), help="Snapshot file.")
+    p.add_argument("--interval", type=float, default=0.0, help="Republish every N seconds (default: once).")
+    p.set_defaults(func=cli.cmd_snapshot)
+
+    p = sub.add_parser("add", help="Add a peer non-interactively (concurrent adds are group-committed).")
+    p.add_argument("iface")
+    p.add_argument("name")
+    p.add_argument("--ip", help="Client VPN IP (default: next free, allocated at commit time).")
+    p.add_argument("--endpoint", help="Endpoint host:port for the client config.")
+    p.add_argument("--route", help="Client AllowedIPs.")
+    p.add_argument("--dns", help="Client DNS.")
+    p.add_argument("--note", default="")
+    p.add_argument("--smartphone", action="store_true", help="Use the smartphone profile defaults.")
+    p.add_argument("--apply", action="store_true", help="Apply with wg syncconf after writing.")
+    p.add_argument("--save", action="store_true", help="Save the client config under the clients dir.")
+    p.add_argument("--print", action="store_true", help="Print the client config to stdout.")
+    p.set_defaults(func=cli.cmd_add)
+
+    p = sub.add_parser("delete", help="Delete a peer by name, public key or fingerprint.")
+    p.add_argument("iface")
+    p.add_argument("peer")
+    p.add_argument("--apply", action="store_true", help="Apply with wg syncconf after writing.")
+    p.add_argument("--keep-saved", action="store_true", help="Keep matching saved client configs.")
+    p.set_defaults(func=cli.cmd_delete)
+
+    p = sub.add_parser("peers", help="List (or bulk-delete) the peers of an interface matching filters.")
+    p.add_argument("iface")
+    _add_filter_args(p)
+    p.add_argument("--delete", action="store_true", help="Delete every matching peer in one commit (needs a filter).")
+    p.add_argument("--apply", action="store_true", help="With --delete: apply with wg syncconf afterwards.")
+    p.add_argument("--keep-saved", action="store_true", help="With --delete: keep their saved client configs.")
+    p.set_defaults(func=cli.cmd_peers)
+
+    p = sub.add_parser("whois", help="Which peer (on which interface) owns an IP or prefix.")
+    p.add_argument("addr", help="Address (10.8.3.77, fd00::5) or prefix (10.8.3.0/24).")
+    p.set_defaults(func=cli.cmd_whois)
+
+    p = sub.add_parser("rotate", help="Rotate PresharedKeys (or whole key pairs) of the matching peers in one commit.")
+    p.add_argument("iface")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--psk", action="store_true", help="New PresharedKeys only (default).")
+    g.add_argument("--keys", action="store_true", help="New client key pairs and PresharedKeys (re-keys compromised clients).")
+    _add_filter_args(p)
+    p.add_argument("--all", action="store_true", help="Select every peer (instead of a filter).")
+    p.add_argument("--force", action="store_true", help="Also rotate peers without a saved client config (--keys writes them a new one; the new PresharedKey is printed).")
+    p.add_argument("--in-process-keys", action="store_true", help="With --keys: derive key pairs with wireme's own X25519 instead of wg (faster, not constant-time).")
+    p.add_argument("--apply", action="store_true", help="Apply with wg syncconf afterwards (only changed peers are touched).")
+    p.set_defaults(func=cli.cmd_rotate)
+
+    p = sub.add_parser("shard", help="Split an interface config into per-hash peer files under <iface>.d/ (or merge it back).")
+    p.add_argument("iface")
+    p.add_argument("--shards", type=int, default=16, help="Number of peer files (default: 16).")
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--merge", action="store_true", help="Back to a single <iface>.conf.")
+    g.add_argument("--assemble", action="store_true", help="Re-assemble <iface>.conf from the shards now (apply does this too).")
+    p.set_defaults(func=cli.cmd_shard)
+
+    p = sub.add_parser("backups", help="List, diff, restore or prune the stored config versions of an interface.")
+    p.add_argument("action", choices=["list", "diff", "restore", "prune", "migrate"])
+    p.add_argument("iface")
+    p.add_argument("refs", nargs="*", metavar="VERSION", help="#seq, sha256 prefix or 'latest'. diff: one (vs the live config) or two.")
+    p.add_argument("--apply", action="store_true", help="restore: apply with wg syncconf afterwards.")
+    p.add_argument("--keep", type=int, help=f"prune: versions to keep (default {backups.KEEP}; 0 = no count limit).")
+    p.add_argument("--max-age", default=backups.MAX_AGE, help="prune: drop versions older than this (e.g. 30d; '' = no age limit).")
+    p.set_defaults(func=cli.cmd_backups)
+
+    p = sub.add_parser("history", help="Recorded traffic and handshakes of a peer (or --record them).")
+    p.add_argument("peer", nargs="?", help="Peer name, PublicKey or fingerprint.")
+    p.add_argument("--iface", help="Only look on this interface.")
+    p.add_argument("--res", choices=["auto"] + [r[0] for r in history.RESOLUTIONS], default="auto", help="Bucket size.")
+    p.add_argument("--since", default="24h", help="Start: a duration ago (24h, 30d) or an ISO date (UTC).")
+    p.add_argument("--until", help="End (same formats; default now).")
+    p.add_argument("--record", action="store_true", help="Sample live stats of every interface until interrupted (not needed with the daemon).")
+    p.add_argument("--interval", type=float, default=daemon.REFRESH_INTERVAL, help="--record: seconds between samples.")
+    p.set_defaults(func=cli.cmd_history)
+
+    p = sub.add_parser("quota", help="Show, set or enforce monthly per-peer traffic quotas ('# wireme-quota:').")
+    p.add_argument("action", choices=["show", "set", "enforce"])
+    p.add_argument("iface", nargs="?", help="Interface (default for show/enforce: all).")
+    p.add_argument("size", nargs="?", help="With set: 500M, 50G, 1T (binary units) or none.")
+    _add_filter_args(p)
+    p.add_argument("--all", action="store_true", help="With set: every peer of the interface.")
+    p.add_argument("--interval", type=float, default=10.0, help="enforce: seconds between passes (not needed with the daemon).")
+    p.add_argument("--once", action="store_true", help="enforce: a single pass.")
+    p.set_defaults(func=cli.cmd_quota)
+
+    p = sub.add_parser("drift", help="Report peers where the kernel and the configs disagree (exit 1 on drift, for cron).")
+    p.add_argument("iface", nargs="?", help="Interface (default: all configured and running).")
+    p.add_argument("--host", action="append", help="Check these hosts instead (specs as for fleet). Repeatable.")
+    p.add_argument("--hosts-file", help="File with one host spec per line.")
+    p.add_argument("-j", "--parallel", type=int, default=fleet.PARALLEL, help="Max hosts in flight.")
+    p.set_defaults(func=cli.cmd_drift)
+
+    p = sub.add_parser("fleet", help="Run status/reap/apply on many hosts concurrently.")
+    p.add_argument("action", choices=["status", "reap", "apply"])
+    p.add_argument("--host", action="append", help='Host spec: "local", "hub1", "admin@hub1", "ssh -p 2222 hub1 sudo -n", "sandbox:/dir". Repeatable.')
+    p.add_argument("--hosts-file", help="File with one host spec per line.")
+    p.add_argument("-j", "--parallel", type=int, default=fleet.PARALLEL, help="Max hosts in flight.")
+    p.add_argument("--stale", default="30d", help="reap: idle threshold (e.g. 12h, 30d).")
+    p.add_argument("--delete", action="store_true", help="reap: delete stale peers and apply (default: report only).")
+    p.set_defaults(func=cli.cmd_fleet)
+
     args = parser.parse_args(argv)
 
     if args.version:
         print(__version__)
         return 0
 
+    if args.cmd:
+        return int(args.func(args))
+
+    from .tui import run as run_tui
+
     run_tui()
     return 0
 
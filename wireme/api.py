@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+
+from . import ops, transport, wg
+
+# In-process API for services that provision peers themselves instead of forking the
+# CLI per request. No curses (and no daemon) is involved; everything below is a thin
+# layer over ops/commit, so writes get the same locking, group commit, backups and
+# indexes as the TUI and CLI.
+#
+#     from wireme import api
+#
+#     host = api.Host()                          # this machine, /etc/wireguard
+#     wg0 = host.interface("wg0")
+#     added = wg0.add_peers([{"name": "laptop-7"}, {"name": "phone-7", "client_ip": "10.8.0.50"}], apply=True)
+#     print(added[0]["client_config"])
+#     wg0.remove_peers(["phone-7"], apply=True)
+#
+# Roots: Host(root="/srv/wg-root") treats that directory as "/" (configs in
+# <root>/etc/wireguard, commands with <root>/bin first on PATH), and
+# Host(spec="admin@hub1") manages a remote host over ssh (see transport.from_spec).
+# Each call routes its I/O through the Host's transport for the calling thread only,
+# so one process can serve several roots/hosts from many threads; the module-level
+# paths in wg are never reassigned.
+#
+# Thread safety: Host and Interface objects may be shared between threads. Config
+# writes are serialized per interface (flock + group commit, concurrent calls are
+# merged into one write). Parsed peers are cached per Interface and reused until the
+# config's mtime/size change.
+
+
+class WiremeError(Exception):
+    """A call failed; info carries whatever ops reported (backup, apply result, ...)."""
+
+    def __init__(self, msg: str, info: dict | None = None):
+        super().__init__(msg)
+        self.info = info or {}
+
+
+class Peer:
+    """
+    One [Peer] of a server config (read-only). With live data (Interface.status()),
+    endpoint_live / handshake (epoch, 0 = never) / rx / tx are filled in, else None.
+    """
+
+    __slots__ = (
+        "public_key",
+        "name",
+        "allowed_ips",
+        "endpoint",
+        "profile",
+        "created",
+        "note",
+        "has_psk",
+        "keepalive",
+        "meta",
+        "endpoint_live",
+        "handshake",
+        "rx",
+        "tx",
+    )
+
+    def __init__(self, p: dict, live: dict | None = None):
+        self.public_key = p.get("PublicKey") or ""
+        self.name = p.get("name")
+        self.allowed_ips = [a.strip() for a in (p.get("AllowedIPs") or "").split(",") if a.strip()]
+        self.endpoint = p.get("Endpoint")
+        self.profile = p.get("profile")
+        self.created = p.get("created")
+        self.note = p.get("note")
+        self.has_psk = bool(p.get("PresharedKey"))
+        self.keepalive = p.get("PersistentKeepalive")
+        skip = {"PublicKey", "PresharedKey", "AllowedIPs", "Endpoint", "PersistentKeepalive", "name", "profile", "created", "note", "start", "end"}
+        self.meta = {k: v for k, v in p.items() if k not in skip and v is not None}  # other '# wireme-*' lines
+        self.endpoint_live = live.get("endpoint") if live else None
+        self.handshake = int(live.get("hs") or 0) if live else None
+        self.rx = int(live.get("rx") or 0) if live else None
+        self.tx = int(live.get("tx") or 0) if live else None
+
+    @property
+    def fingerprint(self) -> str:
+        return wg.pub_fingerprint(self.public_key)
+
+    def matches(self, key: str) -> bool:
+        """Name, PublicKey or fingerprint."""
+        return key in (self.name, self.public_key) or (bool(self.public_key) and key == self.fingerprint)
+
+    def __repr__(self) -> str:
+        return f"Peer({self.name or 'unnamed'!r}, {self.fingerprint}, {','.join(self.allowed_ips) or '-'})"
+
+
+class Host:
+    """A machine (or a directory standing in for one) holding WireGuard configs."""
+
+    def __init__(self, root: str | Path | None = None, spec: str | None = None):
+        if root is not None and spec is not None:
+            raise ValueError("give root or spec, not both")
+        if root is not None:
+            self.transport = transport.SandboxTransport(Path(root))
+        elif spec is not None:
+            self.transport = transport.from_spec(spec)
+        else:
+            self.transport = transport.current()
+        self._mu = threading.Lock()
+        self._ifaces: dict[str, Interface] = {}
+
+    def using(self):
+        """Context manager routing this thread's wireme calls to this host (for direct ops/wg use)."""
+        return transport.using(self.transport)
+
+    def interfaces(self) -> list[Interface]:
+        with self.using():
+            names = [c.stem for c in wg.interfaces()]
+        return [self.interface(n) for n in names]
+
+    def interface(self, name: str) -> Interface:
+        """The (shared, cached) Interface object for name; it need not exist yet."""
+        with self._mu:
+            it = self._ifaces.get(name)
+            if it is None:
+                it = self._ifaces[name] = Interface(self, name)
+            return it
+
+    def status(self) -> list[dict]:
+        """[{iface, path, up}] for every config."""
+        with self.using():
+            return ops.status()
+
+
+class Interface:
+    """One server interface (wg0.conf, or a sharded wg0.d/) on a Host."""
+
+    def __init__(self, host: Host, name: str):
+        self.host = host
+        self.name = name
+        self._mu = threading.Lock()
+        self._cache: tuple | None = None  # (conf sig, cfg, parsed peers, [Peer])
+
+    def __repr__(self) -> str:
+        return f"Interface({self.name!r})"
+
+    @property
+    def path(self) -> Path:
+        return wg.conf_path(self.name)
+
+    def exists(self) -> bool:
+        with self.host.using():
+            return wg.is_sharded(self.name) or self.host.transport.exists(self.path)
+
+    def _load(self) -> tuple:
+        """(cfg, parsed peer dicts, [Peer]); re-parsed only when the config changed."""
+        with self.host.using():
+            sig = wg.conf_sig(self.path)
+            if sig == (0, 0):
+                raise WiremeError(f"No such interface: {self.name}")
+            with self._mu:
+                if self._cache is not None and self._cache[0] == sig:
+                    return self._cache[1:]
+            cfg, peers, _ = wg.parse_conf(self.path)
+            out = (ops.public_cfg(cfg), peers, [Peer(p) for p in peers])
+            with self._mu:
+                self._cache = (sig, *out)
+            return out
+
+    def config(self) -> dict:
+        """[Interface] settings (Address, ListenPort, DNS; never the PrivateKey)."""
+        return dict(self._load()[0])
+
+    def peers(self) -> list[Peer]:
+        return list(self._load()[2])
+
+    def peer(self, key: str) -> Peer | None:
+        """A peer by name, PublicKey or fingerprint (WiremeError if the name is ambiguous)."""
+        hits = [p for p in self._load()[2] if p.matches(key)]
+        if len({p.public_key for p in hits}) > 1:
+            raise WiremeError(f"{key!r} matches {len(hits)} peers on {self.name}; use the PublicKey")
+        return hits[0] if hits else None
+
+    def status(self) -> dict:
+        """{"up": bool, "peers": [Peer with live stats]} from one `wg show <iface> dump`."""
+        _, parsed, peers = self._load()
+        with self.host.using():
+            head, live = wg.live_dump(self.name)
+        out = [Peer(d, live[p.public_key]) if p.public_key in live else p for d, p in zip(parsed, peers)]
+        return {"up": head is not None, "peers": out}
+
+    def add_peers(self, specs: list[dict], apply: bool = False, save: bool = False) -> list[dict]:
+        """
+        Add peers in one commit. A spec has name and optionally client_ip ("auto"),
+        endpoint, route, dns (defaults as `wireme add`), profile, note. With save the
+        client configs are also written under /etc/wireguard/clients/<iface>/.
+
+        Returns one dict per spec: ok, message, and for added peers name, public_key,
+        client_ip, client_config, saved (path or None). Raises WiremeError when the
+        commit itself fails (no config, apply failed, ...).
+        """
+        with self.host.using():
+            defaults = ops.add_defaults(self.name) if any(not s.get("endpoint") or s.get("route") is None for s in specs) else {}
+            full = []
+            for s in specs:
+                s = dict(s)
+                for k in ("endpoint", "route", "dns"):
+                    if s.get(k) is None or (k == "endpoint" and not s[k]):
+                        s[k] = defaults.get(k, "")
+                full.append(s)
+            ok, msg, info = ops.add_peers(self.name, full, apply=apply)
+            if not info.get("results"):
+                raise WiremeError(msg, info)
+            if apply and ok and info["apply"][0] != 0:
+                raise WiremeError(f"peers added, but apply failed: {info['apply'][2]}", info)
+            out = []
+            for r_ok, r_msg, r in info["results"]:
+                item = {"ok": r_ok, "message": r_msg}
+                if r_ok:
+                    saved = ops.save_client_conf(self.name, r["name"], r["pub"], r["client_text"]) if save else None
+                    item.update(name=r["name"], public_key=r["pub"], client_ip=r["client_ip"], client_config=r["client_text"], saved=saved)
+                out.append(item)
+        return out
+
+    def add_peer(self, name: str, apply: bool = False, save: bool = False, **spec) -> dict:
+        """add_peers for one peer; raises WiremeError if it was not added."""
+        res = self.add_peers([dict(spec, name=name)], apply=apply, save=save)[0]
+        if not res["ok"]:
+            raise WiremeError(res["message"])
+        return res
+
+    def remove_peers(self, keys: list[str], apply: bool = False, keep_saved: bool = False) -> dict:
+        """
+        Remove peers (by name, PublicKey or fingerprint) in one commit, and unless
+        keep_saved their saved client configs. Returns {removed, missing, deleted,
+        backup}; unknown keys land in missing.
+        """
+        pubs: list[str] = []
+        missing: list[str] = []
+        for k in keys:
+            p = self.peer(k)
+            if p is None:
+                missing.append(k)
+            else:
+                pubs.append(p.public_key)
+        if not pubs:
+            return {"removed": [], "missing": missing, "deleted": [], "backup": None}
+        with self.host.using():
+            ok, msg, info = ops.delete_peers(self.name, pubs, apply=apply, keep_saved=keep_saved)
+        if not ok:
+            raise WiremeError(msg, info)
+        if apply and info["apply"][0] != 0:
+            raise WiremeError(f"peers removed, but apply failed: {info['apply'][2]}", info)
+        return {"removed": info["removed"], "missing": missing + info["missing"], "deleted": info["deleted"], "backup": info["backup"]}
+
+    def client_config(self, key: str) -> str | None:
+        """The saved client config of a peer (newest if several), or None."""
+        p = self.peer(key)
+        if p is None:
+            raise WiremeError(f"No peer {key!r} on {self.name}")
+        with self.host.using():
+            paths = ops.matching_client_confs(self.name, p.public_key)
+            if not paths:
+                return None
+            t = self.host.transport
+            newest = max(paths, key=lambda f: t.stat_sig(Path(f))[0])
+            return t.read_bytes(Path(newest)).decode("utf-8", errors="replace")
+
+    def apply(self):
+        """wg syncconf the running interface to the config (WiremeError on failure)."""
+        with self.host.using():
+            rc, out, err = ops.apply(self.name)
+        if rc != 0:
+            raise WiremeError(f"apply {self.name} failed: {err or out}")
+
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import difflib
+import hashlib
+import os
+import re
+import time
+import zlib
+from pathlib import Path
+
+from . import transport, util, wg
+
+# Backup store per interface under /etc/wireguard/.wireme/backups/<iface>/ (out of the
+# *.conf glob). Versions are content-addressed (objects/<sha256>.z, zlib), identical
+# configs are stored once, and most objects are line deltas against the previous
+# version: configs change by a few peers at a time, so a common prefix/suffix splice
+# captures an add or a delete exactly. A full copy is forced every CHAIN versions so a
+# restore never reads more than CHAIN objects.
+#
+# index: one line per object reference, "seq ts sha size base depth"; seq 0 marks an
+# object kept only because a newer delta is based on it.
+
+STORE_DIR = "backups"
+KEEP = int(os.environ.get("WIREME_BACKUP_KEEP", "100"))
+MAX_AGE = os.environ.get("WIREME_BACKUP_MAX_AGE", "180d")
+CHAIN = 16
+
+_LEGACY_RE = re.compile(r"\.bak-(\d{8}-\d{6})$")
+_TIP: dict = {}  # (transport, iface) -> (sha, bytes, depth) of the newest version
+
+
+def store_dir(iface: str) -> Path:
+    return wg.WIREGUARD_DIR / ".wireme" / STORE_DIR / iface
+
+
+def _obj(iface: str, sha: str) -> Path:
+    return store_dir(iface) / "objects" / f"{sha}.z"
+
+
+def _rows(iface: str) -> list[dict]:
+    try:
+        text = transport.current().read_bytes(store_dir(iface) / "index").decode("ascii")
+    except (OSError, UnicodeDecodeError):
+        return []
+    rows = []
+    for ln in text.splitlines():
+        parts = ln.split()
+        if len(parts) == 6:
+            seq, ts, sha, size, base, depth = parts
+            rows.append({"seq": int(seq), "ts": int(ts), "sha": sha, "size": int(size), "base": base, "depth": int(depth)})
+    return rows
+
+
+def _write_rows(iface: str, rows: list[dict]):
+    text = "".join(f"{r['seq']} {r['ts']} {r['sha']} {r['size']} {r['base']} {r['depth']}\n" for r in rows)
+    transport.current().write_atomic(store_dir(iface) / "index", text.encode("ascii"), mode=0o600)
+
+
+def versions(iface: str) -> list[dict]:
+    """Restorable versions, oldest first: seq, ts, sha, size, base ('-' = stored in full)."""
+    return [r for r in _rows(iface) if r["seq"]]
+
+
+def _split(old: bytes, new: bytes) -> tuple[int, int, bytes]:
+    """(common leading lines, common trailing lines, new middle)."""
+    a, b = old.splitlines(True), new.splitlines(True)
+    n = min(len(a), len(b))
+    pre = 0
+    while pre < n and a[pre] == b[pre]:
+        pre += 1
+    suf = 0
+    while suf < n - pre and a[-1 - suf] == b[-1 - suf]:
+        suf += 1
+    return pre, suf, b"".join(b[pre : len(b) - suf])
+
+
+def _splice(base: bytes, pre: int, suf: int, middle: bytes) -> bytes:
+    a = base.splitlines(True)
+    return b"".join(a[:pre]) + middle + b"".join(a[len(a) - suf :])
+
+
+def load(iface: str, sha: str) -> bytes:
+    """Contents of a stored version (walks its delta chain; at most CHAIN reads)."""
+    t = transport.current()
+    tip = _TIP.get((t, iface))
+    if tip is not None and tip[0] == sha:
+        return tip[1]
+    deltas = []
+    cur = sha
+    while True:
+        raw = zlib.decompress(t.read_bytes(_obj(iface, cur)))
+        head, _, body = raw.partition(b"\n")
+        parts = head.decode("ascii").split()
+        if parts[0] == "F":
+            data = body
+            break
+        deltas.append((int(parts[2]), int(parts[3]), body))
+        cur = parts[1]
+        if len(deltas) > CHAIN:
+            raise ValueError(f"{iface}: delta chain of {sha[:12]} is broken")
+    for pre, suf, middle in reversed(deltas):
+        data = _splice(data, pre, suf, middle)
+    if hashlib.sha256(data).hexdigest() != sha:
+        raise ValueError(f"{iface}: backup {sha[:12]} is corrupt")
+    return data
+
+
+def _store(iface: str, data: bytes, ts: int) -> str:
+    t = transport.current()
+    sha = hashlib.sha256(data).hexdigest()
+    rows = _rows(iface)
+    seq = max((r["seq"] for r in rows), default=0) + 1
+    last = next((r for r in reversed(rows) if r["seq"]), None)
+    if last is not None and last["sha"] == sha:
+        return f"{iface}#{last['seq']}"
+
+    known = next((r for r in rows if r["sha"] == sha), None)
+    if known is not None:  # same content as an older version: reference its object
+        base, depth = known["base"], known["depth"]
+    else:
+        t.mkdir(store_dir(iface) / "objects")
+        base, depth, payload = "-", 0, b"F\n" + data
+        if last is not None and last["depth"] + 1 < CHAIN:
+            try:
+                prev = load(iface, last["sha"])
+            except (OSError, ValueError, zlib.error):
+                prev = None
+            if prev is not None:
+                pre, suf, middle = _split(prev, data)
+                if len(middle) < len(data) // 2:
+                    base, depth = last["sha"], last["depth"] + 1
+                    payload = f"D {base} {pre} {suf}\n".encode("ascii") + middle
+        t.write_atomic(_obj(iface, sha), zlib.compress(payload, 6), mode=0o600)
+    rows.append({"seq": seq, "ts": ts, "sha": sha, "size": len(data), "base": base, "depth": depth})
+    _TIP[(t, iface)] = (sha, data, depth)
+    _write_rows(iface, _prune_rows(iface, rows, KEEP, util.parse_duration(MAX_AGE)))
+    return f"{iface}#{seq}"
+
+
+def save(conf_path: Path, name: str | None = None) -> str:
+    """
+    Store the current contents of conf_path (call under wg.locked) under name (default:
+    the interface; shards use 'wg0.d/peers-03'); returns 'name#seq'.
+    """
+    return _store(name or conf_path.stem, transport.current().read_bytes(conf_path), int(time.time()))
+
+
+def _prune_rows(iface: str, rows: list[dict], keep: int | None, max_age: int | None) -> list[dict]:
+    live = [r for r in rows if r["seq"]]
+    drop = set()
+    if keep:
+        drop.update(r["seq"] for r in live[:-keep])
+    if max_age:
+        cutoff = time.time() - max_age
+        drop.update(r["seq"] for r in live[:-1] if r["ts"] < cutoff)
+    if not drop:
+        return rows
+
+    kept = [r for r in rows if r["seq"] and r["seq"] not in drop]
+    by_sha = {r["sha"]: r for r in rows}
+    needed = set()
+    for r in kept:
+        cur = r
+        while cur is not None and cur["sha"] not in needed:
+            needed.add(cur["sha"])
+            cur = by_sha.get(cur["base"])
+    have = {r["sha"] for r in kept}
+    out = []
+    for r in rows:
+        if r["seq"] and r["seq"] not in drop:
+            out.append(r)
+        elif r["sha"] in needed and r["sha"] not in have:
+            out.append(dict(r, seq=0))
+            have.add(r["sha"])
+    t = transport.current()
+    for sha in {r["sha"] for r in rows} - {r["sha"] for r in out}:
+        try:
+            t.unlink(_obj(iface, sha))
+        except OSError:
+            pass
+    return out
+
+
+def prune(iface: str, keep: int | None = KEEP, max_age: str | None = MAX_AGE) -> int:
+    """Apply a retention policy now (the newest version always stays); returns versions dropped."""
+    # a shard's store ('wg0.d/peers-03') is written by commits holding wg0's lock
+    with wg.locked(wg.conf_path(iface.partition(".d/")[0])):
+        rows = _rows(iface)
+        out = _prune_rows(iface, rows, keep, util.parse_duration(max_age) if max_age else None)
+        dropped = sum(1 for r in rows if r["seq"]) - sum(1 for r in out if r["seq"])
+        if dropped:
+            _write_rows(iface, out)
+    return dropped
+
+
+def resolve(iface: str, ref: str) -> dict | None:
+    """A version by seq ('12' or '#12'), 'latest', or a sha256 prefix (4+ hex chars)."""
+    vers = versions(iface)
+    ref = ref.strip().lstrip("#")
+    if ref == "latest":
+        return vers[-1] if vers else None
+    if ref.isdigit():
+        return next((v for v in vers if v["seq"] == int(ref)), None)
+    if len(ref) >= 4:
+        hits = [v for v in vers if v["sha"].startswith(ref.lower())]
+        if len({v["sha"] for v in hits}) == 1:
+            return hits[-1]
+    return None
+
+
+def diff(iface: str, old: bytes, new: bytes, old_label: str, new_label: str, context: int = 3) -> str:
+    """Unified diff; only the lines between the common prefix and suffix go through difflib."""
+    pre, suf, _ = _split(old, new)
+    pre = max(0, pre - context)
+    suf = max(0, suf - context)
+    a = old.decode("utf-8", "replace").splitlines(True)
+    b = new.decode("utf-8", "replace").splitlines(True)
+    out = []
+    for ln in difflib.unified_diff(a[pre : len(a) - suf], b[pre : len(b) - suf], old_label, new_label, n=context):
+        m = re.match(r"@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@", ln)
+        if m:  # hunk line numbers are relative to the slice
+            ln = f"@@ -{int(m.group(1)) + pre}{m.group(2) or ''} +{int(m.group(3)) + pre}{m.group(4) or ''} @@\n"
+        out.append(ln if ln.endswith("\n") else ln + "\n")
+    return "".join(out)
+
+
+def migrate(iface: str) -> int:
+    """Move old <iface>.conf.bak-YYYYmmdd-HHMMSS copies into the store; returns how many."""
+    t = transport.current()
+    conf = wg.conf_path(iface)
+    n = 0
+    with wg.locked(conf):
+        for b in t.glob(wg.WIREGUARD_DIR, f"{conf.name}.bak-*"):
+            m = _LEGACY_RE.search(b.name)
+            if not m:
+                continue
+            ts = int(time.mktime(time.strptime(m.group(1), "%Y%m%d-%H%M%S")))
+            _store(iface, t.read_bytes(b), ts)
+            t.unlink(b)
+            n += 1
+    return n
@@ -0,0 +1,585 @@
+from __future__ import annotations
+
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from . import backups, daemon, drift, fleet, history, ops, peerdb, quota, snapshot, util, wg
+
+
+def cmd_daemon(args) -> int:
+    return daemon.run(Path(args.socket), args.interval, None if args.no_snapshot else Path(args.snapshot_path))
+
+
+def _status_snapshot(args) -> int:
+    try:
+        snap = snapshot.Snapshot(Path(args.snapshot))
+    except (OSError, ValueError) as e:
+        print(f"wireme status: no snapshot: {e}")
+        return 2
+    ifaces = snap.interfaces()
+    if not args.iface:
+        for it in ifaces:
+            print(f"{it['iface']}\t{'up' if it['up'] else 'down'}\tpeers={it['peers']}\tListenPort: {it['port'] or '-'}")
+    elif not any(it["iface"] == args.iface for it in ifaces):
+        print(f"wireme status: {args.iface} is not in the snapshot")
+        return 2
+    else:
+        for p in snap.peers(args.iface):
+            rxtx = f"{p['rx']}/{p['tx']}" if p["live"] else "-/-"
+            print("\t".join([p["name"], p["ips"] or "-", wg.format_hs(str(p["hs"])), rxtx, p["fingerprint"]]))
+    print(f"# snapshot {int(time.time()) - snap.generated}s old")
+    return 0
+
+
+def cmd_status(args) -> int:
+    if args.snapshot:
+        return _status_snapshot(args)
+    try:
+        if not args.iface:
+            for st in daemon.call_or(ops.status, "status"):
+                print(f"{st['iface']}\t{'up' if st['up'] else 'down'}\t{st['path']}")
+            return 0
+        ov = daemon.call_or(ops.overview, "overview", iface=args.iface)
+    except daemon.DaemonError as e:
+        print(f"wireme status: {e}")
+        return 1
+    live = ov["live"] or {}
+    print(f"{args.iface}\tAddress: {ov['cfg'].get('Address') or '-'}\tListenPort: {ov['cfg'].get('ListenPort') or '-'}")
+    for p in ov["peers"]:
+        li = live.get(p.get("PublicKey") or "", {})
+        print(
+            "\t".join(
+                [
+                    p.get("name") or "unnamed",
+                    p.get("AllowedIPs") or "-",
+                    wg.format_hs(li.get("hs", "0")),
+                    f"{li.get('rx', '-')}/{li.get('tx', '-')}",
+                    p.get("Endpoint") or li.get("endpoint") or "-",
+                ]
+            )
+        )
+    return 0
+
+
+def find_peer(peers: list[dict], key: str) -> dict | None:
+    """Match a peer by name, PublicKey or pub fingerprint."""
+    for p in peers:
+        pub = p.get("PublicKey") or ""
+        if key in (p.get("name"), pub) or (pub and key == wg.pub_fingerprint(pub)):
+            return p
+    return None
+
+
+def cmd_add(args) -> int:
+    try:
+        return _add(args)
+    except daemon.DaemonError as e:  # the daemon's error for what direct mode reports itself
+        print(f"wireme add: {e}")
+        return 1
+
+
+def _add(args) -> int:
+    defaults = daemon.call_or(ops.add_defaults, "add_defaults", iface=args.iface, smart=args.smartphone)
+    ok, msg, info = daemon.call_or(
+        ops.add_peer,
+        "add",
+        iface=args.iface,
+        name=args.name,
+        client_ip=args.ip or "auto",
+        endpoint=args.endpoint or defaults["endpoint"],
+        route=defaults["route"] if args.route is None else args.route,
+        dns=defaults["dns"] if args.dns is None else args.dns,
+        profile="smartphone" if args.smartphone else "desktop",
+        note=args.note,
+        apply=args.apply,
+    )
+    if not ok:
+        print(f"wireme add: {msg}")
+        return 1
+    print(f"Added {info['name']} ({info['client_ip']}) to {args.iface}. Backup: {info['backup']}")
+    if args.apply:
+        rc, _, aerr = info["apply"]
+        if rc != 0:
+            print(f"wireme add: saved, but apply failed: {aerr}")
+            return 1
+    if args.save:
+        path = daemon.call_or(
+            ops.save_client_conf, "save_client", iface=args.iface, name=info["name"], pub=info["pub"], client_text=info["client_text"]
+        )
+        print(f"Saved client config: {path}")
+    if args.print:
+        print(info["client_text"], end="")
+    return 0
+
+
+def cmd_delete(args) -> int:
+    try:
+        return _delete(args)
+    except daemon.DaemonError as e:
+        print(f"wireme delete: {e}")
+        return 1
+
+
+def _delete(args) -> int:
+    peers = daemon.call_or(ops.overview, "overview", iface=args.iface)["peers"]
+    peer = find_peer(peers, args.peer)
+    if peer is None or not peer.get("PublicKey"):
+        print(f"wireme delete: no peer {args.peer!r} in {args.iface}")
+        return 1
+    matches = [] if args.keep_saved else None
+    ok, msg, info = daemon.call_or(
+        ops.delete_peer, "delete", iface=args.iface, pub=peer["PublicKey"], matches=matches, apply=args.apply
+    )
+    if not ok:
+        print(f"wireme delete: {msg}")
+        return 1
+    print(f"Removed {peer.get('name') or peer['PublicKey']} from {args.iface}. Backup: {info['backup']}")
+    for f in info["deleted"]:
+        print(f"Deleted {f}")
+    for e in info["errors"]:
+        print(f"wireme delete: {e}")
+    if args.apply and info["apply"][0] != 0:
+        print(f"wireme delete: removed, but apply failed: {info['apply'][2]}")
+        return 1
+    return 0
+
+
+FILTERS = ("name", "profile", "since", "until", "ip", "key")
+
+
+def peer_filters(args) -> dict:
+    return {k: getattr(args, k) for k in FILTERS if getattr(args, k, None)}
+
+
+def cmd_peers(args) -> int:
+    filters = peer_filters(args)
+    peers = peerdb.query(args.iface, **filters)
+    for p in peers:
+        pub = p.get("PublicKey") or ""
+        print(
+            "\t".join(
+                [
+                    p.get("name") or "unnamed",
+                    p.get("AllowedIPs") or "-",
+                    p.get("profile") or "-",
+                    p.get("created") or "-",
+                    wg.pub_fingerprint(pub),
+                    p.get("note") or "",
+                ]
+            ).rstrip("\t")
+        )
+    if not args.delete:
+        return 0
+    if not filters:
+        print("wireme peers: refusing to --delete without a filter")
+        return 2
+    if not peers:
+        print("wireme peers: nothing matches")
+        return 1
+    ok, msg, info = ops.delete_peers(args.iface, [p["PublicKey"] for p in peers], apply=args.apply, keep_saved=args.keep_saved)
+    if not ok:
+        print(f"wireme peers: {msg}")
+        return 1
+    print(f"# {msg} Backup: {info['backup']}")
+    for f in info["deleted"]:
+        print(f"# deleted {f}")
+    for e in info["errors"]:
+        print(f"wireme peers: {e}")
+    if args.apply and info["apply"][0] != 0:
+        print(f"wireme peers: removed, but apply failed: {info['apply'][2]}")
+        return 1
+    return 0
+
+
+def cmd_whois(args) -> int:
+    try:
+        res = daemon.call_or(ops.whois, "whois", addr=args.addr)
+    except (ValueError, daemon.DaemonError) as e:
+        print(f"wireme whois: {e}")
+        return 2
+    m = res["match"]
+    if m is None and not res["overlaps"]:
+        print(f"{args.addr}: not routed to any peer")
+        return 1
+    if m is not None:
+        for o in m["owners"]:
+            print("\t".join([m["prefix"], o["iface"], o["name"], wg.pub_fingerprint(o["pub"]) if o["pub"] else o["kind"]]))
+    for ov in res["overlaps"]:
+        if m is not None and ov["prefix"] == m["prefix"]:
+            continue
+        for o in ov["owners"]:
+            print("\t".join([ov["prefix"], o["iface"], o["name"], wg.pub_fingerprint(o["pub"]) if o["pub"] else o["kind"], "(inside)"]))
+    return 0
+
+
+def cmd_rotate(args) -> int:
+    filters = peer_filters(args)
+    if not filters and not args.all:
+        print("wireme rotate: give a filter, or --all for every peer")
+        return 2
+    peers = peerdb.query(args.iface, **filters)
+    if not peers:
+        print("wireme rotate: nothing matches")
+        return 1
+    names = {p["PublicKey"]: p.get("name") or "unnamed" for p in peers}
+    t0 = time.monotonic()
+    ok, msg, info = ops.rotate_peers(args.iface, list(names), keys=args.keys, apply=args.apply, force=args.force, in_process=args.in_process_keys)
+    reasons = info.get("reasons", {})
+    for pub in info.get("skipped", []):
+        why = reasons.get(pub, "no saved client config (--force to rotate anyway)")
+        print(f"skipped\t{names[pub]}\t{wg.pub_fingerprint(pub)}\t{why}")
+    if not ok:
+        for e in info.get("errors", []):
+            print(f"wireme rotate: {e}")
+        print(f"wireme rotate: {msg}")
+        return 1
+    for old, new in info["new_pubs"].items():
+        fp = wg.pub_fingerprint(old) + (f" -> {wg.pub_fingerprint(new)}" if new != old else "")
+        print(f"rotated\t{names.get(old, 'unnamed')}\t{fp}")
+    unsaved = info["unsaved"]
+    paths, errors = ops.save_rotated(args.iface, unsaved)
+    for e in errors:
+        print(f"wireme rotate: cannot write a new client config: {e}")
+    for old, u in unsaved.items():
+        label = f"{names.get(old, 'unnamed')}\t{wg.pub_fingerprint(u['pub'])}"
+        if old in paths:
+            print(f"new-config\t{label}\t{paths[old]}")
+        elif u["file"]:
+            print(f"staged\t{label}\t{u['file']}")
+        else:
+            # nothing on disk carries it: this is the only copy
+            secret = (f"PrivateKey = {u['priv']}\t" if u["priv"] else "") + f"PresharedKey = {u['psk']}"
+            print(f"unsaved\t{label}\t{secret}")
+    for e in info["errors"]:
+        print(f"wireme rotate: {e}")
+    print(f"# {msg} {len(info['written'])} client config(s) rewritten in {time.monotonic() - t0:.1f}s. Backup: {info['backup']}")
+    if args.apply and info["apply"][0] != 0:
+        print(f"wireme rotate: rotated, but apply failed: {info['apply'][2]}")
+        return 1
+    return 1 if info["errors"] or errors else 0
+
+
+def cmd_shard(args) -> int:
+    iface = args.iface
+    if args.assemble:
+        if not wg.is_sharded(iface):
+            print(f"wireme shard: {iface} is not sharded")
+            return 1
+        with wg.locked(wg.conf_path(iface)):
+            print(f"# assembled {wg.assemble(iface)}")
+        return 0
+    ok, msg, info = ops.shard_interface(iface, shards=args.shards, merge=args.merge)
+    if not ok:
+        print(f"wireme shard: {msg}")
+        return 1
+    print(f"{msg} Backup: {info['backup']}")
+    return 0
+
+
+def cmd_backups(args) -> int:
+    iface, refs = args.iface, args.refs
+    if args.action == "migrate":
+        n = backups.migrate(iface)
+        print(f"# moved {n} .bak file(s) of {iface} into {backups.store_dir(iface)}")
+        return 0
+    if args.action == "prune":
+        keep = backups.KEEP if args.keep is None else args.keep
+        n = backups.prune(iface, keep=keep, max_age=args.max_age)
+        print(f"# dropped {n} version(s), {len(backups.versions(iface))} left")
+        return 0
+    if args.action == "list":
+        for v in backups.versions(iface):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(v["ts"]))
+            kind = "full" if v["base"] == "-" else f"delta/{v['depth']}"
+            print(f"#{v['seq']}\t{stamp}\t{v['size']}\t{v['sha'][:12]}\t{kind}")
+        return 0
+
+    if not refs or (args.action == "restore" and len(refs) > 1) or len(refs) > 2:
+        print(f"wireme backups {args.action}: give {'one version' if args.action == 'restore' else 'one or two versions'} (#seq, sha prefix or latest)")
+        return 2
+    if args.action == "restore":
+        ok, msg, info = ops.restore_backup(iface, refs[0], apply=args.apply)
+        if not ok:
+            print(f"wireme backups: {msg}")
+            return 1
+        print(f"{msg} Previous contents: {info['backup']}")
+        if args.apply and info["apply"][0] != 0:
+            print(f"wireme backups: restored, but apply failed: {info['apply'][2]}")
+            return 1
+        return 0
+
+    sides = []
+    for ref in refs:
+        v = backups.resolve(iface, ref)
+        if v is None:
+            print(f"wireme backups: no backup {ref!r} for {iface}")
+            return 1
+        sides.append((backups.load(iface, v["sha"]), f"{iface}#{v['seq']}"))
+    if len(sides) == 1:
+        sides.append((wg.read_conf(wg.conf_path(iface)).encode("utf-8"), str(wg.conf_path(iface))))
+    (old, old_label), (new, new_label) = sides
+    sys.stdout.write(backups.diff(iface, old, new, old_label, new_label))
+    return 0
+
+
+def _bytes(n: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if n < 1024 or unit == "TiB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return str(n)
+
+
+def _when(text: str | None, now: int) -> int | None:
+    """Duration ago ('24h') or an ISO date/time (UTC unless it says otherwise) -> epoch."""
+    if not text:
+        return now
+    secs = util.parse_duration(text)
+    if secs is not None:
+        return now - secs
+    try:
+        dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return int((dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp())
+
+
+def _record(interval: float) -> int:
+    rec = history.Recorder()
+    try:
+        while True:
+            for conf in wg.interfaces():
+                _, live = wg.live_dump(conf.stem)
+                if live and not rec.sample(conf.stem, live) and rec.locks.get(conf.stem) is None:
+                    print(f"wireme history: {conf.stem} is already being recorded (daemon?)")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        rec.close()
+
+
+def cmd_history(args) -> int:
+    if args.record:
+        return _record(args.interval)
+    if not args.peer:
+        print("wireme history: give a peer (name, PublicKey or fingerprint) or --record")
+        return 2
+
+    now = int(time.time())
+    since, until = _when(args.since, now), _when(args.until, now)
+    if since is None or until is None:
+        print("wireme history: --since/--until take a duration (24h, 30d) or an ISO date")
+        return 2
+    res = args.res
+    if res == "auto":
+        span = until - since
+        res = "1m" if span <= 6 * 3600 else "1h" if span <= 14 * 86400 else "1d"
+
+    ifaces = [args.iface] if args.iface else [c.stem for c in wg.interfaces()]
+    hits = [(n, p) for n in ifaces for p in peerdb.query(n, key=args.peer)]
+    if not hits:
+        print(f"wireme history: no peer matching {args.peer!r}")
+        return 1
+    if len(hits) > 1:
+        print(f"wireme history: {args.peer!r} is ambiguous, use --iface or the PublicKey:")
+        for n, p in hits:
+            print(f"\t{n}\t{p.get('name') or 'unnamed'}\t{p['PublicKey']}")
+        return 2
+
+    iface, peer = hits[0]
+    pub = peer["PublicKey"]
+    rows = history.read(iface, pub, res, since, until)
+    fmt = "%Y-%m-%d %H:%M" if res != "1d" else "%Y-%m-%d"
+    for ts, hs, rx, tx in rows:
+        print("\t".join([time.strftime(fmt, time.gmtime(ts)), _bytes(rx), _bytes(tx), time.strftime("%m-%d %H:%M:%S", time.gmtime(hs)) if hs else "-"]))
+    last = history.last_handshake(iface, pub)
+    seen = f"{time.strftime('%Y-%m-%d %H:%M:%SZ', time.gmtime(last))} ({wg.format_hs(str(last))} ago)" if last else "never recorded"
+    print(
+        f"# {iface} {peer.get('name') or 'unnamed'}: {len(rows)} {res} bucket(s), "
+        f"rx {_bytes(sum(r[2] for r in rows))}, tx {_bytes(sum(r[3] for r in rows))}, last handshake {seen}"
+    )
+    return 0
+
+
+def _enforce(ifaces: list[str], interval: float) -> int:
+    enf = quota.Enforcer()
+    warned: set[str] = set()
+    try:
+        while True:
+            for n in ifaces or [c.stem for c in wg.interfaces()]:
+                _, live = wg.live_dump(n)
+                if not live:
+                    continue
+                res = enf.tick(n, live)
+                if res is None:
+                    if n not in warned:
+                        print(f"wireme quota: {n} is already being enforced (daemon?)")
+                        warned.add(n)
+                    continue
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+                for what in ("disabled", "enabled"):
+                    for pub in res[what]:
+                        print(f"{stamp}\t{n}\t{what}\t{wg.pub_fingerprint(pub)}")
+                for e in res["errors"]:
+                    print(f"wireme quota: {e}")
+            if not interval:
+                return 0
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        enf.close()
+
+
+def cmd_quota(args) -> int:
+    if args.action == "enforce":
+        return _enforce([args.iface] if args.iface else [], 0 if args.once else args.interval)
+    if args.action == "set":
+        if not args.iface or not args.size:
+            print("wireme quota set: give an interface and a size (500M, 50G, 1T) or none")
+            return 2
+        filters = peer_filters(args)
+        if not filters and not args.all:
+            print("wireme quota set: give a filter, or --all for every peer")
+            return 2
+        pubs = [p["PublicKey"] for p in peerdb.query(args.iface, **filters)]
+        if not pubs:
+            print("wireme quota: nothing matches")
+            return 1
+        ok, msg, info = ops.set_quota(args.iface, pubs, None if args.size.lower() == "none" else args.size)
+        print(f"{msg} Backup: {info['backup']}" if ok else f"wireme quota: {msg}")
+        return 0 if ok else 1
+
+    cur = quota.period_of(time.time())
+    for n in [args.iface] if args.iface else [c.stem for c in wg.interfaces()]:
+        caps, _ = quota.limits(n)
+        if not caps:
+            continue
+        period, state = quota.load(n)
+        names = {p["PublicKey"]: p.get("name") or "unnamed" for p in wg.parse_conf(wg.conf_path(n))[1] if p.get("PublicKey")}
+        rows = []
+        for pub, cap in caps.items():
+            rec = state.get(pub)
+            used = rec[2] if rec is not None and period == cur else 0
+            st = "not seen" if rec is None else "DISABLED" if rec[3] & quota.DISABLED else "ok"
+            rows.append((used / cap if cap else 1.0, pub, cap, used, st))
+        for frac, pub, cap, used, st in sorted(rows, key=lambda r: r[0], reverse=True):
+            print("\t".join([n, names.get(pub, "unnamed"), wg.pub_fingerprint(pub), _bytes(used), _bytes(cap), f"{frac * 100:.0f}%", st]))
+        over = sum(1 for r in rows if r[4] == "DISABLED")
+        print(f"# {n}: {len(rows)} capped peer(s), {over} disabled, month {cur // 100}-{cur % 100:02d} (UTC)")
+    return 0
+
+
+def cmd_snapshot(args) -> int:
+    path = Path(args.path)
+    while True:
+        try:
+            size = snapshot.publish(path=path)
+        except OSError as e:
+            print(f"wireme snapshot: {e}")
+            return 1
+        if not args.interval:
+            print(f"{path}: {size} bytes")
+            return 0
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            return 0
+
+
+def _drift_line(r: dict, prefix: str = "") -> str:
+    fp = wg.pub_fingerprint(r["pub"]) if r["pub"] else "-"
+    name = r["name"] if r["pub"] else "-"
+    return f"{prefix}{r['iface']}\t{r['kind']}\t{name}\t{fp}\t{r['detail']}"
+
+
+def cmd_drift(args) -> int:
+    ifaces = [args.iface] if args.iface else None
+    hosts = _fleet_hosts(args)
+    counts = dict.fromkeys(drift.KINDS, 0)
+    t0 = time.time()
+    if not hosts:
+        stats: dict = {}
+        try:
+            for r in drift.scan(ifaces, stats):
+                counts[r["kind"]] += 1
+                print(_drift_line(r))
+        except RuntimeError as e:
+            print(f"wireme drift: {e}")
+            return 2
+        checked = f"{stats['interfaces']} interface(s), {stats['peers']} running peer(s)"
+        failed = 0
+    else:
+        failed = 0
+        for res in fleet.fan_out(hosts, fleet.host_drift, parallel=args.parallel, ifaces=ifaces):
+            if not res["ok"]:
+                failed += 1
+                print(f"{res['host']}\t-\tERROR\t-\t-\t{res['error']}")
+                continue
+            for r in res["result"]:
+                counts[r["kind"]] += 1
+                print(_drift_line(r, f"{res['host']}\t"))
+        checked = f"{len(hosts)} host(s), {failed} failure(s)"
+    found = ", ".join(f"{n} {k}" for k, n in counts.items() if n) or "no drift"
+    print(f"# {checked}: {found} ({time.time() - t0:.2f}s)")
+    if failed:
+        return 2
+    return 1 if any(counts.values()) else 0
+
+
+def _fleet_hosts(args) -> list[str]:
+    hosts = list(args.host or [])
+    if args.hosts_file:
+        for ln in util.read_text(Path(args.hosts_file)).splitlines():
+            ln = ln.split("#", 1)[0].strip()
+            if ln:
+                hosts.append(ln)
+    return hosts
+
+
+def cmd_fleet(args) -> int:
+    hosts = _fleet_hosts(args)
+    if not hosts:
+        print("wireme fleet: no hosts (use --host or --hosts-file)")
+        return 2
+
+    if args.action == "status":
+        fn, kw = fleet.host_status, {}
+    elif args.action == "apply":
+        fn, kw = fleet.host_apply, {}
+    else:
+        stale = util.parse_duration(args.stale)
+        if stale is None:
+            print(f"wireme fleet: bad --stale value {args.stale!r}")
+            return 2
+        fn, kw = fleet.host_reap, {"stale_secs": stale, "delete": args.delete}
+
+    failed = 0
+    for res in fleet.fan_out(hosts, fn, parallel=args.parallel, **kw):
+        host = res["host"]
+        if not res["ok"]:
+            failed += 1
+            print(f"{host}\tERROR\t{res['error']}")
+            continue
+        rows = res["result"]
+        if args.action == "status":
+            for r in rows:
+                print(f"{host}\t{r['iface']}\t{'up' if r['up'] else 'down'}\tpeers={r['peers']}\tactive={r['active']}")
+        elif args.action == "apply":
+            for r in rows:
+                if not r["ok"]:
+                    failed += 1
+                print(f"{host}\t{r['iface']}\t{'applied' if r['ok'] else 'FAILED ' + r['error']}")
+        else:
+            for r in rows:
+                state = ""
+                if args.delete:
+                    state = f"\tdeleted, apply: {r.get('apply', '-')}" if r.get("deleted") else f"\tNOT deleted: {r.get('msg')}"
+                print(f"{host}\t{r['iface']}\t{r['name']}\tidle {r['age'] // 86400}d\t{wg.pub_fingerprint(r['pub'])}{state}")
+        if not rows:
+            print(f"{host}\t-\t(nothing)\t{res['secs']:.1f}s")
+    print(f"# {len(hosts)} host(s), {failed} failure(s)")
+    return 1 if failed else 0
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import probe, transport, util, wg
+from .client_ops import (
+    Watchdog,
+    candidate_endpoints,
+    client_profile,
+    delete_profile,
+    import_sources,
+    install_many,
+    list_profiles,
+    nudge_peer,
+    recover_peer,
+    sample,
+    save_profile,
+    set_conf_endpoint,
+    set_endpoints,
+    switch_profile,
+    validate_many,
+    wg_quick_up,
+)
+
+
+def cmd_endpoints(args) -> int:
+    if args.endpoints:
+        ok, msg = set_endpoints(args.iface, args.endpoints)
+        print(msg if ok else f"wiremec endpoints: {msg}")
+        return 0 if ok else 1
+    _, peer = client_profile(args.iface)
+    if peer is None:
+        print(f"wiremec endpoints: no [Peer] in {args.iface}")
+        return 1
+    for ep in candidate_endpoints(peer):
+        print(ep + ("\t(config Endpoint)" if ep == peer.get("Endpoint") else ""))
+    return 0
+
+
+def probe_and_switch(iface: str, do_switch: bool, timeout: float = probe.TIMEOUT, tries: int = probe.TRIES):
+    """
+    Probe every candidate endpoint of iface concurrently and, with do_switch, move the
+    running interface to the fastest one via wg set (persisting it in the config).
+    A server that answered a probe has roamed this peer to the probe socket, so the
+    running interface then sends a keepalive at once to win the endpoint back.
+
+    Returns (results, chosen result or None, switch message).
+    """
+    cfg, peer = client_profile(iface)
+    if peer is None or not cfg.get("PrivateKey") or not peer.get("PublicKey"):
+        raise ValueError(f"{iface}: config needs [Interface] PrivateKey and [Peer] PublicKey")
+    cands = candidate_endpoints(peer)
+    if not cands:
+        raise ValueError(f"{iface}: no endpoints (set some with: wiremec endpoints {iface} HOST:PORT ...)")
+
+    results = asyncio.run(probe.probe_all(cands, cfg["PrivateKey"], peer["PublicKey"], timeout, tries))
+    current = probe.live_endpoint(iface, peer["PublicKey"])
+    best = probe.pick_best(results, current_addr=current)
+    note = ""
+    if do_switch and best is not None:
+        if best["addr"] == current:
+            note = f"keeping {best['endpoint']}"
+        else:
+            rc, _, err = probe.set_live_endpoint(iface, peer["PublicKey"], best["addr"])
+            if rc != 0:
+                note = f"wg set failed: {err}"
+            else:
+                set_conf_endpoint(iface, best["endpoint"])
+                note = f"switched {current or '(none)'} -> {best['endpoint']} ({best['addr']})"
+                current = best["addr"]
+    if current is not None and any(r["rtt_ms"] is not None for r in results):
+        ok, msg = nudge_peer(iface, peer["PublicKey"])
+        if not ok:
+            note = f"{note}; {msg}" if note else msg
+    return results, best, note
+
+
+def _print_round(results: list[dict], best: dict | None, note: str):
+    for r in sorted(results, key=lambda r: (r["rtt_ms"] is None, r["rtt_ms"] or 0)):
+        rtt = f"{r['rtt_ms']:.1f}ms" if r["rtt_ms"] is not None else "-"
+        mark = "*" if best is not None and r is best else " "
+        print(f"{mark} {r['endpoint']}\t{r['addr'] or '-'}\t{rtt}\t{r['error']}")
+    if note:
+        print(f"# {note}")
+
+
+def cmd_probe(args) -> int:
+    while True:
+        try:
+            results, best, note = probe_and_switch(args.iface, args.switch, args.timeout, args.tries)
+        except ValueError as e:
+            print(f"wiremec probe: {e}")
+            return 1
+        if args.watch:
+            print(f"# {time.strftime('%H:%M:%S')}")
+        _print_round(results, best, note)
+        if not args.watch:
+            return 0 if best is not None else 1
+        try:
+            time.sleep(args.watch)
+        except KeyboardInterrupt:
+            return 0
+
+
+def cmd_import(args) -> int:
+    try:
+        sources = import_sources(args.source, sys.stdin.read() if args.source == "-" else None)
+    except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+        print(f"wiremec import: {e}")
+        return 1
+    if not sources:
+        print(f"wiremec import: no *.conf found in {args.source}")
+        return 1
+    if args.iface and len(sources) > 1:
+        print("wiremec import: --iface only makes sense for a single config")
+        return 2
+
+    items = validate_many(sources, iface=args.iface)
+    if not args.dry_run:
+        if not util.is_root():
+            print("wiremec import: run as root to write /etc/wireguard/*.conf")
+            return 1
+        install_many(items, skip_existing=args.skip_existing)
+
+    bad = [it for it in items if not it["ok"]]
+    for it in items:
+        if it["ok"]:
+            state = "valid" if args.dry_run else ("installed" if it["installed"] else "skipped")
+            print(f"{state}\t{it['iface']}\t{it['label']}")
+    for it in bad:
+        print(f"INVALID\t{it['iface'] or '-'}\t{it['label']}")
+        for ln in it["msg"].splitlines():
+            print(f"\t{ln}")
+
+    up = [it["iface"] for it in items if it.get("installed")] if args.up else []
+    up_failed = 0
+    if up:
+        with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as ex:
+            for name, (rc, out, err) in zip(up, ex.map(wg_quick_up, up)):
+                if rc != 0:
+                    up_failed += 1
+                print(f"{'up' if rc == 0 else 'UP FAILED'}\t{name}" + ("" if rc == 0 else f"\t{err or out}"))
+
+    done = sum(1 for it in items if it.get("installed") or (args.dry_run and it["ok"]))
+    print(f"# {len(items)} config(s): {done} {'valid' if args.dry_run else 'installed'}, {len(bad)} invalid")
+    return 1 if bad or up_failed else 0
+
+
+def cmd_profile(args) -> int:
+    if args.action == "list":
+        for p in list_profiles():
+            print(f"{'*' if p['active'] else ' '} {p['name']}\t{p['iface'] or '-'}")
+        return 0
+    if not args.name:
+        print(f"wiremec profile {args.action}: give a profile name")
+        return 2
+    if args.action == "rm":
+        ok, msg = delete_profile(args.name)
+    else:
+        if args.source and args.iface_src:
+            print("wiremec profile save: give a file (or -) or --from, not both")
+            return 2
+        if args.source == "-":
+            text = sys.stdin.read()
+        elif args.source or args.iface_src:
+            # read_bytes, not util.read_text/wg.read_conf: those turn a missing file into ""
+            path = Path(args.source) if args.source else wg.conf_path(args.iface_src)
+            try:
+                text = transport.current().read_bytes(path).decode("utf-8", errors="replace")
+            except OSError as e:
+                print(f"wiremec profile save: {e}")
+                return 1
+        else:
+            print("wiremec profile save: give a config file, - for stdin, or --from IFACE")
+            return 2
+        ok, msg = save_profile(args.name, text, iface=args.iface or args.iface_src)
+    print(msg if ok else f"wiremec profile: {msg}")
+    return 0 if ok else 1
+
+
+def cmd_switch(args) -> int:
+    if not util.is_root():
+        print("wiremec switch: run as root to write /etc/wireguard/*.conf and run wg")
+        return 1
+    ok, msg, info = switch_profile(args.profile, iface=args.iface)
+    if info.get("mode") == "down/up":
+        print(f"# no in-place switch: {'; '.join(info['reasons'])}")
+    print(msg if ok else f"wiremec switch: {msg}")
+    if info.get("mode") not in (None, "none"):
+        print(f"# config written in {info['write_ms']:.0f}ms, {info['mode']} took {info['apply_ms']:.0f}ms")
+    return 0 if ok else 1
+
+
+def cmd_watchdog(args) -> int:
+    if not args.dry_run and not util.is_root():
+        print("wiremec watchdog: run as root to re-apply peers (or use --dry-run)")
+        return 1
+    dog = Watchdog(args.stale)
+    was_up = None
+    try:
+        while True:
+            snap = sample(args.iface)
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            if snap["up"] != was_up:
+                print(f"{stamp}\t{args.iface} is {'up' if snap['up'] else 'down'}")
+                was_up = snap["up"]
+            for pub in dog.due(snap, snap["at"]):
+                li = snap["peers"][pub]
+                age = dog.age(pub, li, snap["at"])
+                fp = wg.pub_fingerprint(pub)
+                print(f"{stamp}\tstale\t{fp}\tlast handshake {f'{age:.0f}s ago' if li['hs'] else 'never'}\t{li['endpoint']}")
+                if not args.dry_run:
+                    ok, msg = recover_peer(args.iface, pub, li["endpoint"])
+                    print(f"{stamp}\t{'recovered' if ok else 'FAILED'}\t{fp}\t{msg}")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
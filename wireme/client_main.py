@@ -3,8 +3,7 @@ from __future__ import annotations
 import argparse
 import sys
 
-from . import __version__
-from .client_tui import run as run_tui
+from . import __version__, client_cli, client_ops, probe
 
 
 def main(argv: list[str] | None = None) -> int:
@@ -13,12 +12,67 @@ def main(argv: list[str] | None = None) -> int:
         description="WireGuard client manager TUI (import config, up/down, status).",
     )
     parser.add_argument("--version", action="store_true", help="Print version and exit.")
+    sub = parser.add_subparsers(dest="cmd")
+
+    p = sub.add_parser("endpoints", help="Show, or set, the candidate server endpoints of an interface.")
+    p.add_argument("iface")
+    p.add_argument("endpoints", nargs="*", metavar="HOST:PORT", help="Replace the candidate list.")
+    p.set_defaults(func=client_cli.cmd_endpoints)
+
+    p = sub.add_parser(
+        "probe",
+        help="Probe candidate endpoints concurrently (handshake RTT) and optionally switch.",
+        description="Each probe is a real handshake initiation, so a server that answers points this peer at the probe "
+        "socket until the tunnel sends again. After every round the running interface sends a keepalive at once to "
+        "take it back; server-to-client traffic can still be lost for up to one round (tries x timeout, 3s by default).",
+    )
+    p.add_argument("iface")
+    p.add_argument("--switch", action="store_true", help="Move the running interface to the fastest endpoint (wg set).")
+    p.add_argument("--watch", type=float, default=0, metavar="SECS", help="Re-probe every SECS seconds.")
+    p.add_argument("--timeout", type=float, default=probe.TIMEOUT, help="Per-try reply timeout (seconds).")
+    p.add_argument("--tries", type=int, default=probe.TRIES, help="Initiations per endpoint (best RTT wins).")
+    p.set_defaults(func=client_cli.cmd_probe)
+
+    p = sub.add_parser("import", help="Validate and install many client configs (dir, tar/zip archive, or - for stdin).")
+    p.add_argument("source", help="Directory, .tar[.gz|.bz2|.xz]/.tgz/.zip archive, a single .conf, or -.")
+    p.add_argument("--iface", help="Interface name for a single config (default: '# iface:' comment or file name).")
+    p.add_argument("--dry-run", action="store_true", help="Only validate and report.")
+    p.add_argument("--skip-existing", action="store_true", help="Leave already installed interfaces alone.")
+    p.add_argument("--up", action="store_true", help="wg-quick up every installed interface afterwards.")
+    p.add_argument("-j", "--parallel", type=int, default=8, help="wg-quick up runs at once with --up (default: 8).")
+    p.set_defaults(func=client_cli.cmd_import)
+
+    p = sub.add_parser("profile", help="List, save or remove switchable client profiles.")
+    p.add_argument("action", choices=["list", "save", "rm"])
+    p.add_argument("name", nargs="?")
+    p.add_argument("source", nargs="?", help="With save: a client .conf, or - for stdin.")
+    p.add_argument("--from", dest="iface_src", metavar="IFACE", help="With save: snapshot the installed /etc/wireguard/IFACE.conf.")
+    p.add_argument("--iface", help="With save: the interface this profile is switched into (default: --from).")
+    p.set_defaults(func=client_cli.cmd_profile)
+
+    p = sub.add_parser("switch", help="Switch an interface to a saved profile (wg syncconf when only peers differ).")
+    p.add_argument("profile")
+    p.add_argument("--iface", help="Interface to switch (default: the profile's '# iface:' line).")
+    p.set_defaults(func=client_cli.cmd_switch)
+
+    p = sub.add_parser("watchdog", help="Watch handshakes and re-apply stale peers in place (re-resolving their Endpoint).")
+    p.add_argument("iface")
+    p.add_argument("--stale", type=float, default=client_ops.STALE, help="Seconds without a handshake before a peer counts as stuck.")
+    p.add_argument("--interval", type=float, default=5.0, help="Seconds between checks.")
+    p.add_argument("--dry-run", action="store_true", help="Only report stale peers.")
+    p.set_defaults(func=client_cli.cmd_watchdog)
+
     args = parser.parse_args(argv)
 
     if args.version:
         print(__version__)
         return 0
 
+    if args.cmd:
+        return int(args.func(args))
+
+    from .client_tui import run as run_tui
+
     run_tui()
     return 0
 
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
-import os
+import base64
+import ipaddress
 import re
-from pathlib import Path
+import socket
+import tarfile
+import time
+import zipfile
+from pathlib import Path, PurePosixPath
 
-from . import util, wg
+from . import backups, probe, transport, util, wg
 
 
 def parse_iface_name_from_text(conf_text: str) -> str | None:
@@ -19,16 +24,149 @@ def parse_iface_name_from_text(conf_text: str) -> str | None:
     return None
 
 
+_IFACE_KEYS = {
+    "PrivateKey",
+    "Address",
+    "DNS",
+    "MTU",
+    "Table",
+    "ListenPort",
+    "FwMark",
+    "PreUp",
+    "PostUp",
+    "PreDown",
+    "PostDown",
+    "SaveConfig",
+}
+_PEER_KEYS = {"PublicKey", "PresharedKey", "AllowedIPs", "Endpoint", "PersistentKeepalive"}
+_MULTI_KEYS = {"Address", "DNS", "AllowedIPs", "PreUp", "PostUp", "PreDown", "PostDown"}
+_IFACE_NAME_RE = re.compile(r"^[a-zA-Z0-9_.-]{1,32}$")
+
+
+def _check_key(v: str) -> bool:
+    try:
+        return len(base64.b64decode(v, validate=True)) == 32
+    except ValueError:
+        return False
+
+
+def _check_int(v: str, lo: int, hi: int) -> bool:
+    return v.isdigit() and lo <= int(v) <= hi
+
+
+def _check_endpoint(v: str) -> bool:
+    try:
+        host, port = probe.split_endpoint(v)
+    except ValueError:
+        return False
+    return bool(host) and 1 <= port <= 65535
+
+
+def parse_client_conf(conf_text: str) -> tuple[dict, list[str]]:
+    """
+    Parse a wg-quick client config into {"interface": {...}, "peers": [{...}, ...]}
+    (multi-valued keys become lists) and return it with a list of problems found:
+    unknown sections/keys, duplicate single-valued keys, key length, CIDR, port checks.
+    """
+    conf: dict = {"interface": None, "peers": []}
+    errors: list[str] = []
+    section = None
+    current: dict | None = None
+    for n, raw in enumerate(conf_text.splitlines(), 1):
+        ln = raw.split("#", 1)[0].strip() if not raw.strip().startswith("#") else ""
+        if not ln:
+            continue
+        if ln.startswith("[") and ln.endswith("]"):
+            tag = ln[1:-1].strip().lower()
+            if tag == "interface":
+                if conf["interface"] is not None:
+                    errors.append(f"line {n}: duplicate [Interface] section")
+                current = conf["interface"] = {}
+                section = "iface"
+            elif tag == "peer":
+                current = {}
+                conf["peers"].append(current)
+                section = "peer"
+            else:
+                errors.append(f"line {n}: unknown section {ln}")
+                section, current = None, None
+            continue
+        if "=" not in ln:
+            errors.append(f"line {n}: expected 'Key = Value'")
+            continue
+        k, v = [x.strip() for x in ln.split("=", 1)]
+        if current is None:
+            errors.append(f"line {n}: {k} outside of a section")
+            continue
+        allowed = _IFACE_KEYS if section == "iface" else _PEER_KEYS
+        if k not in allowed:
+            errors.append(f"line {n}: unknown key {k} in [{'Interface' if section == 'iface' else 'Peer'}]")
+            continue
+        if k in _MULTI_KEYS:
+            current.setdefault(k, []).extend(x.strip() for x in v.split(",") if x.strip())
+        elif k in current:
+            errors.append(f"line {n}: duplicate {k}")
+        else:
+            current[k] = v
+
+    iface = conf["interface"]
+    if iface is None:
+        errors.append("missing [Interface] section")
+        iface = {}
+    if not iface.get("PrivateKey"):
+        errors.append("[Interface] missing PrivateKey")
+    elif not _check_key(iface["PrivateKey"]):
+        errors.append("[Interface] PrivateKey is not a base64 32-byte key")
+    for a in iface.get("Address", []):
+        try:
+            ipaddress.ip_interface(a)
+        except ValueError:
+            errors.append(f"[Interface] bad Address {a!r}")
+    for d in iface.get("DNS", []):
+        try:
+            ipaddress.ip_address(d)
+        except ValueError:
+            if not re.match(r"^[a-zA-Z0-9.-]+$", d):
+                errors.append(f"[Interface] bad DNS entry {d!r}")
+    if "ListenPort" in iface and not _check_int(iface["ListenPort"], 0, 65535):
+        errors.append(f"[Interface] bad ListenPort {iface['ListenPort']!r}")
+    if "MTU" in iface and not _check_int(iface["MTU"], 576, 65535):
+        errors.append(f"[Interface] bad MTU {iface['MTU']!r}")
+
+    if not conf["peers"]:
+        errors.append("missing [Peer] section")
+    seen: set[str] = set()
+    for i, p in enumerate(conf["peers"], 1):
+        tag = f"[Peer] #{i}"
+        pub = p.get("PublicKey")
+        if not pub:
+            errors.append(f"{tag} missing PublicKey")
+        elif not _check_key(pub):
+            errors.append(f"{tag} PublicKey is not a base64 32-byte key")
+        elif pub in seen:
+            errors.append(f"{tag} duplicate PublicKey")
+        else:
+            seen.add(pub)
+        if "PresharedKey" in p and not _check_key(p["PresharedKey"]):
+            errors.append(f"{tag} PresharedKey is not a base64 32-byte key")
+        for a in p.get("AllowedIPs", []):
+            try:
+                ipaddress.ip_network(a, strict=False)
+            except ValueError:
+                errors.append(f"{tag} bad AllowedIPs entry {a!r}")
+        if "Endpoint" in p and not _check_endpoint(p["Endpoint"]):
+            errors.append(f"{tag} bad Endpoint {p['Endpoint']!r}")
+        if "PersistentKeepalive" in p and p["PersistentKeepalive"] != "off" and not _check_int(p["PersistentKeepalive"], 0, 65535):
+            errors.append(f"{tag} bad PersistentKeepalive {p['PersistentKeepalive']!r}")
+    return conf, errors
+
+
 def validate_client_conf_text(conf_text: str) -> tuple[bool, str]:
-    txt = conf_text.strip()
-    if not txt:
+    if not conf_text.strip():
         return False, "Empty config."
-    if "[Interface]" not in txt:
-        return False, "Missing [Interface] section."
-    if "PrivateKey" not in txt:
-        return False, "Missing PrivateKey."
-    if "[Peer]" not in txt:
-        return False, "Missing [Peer] section."
+    _, errors = parse_client_conf(conf_text)
+    if errors:
+        return False, "\n".join(errors)
     return True, "OK"
 
 
@@ -37,27 +175,29 @@ def install_client_conf(iface: str, conf_text: str) -> tuple[bool, str]:
     if not ok:
         return False, msg
 
-    if not iface or not re.match(r"^[a-zA-Z0-9_.-]{1,32}$", iface):
+    if not iface or not _IFACE_NAME_RE.match(iface):
         return False, "Invalid interface name."
 
-    target = wg.WIREGUARD_DIR / f"{iface}.conf"
+    t = transport.current()
+    target = wg.conf_path(iface)
     backup = None
     try:
-        wg.WIREGUARD_DIR.mkdir(parents=True, exist_ok=True)
+        t.mkdir(wg.WIREGUARD_DIR)
     except Exception as e:
         return False, f"Failed to create {wg.WIREGUARD_DIR}: {e}"
 
-    if target.exists():
+    with wg.locked(target):
+        if t.exists(target):
+            try:
+                backup = backups.save(target)
+            except Exception as e:
+                return False, f"Failed to create backup: {e}"
+
         try:
-            backup = wg.backup(target)
+            wg.write_conf(target, conf_text.rstrip() + "\n")
+            t.chmod(target, 0o600)
         except Exception as e:
-            return False, f"Failed to create backup: {e}"
-
-    try:
-        target.write_text(conf_text.rstrip() + "\n")
-        os.chmod(target, 0o600)
-    except Exception as e:
-        return False, f"Failed to write {target}: {e}"
+            return False, f"Failed to write {target}: {e}"
 
     if backup:
         return True, f"Installed {target}\nBackup: {backup}"
@@ -79,3 +219,422 @@ def wg_quick_down(iface: str):
 def wg_show(iface: str):
     return util.run(["wg", "show", iface], timeout=10)
 
+
+# ---------- Profiles ----------
+#
+# Saved client configs under /etc/wireguard/.wireme/profiles/<name>.conf (out of the
+# *.conf glob), switched into /etc/wireguard/<iface>.conf. When the interface is up and
+# only peer data differs (server key, PresharedKey, endpoint, keepalive), the switch is
+# a `wg syncconf` on the running device: addresses, routes and DNS stay in place and
+# open connections survive. Anything wg-quick applies itself needs a down/up.
+
+PROFILES_DIR = "profiles"
+# [Interface] keys wg-quick (not wg) applies; AllowedIPs count too, as they become routes
+_CYCLE_KEYS = ("Address", "DNS", "MTU", "Table", "FwMark", "PreUp", "PostUp", "PreDown", "PostDown", "SaveConfig")
+
+
+def profiles_dir() -> Path:
+    return wg.WIREGUARD_DIR / ".wireme" / PROFILES_DIR
+
+
+def profile_path(name: str) -> Path:
+    return profiles_dir() / f"{name}.conf"
+
+
+def list_profiles() -> list[dict]:
+    """name, iface ('# iface:' comment or None) and active (installed config matches)."""
+    t = transport.current()
+    out = []
+    for p in t.glob(profiles_dir(), "*.conf"):
+        text = t.read_bytes(p).decode("utf-8", errors="replace")
+        iface = parse_iface_name_from_text(text)
+        active = bool(iface) and wg.read_conf(wg.conf_path(iface)) == text.rstrip() + "\n"
+        out.append({"name": p.stem, "iface": iface, "active": active})
+    return out
+
+
+def save_profile(name: str, conf_text: str, iface: str | None = None) -> tuple[bool, str]:
+    """Validate and store a profile; iface (if given) is recorded as its '# iface:' line."""
+    if not _IFACE_NAME_RE.match(name or ""):
+        return False, "Invalid profile name (letters, digits, _ . - only)."
+    ok, msg = validate_client_conf_text(conf_text)
+    if not ok:
+        return False, msg
+    if iface:
+        kept = [ln for ln in conf_text.splitlines(True) if not re.match(r"#\s*iface\s*:", ln.strip())]
+        conf_text = f"# iface: {iface}\n" + "".join(kept)
+    t = transport.current()
+    t.mkdir(profiles_dir())
+    t.write_atomic(profile_path(name), (conf_text.rstrip() + "\n").encode("utf-8"), mode=0o600)
+    return True, f"Saved profile {name} ({profile_path(name)})"
+
+
+def delete_profile(name: str) -> tuple[bool, str]:
+    t = transport.current()
+    p = profile_path(name)
+    if not _IFACE_NAME_RE.match(name or "") or not t.exists(p):
+        return False, f"No such profile: {name}"
+    t.unlink(p)
+    return True, f"Deleted profile {name}"
+
+
+def _routes(conf: dict) -> set[str]:
+    out = set()
+    for p in conf["peers"]:
+        for a in p.get("AllowedIPs", []):
+            try:
+                out.add(str(ipaddress.ip_network(a, strict=False)))
+            except ValueError:
+                out.add(a)
+    return out
+
+
+def cycle_reasons(old_text: str, new_text: str) -> list[str]:
+    """What a wg syncconf cannot apply between two client configs (empty: syncconf is enough)."""
+    old, _ = parse_client_conf(old_text)
+    new, _ = parse_client_conf(new_text)
+    oi, ni = old["interface"] or {}, new["interface"] or {}
+    reasons = [f"{k} differs" for k in _CYCLE_KEYS if oi.get(k) != ni.get(k)]
+    if _routes(old) != _routes(new):
+        reasons.append("AllowedIPs (routes) differ")
+    return reasons
+
+
+def switch_profile(name: str, iface: str | None = None) -> tuple[bool, str, dict]:
+    """
+    Install profile name as iface's config and bring the running interface over to it:
+    wg syncconf when only peer data changes, wg-quick down/up otherwise, wg-quick up when
+    it is down.
+
+    Returns (ok, msg, info); info carries iface, mode, reasons, write_ms, apply_ms.
+    """
+    t = transport.current()
+    p = profile_path(name)
+    if not _IFACE_NAME_RE.match(name or "") or not t.exists(p):
+        return False, f"No such profile: {name}", {}
+    text = t.read_bytes(p).decode("utf-8", errors="replace")
+    iface = iface or parse_iface_name_from_text(text)
+    if not iface:
+        return False, f"Profile {name} has no '# iface:' line; pass an interface.", {}
+
+    old = wg.read_conf(wg.conf_path(iface))
+    head, _ = wg.live_dump(iface)
+    up = head is not None
+    if up and old == text.rstrip() + "\n":
+        return True, f"{iface} is already on profile {name}.", {"iface": iface, "mode": "none", "reasons": [], "write_ms": 0.0, "apply_ms": 0.0}
+    reasons = cycle_reasons(old, text) if up and old else []
+
+    t0 = time.perf_counter()
+    ok, msg = install_client_conf(iface, text)
+    t1 = time.perf_counter()
+    if not ok:
+        return False, msg, {}
+    info = {"iface": iface, "reasons": reasons, "write_ms": (t1 - t0) * 1000}
+
+    if not up:
+        info["mode"] = "up"
+        rc, out, err = wg_quick_up(iface)
+    elif not reasons:
+        info["mode"] = "syncconf"
+        rc, out, err = wg.apply_now(iface)
+        if rc != 0:  # e.g. wg-quick strip refused the config: the full cycle still works
+            info["reasons"] = [f"wg syncconf failed: {(err or out).strip()}"]
+    if up and info["reasons"]:
+        info["mode"] = "down/up"
+        wg_quick_down(iface)
+        rc, out, err = wg_quick_up(iface)
+    info["apply_ms"] = (time.perf_counter() - t1) * 1000
+    if rc != 0:
+        return False, f"Installed profile {name} on {iface}, but {info['mode']} failed: {(err or out).strip()}", info
+    return True, f"Switched {iface} to profile {name} ({info['mode']}).", info
+
+
+ENDPOINTS_META = "endpoints"
+
+
+def client_profile(iface: str):
+    """(interface cfg, first peer) of an installed client config."""
+    cfg, peers, _ = wg.parse_conf(wg.conf_path(iface))
+    return cfg, (peers[0] if peers else None)
+
+
+def candidate_endpoints(peer: dict) -> list[str]:
+    """The '# wireme-endpoints:' list plus the config's own Endpoint, deduplicated."""
+    out: list[str] = []
+    for ep in (peer.get(ENDPOINTS_META) or "").split(","):
+        ep = ep.strip()
+        if ep and ep not in out:
+            out.append(ep)
+    cur = (peer.get("Endpoint") or "").strip()
+    if cur and cur not in out:
+        out.append(cur)
+    return out
+
+
+def _rewrite_first_peer(iface: str, edit) -> tuple[bool, str]:
+    target = wg.conf_path(iface)
+    with wg.locked(target):
+        sig = wg.conf_sig(target)
+        _, peers, lines = wg.parse_conf(target)
+        if not peers:
+            return False, f"No [Peer] in {target}."
+        try:
+            wg.write_conf(target, "".join(edit(lines, peers[0])), expect_sig=sig)
+        except Exception as e:
+            return False, f"Failed to write {target}: {e}"
+    return True, f"Updated {target}"
+
+
+def set_endpoints(iface: str, endpoints: list[str]) -> tuple[bool, str]:
+    """Store alternative endpoints as '# wireme-endpoints:' right above the [Peer] line."""
+
+    def edit(lines: list[str], peer: dict) -> list[str]:
+        start = peer["start"]
+        head = [ln for ln in lines[:start] if not ln.strip().startswith(f"# {wg.META_PREFIX}{ENDPOINTS_META}:")]
+        meta = [f"# {wg.META_PREFIX}{ENDPOINTS_META}: {', '.join(endpoints)}\n"] if endpoints else []
+        return head + meta + lines[start:]
+
+    return _rewrite_first_peer(iface, edit)
+
+
+def set_conf_endpoint(iface: str, endpoint: str) -> tuple[bool, str]:
+    """Persist the chosen endpoint so the next wg-quick up starts with it."""
+
+    def edit(lines: list[str], peer: dict) -> list[str]:
+        out = list(lines)
+        for i in range(peer["start"], peer["end"]):
+            k = out[i].split("=", 1)[0].strip()
+            if k == "Endpoint":
+                out[i] = f"Endpoint = {endpoint}\n"
+                return out
+        out.insert(peer["start"] + 1, f"Endpoint = {endpoint}\n")
+        return out
+
+    return _rewrite_first_peer(iface, edit)
+
+
+# ---------- Live stats + handshake watchdog ----------
+#
+# One `wg show <iface> dump` per refresh; rates are deltas between two samples. A peer
+# whose last handshake is older than STALE is stuck (WireGuard re-handshakes every 2
+# minutes while there is traffic, and drops the session after 3): the watchdog
+# re-resolves its configured Endpoint, since the server's DNS name may have moved, and
+# re-applies the peer in place with `wg set`. Turning on a persistent keepalive makes
+# the kernel send one right away, which starts a fresh handshake. No down/up is needed.
+
+STALE = 180
+RETRY = 15  # first back-off after a recovery attempt (doubles per attempt, up to RETRY_MAX)
+RETRY_MAX = 300
+NUDGE_KEEPALIVE = "25"
+
+
+def sample(iface: str) -> dict:
+    """{"at": epoch, "up": bool, "peers": {pub: {endpoint, hs, rx, tx, keep, allowed}}} (ints where numeric)."""
+    head, live = wg.live_dump(iface)
+    peers = {}
+    for pub, li in live.items():
+        peers[pub] = dict(li, hs=int(li["hs"] or 0), rx=int(li["rx"] or 0), tx=int(li["tx"] or 0))
+    return {"at": time.time(), "up": head is not None, "peers": peers}
+
+
+def rates(prev: dict | None, cur: dict) -> dict[str, tuple[float, float]]:
+    """{pub: (rx bytes/s, tx bytes/s)} between two samples (0 after a counter reset)."""
+    out: dict[str, tuple[float, float]] = {}
+    dt = cur["at"] - prev["at"] if prev else 0
+    for pub, li in cur["peers"].items():
+        old = prev["peers"].get(pub) if prev else None
+        if old is None or dt <= 0:
+            out[pub] = (0.0, 0.0)
+            continue
+        out[pub] = (max(0, li["rx"] - old["rx"]) / dt, max(0, li["tx"] - old["tx"]) / dt)
+    return out
+
+
+class Watchdog:
+    """
+    Decides which peers need a recovery attempt: handshake older than stale seconds (or
+    none at all after stale seconds of watching). Attempts back off per peer and the
+    back-off resets once the peer handshakes again.
+    """
+
+    def __init__(self, stale: float = STALE):
+        self.stale = stale
+        self.first_seen: dict[str, float] = {}
+        self.next_try: dict[str, float] = {}
+        self.backoff: dict[str, float] = {}
+
+    def age(self, pub: str, li: dict, now: float) -> float | None:
+        """Seconds since the last handshake (None: never, and not watched long enough to judge)."""
+        self.first_seen.setdefault(pub, now)
+        if li["hs"]:
+            return now - li["hs"]
+        waited = now - self.first_seen[pub]
+        return waited if waited > self.stale else None
+
+    def is_stale(self, pub: str, li: dict, now: float) -> bool:
+        age = self.age(pub, li, now)
+        return age is not None and age > self.stale
+
+    def due(self, snap: dict, now: float | None = None) -> list[str]:
+        """Stale peers whose back-off has expired; each is booked as attempted."""
+        now = time.time() if now is None else now
+        out = []
+        for pub, li in snap["peers"].items():
+            if not self.is_stale(pub, li, now):
+                self.next_try.pop(pub, None)
+                self.backoff.pop(pub, None)
+                continue
+            if now < self.next_try.get(pub, 0):
+                continue
+            b = min(RETRY_MAX, self.backoff.get(pub, RETRY / 2) * 2)
+            self.backoff[pub] = b
+            self.next_try[pub] = now + b
+            out.append(pub)
+        return out
+
+
+def _resolve(endpoint: str, current: str | None) -> str:
+    """Configured host:port -> ip:port ([v6]:port); keeps current if it is still among the answers."""
+    host, port = probe.split_endpoint(endpoint)
+    addrs = []
+    for fam, _, _, _, sa in socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM):
+        a = f"[{sa[0]}]:{sa[1]}" if fam == socket.AF_INET6 else f"{sa[0]}:{sa[1]}"
+        if a not in addrs:
+            addrs.append(a)
+    if not addrs:
+        raise OSError(f"{host} does not resolve")
+    return current if current in addrs else addrs[0]
+
+
+def _configured_keepalive(peer: dict) -> str:
+    keep = (peer.get("PersistentKeepalive") or "").strip()
+    return "" if keep == "off" else keep
+
+
+def _nudge(iface: str, pub: str, keep: str) -> tuple[int, str, str]:
+    # the kernel sends a keepalive at once only when persistent-keepalive goes from off to on
+    util.run(["wg", "set", iface, "peer", pub, "persistent-keepalive", "off"], timeout=10)
+    rc, out, err = util.run(["wg", "set", iface, "peer", pub, "persistent-keepalive", keep or NUDGE_KEEPALIVE], timeout=10)
+    if rc == 0 and not keep:  # the nudge is out; put the configured behaviour back
+        util.run(["wg", "set", iface, "peer", pub, "persistent-keepalive", "off"], timeout=10)
+    return rc, out, err
+
+
+def nudge_peer(iface: str, pub: str) -> tuple[bool, str]:
+    """
+    Make the running interface send to pub right away (one keepalive). After a probe
+    the server has roamed this peer to the probe socket; the keepalive makes it
+    re-learn the real endpoint. Returns (ok, message).
+    """
+    _, peers, _ = wg.parse_conf(wg.conf_path(iface))
+    peer = next((p for p in peers if p.get("PublicKey") == pub), None)
+    rc, out, err = _nudge(iface, pub, _configured_keepalive(peer or {}))
+    if rc != 0:
+        return False, f"keepalive to {wg.pub_fingerprint(pub)} failed: {(err or out).strip()}"
+    return True, f"sent a keepalive to {wg.pub_fingerprint(pub)}"
+
+
+def recover_peer(iface: str, pub: str, current: str | None = None) -> tuple[bool, str]:
+    """
+    Re-resolve pub's configured Endpoint and re-apply it in place (wg set endpoint,
+    then a keepalive, which triggers a new handshake). Returns (ok, message).
+    """
+    _, peers, _ = wg.parse_conf(wg.conf_path(iface))
+    peer = next((p for p in peers if p.get("PublicKey") == pub), None)
+    if peer is None:
+        return False, f"{wg.pub_fingerprint(pub)} is not in {wg.conf_path(iface)}"
+    ep = (peer.get("Endpoint") or "").strip()
+    if not ep:
+        return False, f"{wg.pub_fingerprint(pub)} has no Endpoint to re-resolve"
+    current = None if current in (None, "", "(none)") else current
+    try:
+        addr = _resolve(ep, current)
+    except (OSError, ValueError) as e:
+        return False, f"resolving {ep}: {e}"
+    rc, out, err = util.run(["wg", "set", iface, "peer", pub, "endpoint", addr], timeout=10)
+    if rc == 0:
+        rc, out, err = _nudge(iface, pub, _configured_keepalive(peer))
+    if rc != 0:
+        return False, f"wg set failed: {(err or out).strip()}"
+    moved = f"{current} -> {addr}" if current and current != addr else addr
+    return True, f"re-applied {wg.pub_fingerprint(pub)} ({ep} = {moved})"
+
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip")
+MAX_IMPORT_BYTES = 1_000_000
+
+
+def import_sources(source: str, stdin_text: str | None = None) -> list[tuple[str, str]]:
+    """
+    (label, text) for every *.conf in a directory or archive (tar/zip), or for
+    stdin when source is '-'. Labels are paths / archive member names.
+    """
+    if source == "-":
+        return [("<stdin>", stdin_text or "")]
+    p = Path(source)
+    if p.is_dir():
+        return [(str(f), util.read_text(f)) for f in sorted(p.rglob("*.conf")) if f.is_file()]
+    name = p.name.lower()
+    if name.endswith(".zip"):
+        out: list[tuple[str, str]] = []
+        with zipfile.ZipFile(p) as z:
+            for info in z.infolist():
+                if not info.is_dir() and info.filename.endswith(".conf") and info.file_size <= MAX_IMPORT_BYTES:
+                    out.append((f"{p.name}:{info.filename}", z.read(info).decode("utf-8", errors="replace")))
+        return sorted(out)
+    if name.endswith(ARCHIVE_SUFFIXES):
+        out = []
+        with tarfile.open(p) as t:
+            for m in t.getmembers():
+                if m.isfile() and m.name.endswith(".conf") and m.size <= MAX_IMPORT_BYTES:
+                    f = t.extractfile(m)
+                    if f is not None:
+                        out.append((f"{p.name}:{m.name}", f.read().decode("utf-8", errors="replace")))
+        return sorted(out)
+    if p.is_file():
+        return [(str(p), util.read_text(p))]
+    raise FileNotFoundError(source)
+
+
+def _import_one(label: str, text: str, iface: str | None) -> dict:
+    stem = PurePosixPath(label.split(":", 1)[-1]).stem if label != "<stdin>" else ""
+    name = iface or parse_iface_name_from_text(text) or stem
+    ok, msg = validate_client_conf_text(text)
+    if ok and not _IFACE_NAME_RE.match(name or ""):
+        ok, msg = False, f"cannot derive an interface name (got {name!r}); add '# iface: wg0'"
+    return {"label": label, "iface": name, "text": text, "ok": ok, "msg": msg}
+
+
+def validate_many(sources: list[tuple[str, str]], iface: str | None = None) -> list[dict]:
+    """
+    Parse/validate all sources, then flag interface names claimed twice. Sequential:
+    it is pure-Python text work (~20us a config), so threads would only take turns.
+    """
+    items = [_import_one(label, text, iface) for label, text in sources]
+    owners: dict[str, list[dict]] = {}
+    for it in items:
+        if it["ok"]:
+            owners.setdefault(it["iface"], []).append(it)
+    for name, its in owners.items():
+        if len(its) > 1:
+            for it in its:
+                others = ", ".join(o["label"] for o in its if o is not it)
+                it["ok"], it["msg"] = False, f"duplicate interface {name} (also in {others})"
+    return items
+
+
+def install_many(items: list[dict], skip_existing: bool = False) -> list[dict]:
+    """Install every valid item in one pass; marks each with installed/skipped and a message."""
+    t = transport.current()
+    for it in items:
+        it["installed"] = False
+        if not it["ok"]:
+            continue
+        if skip_existing and t.exists(wg.conf_path(it["iface"])):
+            it["msg"] = "exists, skipped"
+            continue
+        ok, msg = install_client_conf(it["iface"], it["text"])
+        it["installed"], it["msg"] = ok, msg
+        if not ok:
+            it["ok"] = False
+    return items
@@ -1,11 +1,25 @@
 from __future__ import annotations
 
 import curses
+import time
 from pathlib import Path
 
-from . import util, wg
-from .client_ops import install_client_conf, parse_iface_name_from_text, wg_quick_down, wg_quick_up, wg_show
-from .ui import init_curses, menu, msg_any_key, prompt, draw_header, draw_box
+from . import jobs, util, wg
+from .client_cli import probe_and_switch
+from .client_ops import (
+    Watchdog,
+    install_client_conf,
+    list_profiles,
+    parse_iface_name_from_text,
+    rates,
+    recover_peer,
+    sample,
+    switch_profile,
+    wg_quick_down,
+    wg_quick_up,
+    wg_show,
+)
+from .ui import frame, init_curses, jobs_screen, menu, msg_any_key, prompt, prompt_multiline, draw_header, draw_box, wait_job
 
 APP_NAME = "wiremec"
 
@@ -21,8 +35,138 @@ def _pick_iface_from_existing(stdscr) -> str | None:
     return items[idx]
 
 
+def _describe_probe(result) -> tuple[bool, str]:
+    results, best, note = result
+    lines = [note or ("no endpoint answered" if best is None else f"fastest: {best['endpoint']}")]
+    for r in results:
+        rtt = f"{r['rtt_ms']:.1f}ms" if r["rtt_ms"] is not None else "-"
+        lines.append(f"{r['endpoint']}  {r['addr'] or '-'}  {rtt}  {r['error']}")
+    return best is not None, "\n".join(lines)
+
+
+def _describe_switch(result) -> tuple[bool, str]:
+    ok, msg, info = result
+    if info.get("mode") not in (None, "none"):
+        msg += f"\n{info['mode']} took {info['apply_ms']:.0f}ms"
+        if info["mode"] == "down/up":
+            msg += "\n" + "; ".join(info["reasons"])
+    return ok, msg
+
+
+def _switch_profile_flow(stdscr, iface: str):
+    profiles = [p for p in list_profiles() if p["iface"] in (None, iface)]
+    if not profiles:
+        msg_any_key(stdscr, APP_NAME, "Profiles", f"No profiles for {iface}.\n\nSave one with: wiremec profile save NAME FILE --iface {iface}")
+        return
+    items = [("* " if p["active"] else "  ") + p["name"] for p in profiles] + ["Back"]
+    act, idx = menu(stdscr, APP_NAME, "Switch profile", items, subtitle=f"{iface}: peer-only changes switch in place")
+    if act != "open" or idx is None or idx == len(items) - 1:
+        return
+    name = profiles[idx]["name"]
+    jobs.submit(f"switch {iface} -> {name}", switch_profile, name, iface, describe=_describe_switch)
+
+
+REFRESH = 1.0
+DASH_HELP = "a auto-recover  •  r recover stale now  •  w wg show  •  Esc/Backspace back"
+
+
+def _size(n: float) -> str:
+    for unit in ("B", "K", "M", "G", "T"):
+        if n < 1024 or unit == "T":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return str(n)
+
+
+def _age(secs: float | None) -> str:
+    if secs is None:
+        return "never"
+    secs = int(secs)
+    return f"{secs}s" if secs < 120 else f"{secs // 60}m{secs % 60:02d}s" if secs < 3600 else f"{secs // 3600}h{secs % 3600 // 60:02d}m"
+
+
+def _dashboard_screen(stdscr, iface: str):
+    """Live per-peer endpoint, handshake age and rates; the watchdog recovers stale peers (a)."""
+    dog = Watchdog()
+    auto = False
+    prev = None
+    events: list[str] = []
+    next_at = 0.0
+    shown = None
+    while True:
+        now = time.time()
+        if now >= next_at:
+            cur = sample(iface)
+            rate = rates(prev, cur)
+            prev, next_at = cur, now + REFRESH
+            if auto:
+                for pub in dog.due(cur, now):
+                    events.append(f"{time.strftime('%H:%M:%S')} {wg.pub_fingerprint(pub)} stale, recovering")
+                    ep = cur["peers"][pub]["endpoint"]
+                    jobs.submit(f"recover {wg.pub_fingerprint(pub)}", recover_peer, iface, pub, ep, describe=lambda r: r)
+        fr = frame(stdscr)
+        if shown is not fr:
+            fr.paint(APP_NAME, f"{iface} • Live", "Peers", DASH_HELP)
+            shown = fr
+        else:
+            fr.header(APP_NAME, f"{iface} • Live")
+        state = "up" if prev["up"] else "down"
+        fr.row(1, f"Status: {state}   refresh {REFRESH:.0f}s   watchdog: {'auto-recover' if auto else 'watch only'} (stale > {dog.stale:.0f}s)")
+        fr.row(3, f"{'peer':<10}{'endpoint':<28}{'handshake':<11}{'rx/s':>9}{'tx/s':>9}{'rx':>10}{'tx':>10}", curses.A_DIM)
+        last = fr.h - 6  # last row inside the box
+        peers = list(prev["peers"].items())
+        y = 4
+        for pub, li in peers[: max(1, last - y - 3)]:  # keep a few rows for watchdog events
+            age = dog.age(pub, li, prev["at"])
+            rx_s, tx_s = rate.get(pub, (0.0, 0.0))
+            line = f"{wg.pub_fingerprint(pub):<10}{li['endpoint'][:27]:<28}{_age(age):<11}{_size(rx_s):>9}{_size(tx_s):>9}{_size(li['rx']):>10}{_size(li['tx']):>10}"
+            fr.row(y, line, curses.color_pair(4) if dog.is_stale(pub, li, prev["at"]) else 0)
+            y += 1
+        if not peers:
+            fr.row(y, "(no peers: interface down or wg show failed)", curses.A_DIM)
+            y += 1
+        fr.row(y, "")
+        y += 1
+        for ev in events[-(last - y + 1) :] if last >= y else []:
+            fr.row(y, ev, curses.A_DIM)
+            y += 1
+        while y <= last:
+            fr.row(y, "")
+            y += 1
+        fr.flush()
+
+        k = fr.getch(timeout=max(0.05, next_at - time.time()))
+        if k == -1:
+            continue
+        if k in (ord("q"), 27, curses.KEY_BACKSPACE, 127):
+            return
+        if k == ord("J"):
+            jobs_screen(stdscr, APP_NAME)
+            shown = None
+        elif k == ord("w"):
+            _status_screen(stdscr, iface)
+            shown = None
+        elif k in (ord("a"), ord("r")):
+            if not util.is_root():
+                msg_any_key(stdscr, APP_NAME, "Watchdog", "Run as root to re-apply peers (wg set).")
+                shown = None
+                continue
+            if k == ord("a"):
+                auto = not auto
+                events.append(f"{time.strftime('%H:%M:%S')} auto-recover {'on' if auto else 'off'}")
+            else:
+                for pub, li in prev["peers"].items():
+                    if dog.is_stale(pub, li, time.time()):
+                        events.append(f"{time.strftime('%H:%M:%S')} {wg.pub_fingerprint(pub)} recovering")
+                        jobs.submit(f"recover {wg.pub_fingerprint(pub)}", recover_peer, iface, pub, li["endpoint"], describe=lambda r: r)
+        del events[:-50]
+
+
 def _status_screen(stdscr, iface: str):
-    rc, out, err = wg_show(iface)
+    job = wait_job(stdscr, APP_NAME, "Status", jobs.submit(f"wg show {iface}", wg_show, iface))
+    if job is None:
+        return
+    rc, out, err = job.result if job.result else (1, "", job.text)
     if rc != 0:
         msg_any_key(stdscr, APP_NAME, "Status", f"wg show failed for {iface}.\n\n{err or out}")
         return
@@ -49,13 +193,7 @@ def _import_config_flow(stdscr):
 
     conf_text = ""
     if idx == 0:
-        msg_any_key(
-            stdscr,
-            APP_NAME,
-            "Paste",
-            "Paste the config at the prompt.\n\nTip: You can also include a line like:\n# iface: wg0\n\nThe paste prompt is one line; if you need multi-line, use the file path option.",
-        )
-        conf_text = prompt(stdscr, "Config (single line):", default="").strip()
+        conf_text = prompt_multiline(stdscr, APP_NAME, "Paste config", hint="Tip: a '# iface: wg0' line names the interface.")
     elif idx == 1:
         path_str = prompt(stdscr, "Path to client .conf:", default="").strip()
         if not path_str:
@@ -82,41 +220,48 @@ def _import_config_flow(stdscr):
 
     bring_up = prompt(stdscr, "Bring interface up now? (y/N):", default="n").lower().startswith("y")
     if bring_up:
-        rc, out, err = wg_quick_up(iface)
-        if rc != 0:
-            msg_any_key(stdscr, APP_NAME, "wg-quick up", f"Failed.\n\n{err or out}")
-        else:
-            msg_any_key(stdscr, APP_NAME, "wg-quick up", out or "OK")
+        jobs.submit(f"up {iface}", wg_quick_up, iface)
 
 
 def _iface_actions(stdscr, iface: str):
     while True:
         items = [
-            "Status (wg show)",
+            "Live status + watchdog",
             "Bring up (wg-quick up)",
             "Bring down (wg-quick down)",
+            "Probe endpoints + switch to fastest (wg set)",
+            "Switch profile",
             "Back",
         ]
         act, idx = menu(stdscr, APP_NAME, iface, items, subtitle="Actions")
         if act == "quit":
             return "quit"
-        if act in ("back",) or idx == 3:
+        if act in ("back",) or idx == 5:
             return "back"
         if act == "open":
             if idx == 0:
-                _status_screen(stdscr, iface)
+                _dashboard_screen(stdscr, iface)
             elif idx == 1:
                 if not util.is_root():
                     msg_any_key(stdscr, APP_NAME, "Up", "Run as root for wg-quick up.")
                     continue
-                rc, out, err = wg_quick_up(iface)
-                msg_any_key(stdscr, APP_NAME, "wg-quick up", out if rc == 0 else (err or out))
+                # runs in the background; other interfaces can be brought up meanwhile
+                jobs.submit(f"up {iface}", wg_quick_up, iface)
             elif idx == 2:
                 if not util.is_root():
                     msg_any_key(stdscr, APP_NAME, "Down", "Run as root for wg-quick down.")
                     continue
-                rc, out, err = wg_quick_down(iface)
-                msg_any_key(stdscr, APP_NAME, "wg-quick down", out if rc == 0 else (err or out))
+                jobs.submit(f"down {iface}", wg_quick_down, iface)
+            elif idx == 3:
+                if not util.is_root():
+                    msg_any_key(stdscr, APP_NAME, "Probe", "Run as root to switch endpoints.")
+                    continue
+                jobs.submit(f"probe {iface}", probe_and_switch, iface, True, describe=_describe_probe)
+            elif idx == 4:
+                if not util.is_root():
+                    msg_any_key(stdscr, APP_NAME, "Switch", "Run as root to switch profiles.")
+                    continue
+                _switch_profile_flow(stdscr, iface)
 
 
 def _main(stdscr):
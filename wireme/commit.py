@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from . import backups, peerdb, transport, wg
+
+WINDOW = 0.05
+RETRIES = 5
+
+
+class _Pending:
+    __slots__ = ("mutate", "apply", "done", "result")
+
+    def __init__(self, mutate, apply: bool):
+        self.mutate = mutate
+        self.apply = apply
+        self.done = threading.Event()
+        self.result = None
+
+
+class Lines(list):
+    """
+    The config lines a batch hands to its mutations. sig is the on-disk signature they
+    were read at (None once changed). A mutation may return a Lines of its own carrying
+    derived data in state (parsed addresses, indexes) for the next mutation of the same
+    batch; after (only) a successful write every after(sig) it collected is called, still
+    under the lock, with the new signature. Plain lists drop all of it.
+    """
+
+    def __init__(self, lines=(), sig: tuple[int, int] | None = None):
+        super().__init__(lines)
+        self.sig = sig
+        self.state: dict | None = None
+        self.after: list = []
+
+
+class GroupCommit:
+    """
+    Merge config mutations submitted for the same interface within `window` seconds
+    into one locked read, one backup, one atomic write and (if any asked) one apply.
+
+    A mutation is mutate(lines) -> (new_lines | None, (ok, msg, info)); it must be a
+    pure function of lines because it is re-run if the file changes underneath us.
+    """
+
+    def __init__(self, window: float = WINDOW):
+        self.window = window
+        self._mu = threading.Lock()
+        self._queues: dict[tuple, list[_Pending]] = {}
+
+    def submit(self, iface: str, mutate, apply: bool = False):
+        req = _Pending(mutate, apply)
+        # keyed per host too: fan-out threads may edit same-named interfaces on different hosts
+        key = (transport.current(), iface)
+        with self._mu:
+            q = self._queues.get(key)
+            leader = q is None
+            if leader:
+                q = self._queues[key] = []
+            q.append(req)
+        if leader:
+            if self.window > 0:
+                time.sleep(self.window)
+            with self._mu:
+                batch = self._queues.pop(key)
+            self._commit(iface, batch)
+        req.done.wait()
+        return req.result
+
+    def _commit(self, iface: str, batch: list[_Pending]):
+        conf_path = wg.conf_path(iface)
+        try:
+            results = _run_batch(conf_path, batch)
+            if any(r.apply for r, res in zip(batch, results) if res[0]):
+                applied = wg.apply_now(iface)
+                for r, res in zip(batch, results):
+                    if r.apply and res[0]:
+                        res[2]["apply"] = applied
+            for r, res in zip(batch, results):
+                r.result = res
+        except Exception as e:
+            for r in batch:
+                r.result = (False, f"Commit failed: {e}", {})
+        finally:
+            for r in batch:
+                r.done.set()
+
+
+def _mutate_all(lines: list[str], batch: list[_Pending]):
+    results = []
+    changed = False
+    for r in batch:
+        try:
+            new_lines, res = r.mutate(lines)
+        except Exception as e:
+            new_lines, res = None, (False, f"{type(e).__name__}: {e}", {})
+        if new_lines is not None:
+            lines = new_lines
+            changed = True
+        results.append(res)
+    return (lines if changed else None), results
+
+
+def _write_sharded(iface: str, parts, text: str) -> str:
+    """Write (and back up) only the parts of iface.d/ whose text changed; raises ConfChanged."""
+    new = wg.split_text(text, len(parts) - 1)
+    todo = [(path, sig, part) for (path, sig, old), part in zip(parts, new) if part != old]
+    # check every part before writing any: a retry must never see half of this batch
+    for path, sig, _ in todo:
+        if wg.conf_sig(path) != sig:
+            raise wg.ConfChanged(str(path))
+    saved = [backups.save(path, name=f"{iface}.d/{path.stem}") for path, _, _ in todo]
+    for path, _, part in todo:
+        wg.write_conf(path, part)
+    return ", ".join(saved) or "(unchanged)"
+
+
+def _run_batch(conf_path, batch: list[_Pending]):
+    iface = conf_path.stem
+    for _ in range(RETRIES):
+        with wg.locked(conf_path):
+            parts = wg.read_parts(iface) if wg.is_sharded(iface) else None
+            sig = wg.conf_sig(conf_path)
+            if parts is not None:
+                lines = Lines("".join(t for _, _, t in parts).splitlines(True), sig)
+            else:
+                lines = Lines(wg.read_conf(conf_path).splitlines(True), sig)
+            lines, results = _mutate_all(lines, batch)
+            if lines is None:
+                return results
+            text = "".join(lines)
+            try:
+                if parts is not None:
+                    backup = _write_sharded(iface, parts, text)
+                else:
+                    backup = backups.save(conf_path)
+                    wg.write_conf(conf_path, text, expect_sig=sig)
+            except wg.ConfChanged:
+                continue
+            assembled = ""
+            if parts is not None:
+                # keep wg0.conf (what wg-quick reads at boot) in step without waiting for an apply
+                try:
+                    wg.assemble(iface)
+                except OSError as e:
+                    assembled = f"{conf_path} not re-assembled: {e}"
+            peerdb.after_write(conf_path, text)
+            if isinstance(lines, Lines) and lines.after:
+                new_sig = wg.conf_sig(conf_path)
+                for fn in lines.after:
+                    fn(new_sig)
+            for res in results:
+                if res[0]:
+                    res[2]["backup"] = backup
+                    if assembled:
+                        res[2]["assemble_error"] = assembled
+            return results
+    return [(False, f"{conf_path} kept changing underneath; try again.", {}) for _ in batch]
+
+
+GROUP = GroupCommit()
+
+
+def submit(iface: str, mutate, apply: bool = False):
+    return GROUP.submit(iface, mutate, apply=apply)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import os
+import struct
+
+# Pure-Python primitives WireGuard needs (RFC 7748 X25519, RFC 8439 ChaCha20-Poly1305;
+# BLAKE2s comes from hashlib). Slow compared to C, but plenty for key generation and
+# a handful of probe handshakes, and it keeps wireme free of third-party dependencies.
+
+_P = 2**255 - 19
+_A24 = 121665
+
+
+def _clamp(k: bytes) -> int:
+    b = bytearray(k)
+    b[0] &= 248
+    b[31] &= 127
+    b[31] |= 64
+    return int.from_bytes(b, "little")
+
+
+def x25519(k: bytes, u: bytes) -> bytes:
+    kn = _clamp(k)
+    x1 = int.from_bytes(u, "little") & ((1 << 255) - 1)
+    x2, z2, x3, z3 = 1, 0, x1, 1
+    swap = 0
+    for t in range(254, -1, -1):
+        kt = (kn >> t) & 1
+        swap ^= kt
+        if swap:
+            x2, x3 = x3, x2
+            z2, z3 = z3, z2
+        swap = kt
+        a = x2 + z2
+        aa = a * a % _P
+        b = x2 - z2
+        bb = b * b % _P
+        e = aa - bb
+        c = x3 + z3
+        d = x3 - z3
+        da = d * a % _P
+        cb = c * b % _P
+        x3 = (da + cb) ** 2 % _P
+        z3 = x1 * (da - cb) ** 2 % _P
+        x2 = aa * bb % _P
+        z2 = e * (aa + _A24 * e) % _P
+    if swap:
+        x2, x3 = x3, x2
+        z2, z3 = z3, z2
+    return (x2 * pow(z2, _P - 2, _P) % _P).to_bytes(32, "little")
+
+
+def x25519_base(k: bytes) -> bytes:
+    return x25519(k, (9).to_bytes(32, "little"))
+
+
+def _rotl(v: int, n: int) -> int:
+    return ((v << n) & 0xFFFFFFFF) | (v >> (32 - n))
+
+
+def _quarter(s: list[int], a: int, b: int, c: int, d: int):
+    s[a] = (s[a] + s[b]) & 0xFFFFFFFF
+    s[d] = _rotl(s[d] ^ s[a], 16)
+    s[c] = (s[c] + s[d]) & 0xFFFFFFFF
+    s[b] = _rotl(s[b] ^ s[c], 12)
+    s[a] = (s[a] + s[b]) & 0xFFFFFFFF
+    s[d] = _rotl(s[d] ^ s[a], 8)
+    s[c] = (s[c] + s[d]) & 0xFFFFFFFF
+    s[b] = _rotl(s[b] ^ s[c], 7)
+
+
+def _chacha20_block(key: bytes, counter: int, nonce: bytes) -> bytes:
+    init = [0x61707865, 0x3320646E, 0x79622D32, 0x6B206574]
+    init += list(struct.unpack("<8I", key))
+    init += [counter & 0xFFFFFFFF]
+    init += list(struct.unpack("<3I", nonce))
+    s = list(init)
+    for _ in range(10):
+        _quarter(s, 0, 4, 8, 12)
+        _quarter(s, 1, 5, 9, 13)
+        _quarter(s, 2, 6, 10, 14)
+        _quarter(s, 3, 7, 11, 15)
+        _quarter(s, 0, 5, 10, 15)
+        _quarter(s, 1, 6, 11, 12)
+        _quarter(s, 2, 7, 8, 13)
+        _quarter(s, 3, 4, 9, 14)
+    return struct.pack("<16I", *((x + y) & 0xFFFFFFFF for x, y in zip(s, init)))
+
+
+def _chacha20_xor(key: bytes, counter: int, nonce: bytes, data: bytes) -> bytes:
+    out = bytearray()
+    for i in range(0, len(data), 64):
+        block = _chacha20_block(key, counter + i // 64, nonce)
+        out += bytes(a ^ b for a, b in zip(data[i : i + 64], block))
+    return bytes(out)
+
+
+def _poly1305(key: bytes, msg: bytes) -> bytes:
+    r = int.from_bytes(key[:16], "little") & 0x0FFFFFFC0FFFFFFC0FFFFFFC0FFFFFFF
+    s = int.from_bytes(key[16:], "little")
+    p = (1 << 130) - 5
+    acc = 0
+    for i in range(0, len(msg), 16):
+        n = int.from_bytes(msg[i : i + 16] + b"\x01", "little")
+        acc = (acc + n) * r % p
+    return ((acc + s) & ((1 << 128) - 1)).to_bytes(16, "little")
+
+
+def _pad16(b: bytes) -> bytes:
+    return b"\x00" * (-len(b) % 16)
+
+
+def _aead_mac(key: bytes, nonce: bytes, aad: bytes, ct: bytes) -> bytes:
+    otk = _chacha20_block(key, 0, nonce)[:32]
+    mac_data = aad + _pad16(aad) + ct + _pad16(ct) + struct.pack("<QQ", len(aad), len(ct))
+    return _poly1305(otk, mac_data)
+
+
+def aead_encrypt(key: bytes, nonce: bytes, plaintext: bytes, aad: bytes) -> bytes:
+    ct = _chacha20_xor(key, 1, nonce, plaintext)
+    return ct + _aead_mac(key, nonce, aad, ct)
+
+
+def aead_decrypt(key: bytes, nonce: bytes, data: bytes, aad: bytes) -> bytes | None:
+    ct, tag = data[:-16], data[-16:]
+    if not hmac.compare_digest(_aead_mac(key, nonce, aad, ct), tag):
+        return None
+    return _chacha20_xor(key, 1, nonce, ct)
+
+
+def wg_nonce(counter: int) -> bytes:
+    return b"\x00" * 4 + struct.pack("<Q", counter)
+
+
+def blake2s(*parts: bytes) -> bytes:
+    h = hashlib.blake2s()
+    for p in parts:
+        h.update(p)
+    return h.digest()
+
+
+def blake2s_mac(key: bytes, data: bytes) -> bytes:
+    return hashlib.blake2s(data, key=key, digest_size=16).digest()
+
+
+def hmac_blake2s(key: bytes, data: bytes) -> bytes:
+    return hmac.new(key, data, hashlib.blake2s).digest()
+
+
+def kdf(key: bytes, data: bytes, n: int) -> list[bytes]:
+    t0 = hmac_blake2s(key, data)
+    out: list[bytes] = []
+    prev = b""
+    for i in range(1, n + 1):
+        prev = hmac_blake2s(t0, prev + bytes([i]))
+        out.append(prev)
+    return out
+
+
+# ---------- WireGuard key helpers ----------
+
+
+def genkey() -> str:
+    return base64.b64encode(_clamp(os.urandom(32)).to_bytes(32, "little")).decode("ascii")
+
+
+def genpsk() -> str:
+    return base64.b64encode(os.urandom(32)).decode("ascii")
+
+
+def pubkey(priv_b64: str) -> str | None:
+    try:
+        priv = base64.b64decode(priv_b64.strip(), validate=True)
+    except ValueError:
+        return None
+    if len(priv) != 32:
+        return None
+    return base64.b64encode(x25519_base(priv)).decode("ascii")
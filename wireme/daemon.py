@@ -0,0 +1,396 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import signal
+import socket
+from pathlib import Path
+
+from . import history, ops, quota, snapshot, util, watch, wg
+
+SOCKET_PATH = Path(os.environ.get("WIREME_SOCKET", "/run/wireme.sock"))
+REFRESH_INTERVAL = 5.0
+MAX_REQUEST = 1_000_000
+
+
+class Unavailable(Exception):
+    """No daemon is listening (or we may not talk to it); callers fall back to direct mode."""
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+# ---------- Client ----------
+
+
+def call(op: str, timeout: float = 90.0, sock_path: Path | None = None, **args):
+    path = sock_path or SOCKET_PATH
+    if not path.exists():
+        raise Unavailable(f"{path} missing")
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout)
+            s.connect(str(path))
+            s.sendall(json.dumps({"op": op, "args": args}).encode("utf-8") + b"\n")
+            buf = b""
+            while not buf.endswith(b"\n"):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+    except OSError as e:
+        raise Unavailable(str(e)) from e
+    try:
+        resp = json.loads(buf.decode("utf-8"))
+    except ValueError as e:
+        raise Unavailable(f"bad reply: {e}") from e
+    if not resp.get("ok"):
+        raise DaemonError(resp.get("error") or "daemon error")
+    return resp.get("result")
+
+
+def call_or(direct, op: str, **args):
+    """Run op on the daemon when it is up, otherwise direct(**args) in-process."""
+    try:
+        return call(op, **args)
+    except Unavailable:
+        return direct(**args)
+
+
+def running(sock_path: Path | None = None) -> bool:
+    try:
+        call("ping", timeout=2.0, sock_path=sock_path)
+        return True
+    except (Unavailable, DaemonError):
+        return False
+
+
+# ---------- Server ----------
+
+
+class State:
+    """Parsed interfaces, derived keys, IP suggestions and live stats kept between requests."""
+
+    def __init__(self):
+        self.confs: dict[str, dict] = {}
+        self.live: dict[str, dict] = {}
+        self.up: dict[str, bool] = {}
+        self.client_pubs: dict[str, tuple[int, str | None]] = {}
+        self.locks: dict[str, asyncio.Lock] = {}
+        self.pub_ip: str | None = None
+        self.recorder = history.Recorder()
+        self.enforcer = quota.Enforcer()
+        # with a watcher, cached entries are dropped on change instead of stat-checked per request
+        self.watcher: watch.Watcher | None = None
+        self.names: list[str] | None = None
+        self.saved: dict[str, list[str]] = {}
+        self.snapshot_path: Path | None = None
+        # bumped by forget(): a parse started in an executor before a change must not be cached after it
+        self.gen = 0
+
+    def lock(self, iface: str) -> asyncio.Lock:
+        if iface not in self.locks:
+            self.locks[iface] = asyncio.Lock()
+        return self.locks[iface]
+
+    def conf(self, iface: str) -> dict:
+        if self.watcher is not None and iface in self.confs:
+            return self.confs[iface]
+        path = wg.conf_path(iface)
+        sig = wg.conf_sig(path)
+        if sig == (0, 0):
+            raise FileNotFoundError(str(path))
+        ent = self.confs.get(iface)
+        if ent is not None and ent["sig"] == sig:
+            return ent
+        gen = self.gen
+        cfg, peers, _ = wg.parse_conf(path)
+        server_pub = None
+        if ent is not None and ent["cfg"].get("PrivateKey") == cfg.get("PrivateKey"):
+            server_pub = ent["server_pub"]
+        ent = {"sig": sig, "cfg": cfg, "peers": peers, "server_pub": server_pub, "defaults": {}}
+        if gen == self.gen:
+            self.confs[iface] = ent
+        return ent
+
+    def server_pub(self, iface: str) -> str | None:
+        ent = self.conf(iface)
+        if ent["server_pub"] is None and ent["cfg"].get("PrivateKey"):
+            ent["server_pub"] = wg.pubkey_from_priv(ent["cfg"]["PrivateKey"])
+        return ent["server_pub"]
+
+    def client_pub(self, path: str) -> str | None:
+        if self.watcher is not None and path in self.client_pubs:
+            return self.client_pubs[path][1]
+        try:
+            mtime = Path(path).stat().st_mtime_ns
+        except OSError:
+            return None
+        hit = self.client_pubs.get(path)
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+        gen = self.gen
+        pub = wg.client_pubkey_from_file(Path(path))
+        if gen == self.gen:
+            self.client_pubs[path] = (mtime, pub)
+        return pub
+
+    def iface_names(self) -> list[str]:
+        if self.watcher is None or self.names is None:
+            self.names = [c.stem for c in wg.interfaces()]
+        return self.names
+
+    def saved_confs(self, iface: str) -> list[str]:
+        if self.watcher is None or iface not in self.saved:
+            gen = self.gen
+            found = ops.saved_client_confs(iface)
+            if gen != self.gen:
+                return found
+            self.saved[iface] = found
+        return self.saved[iface]
+
+    def forget(self, changes: list[dict]):
+        """Drop exactly what the changed files invalidate (see watch.changes)."""
+        self.gen += 1
+        for ch in changes:
+            kind, iface = ch["kind"], ch.get("iface")
+            if kind == "overflow":
+                self.confs.clear()
+                self.client_pubs.clear()
+                self.saved.clear()
+                self.names = None
+            elif kind == "conf":
+                self.confs.pop(iface, None)
+                self.names = None
+            elif kind == "client":
+                self.client_pubs.pop(ch["path"], None)
+                self.saved.pop(iface, None)
+            elif kind == "clients":
+                self.saved.pop(iface, None)
+                prefix = str(wg.CLIENTS_DIR / iface) + os.sep
+                for path in [p for p in self.client_pubs if p.startswith(prefix)]:
+                    del self.client_pubs[path]
+        ops.forget(changes)
+
+    def on_fs_event(self):
+        changes = watch.changes(self.watcher)
+        if changes:
+            self.forget(changes)
+
+    async def refresh(self):
+        loop = asyncio.get_running_loop()
+        names = self.iface_names()
+        dumps = await asyncio.gather(*(loop.run_in_executor(None, wg.live_dump, n) for n in names))
+        for n, (head, live) in zip(names, dumps):
+            self.up[n] = head is not None
+            self.live[n] = live
+        await asyncio.gather(*(loop.run_in_executor(None, self.recorder.sample, n, self.live[n]) for n in names))
+        await asyncio.gather(*(loop.run_in_executor(None, self.enforcer.tick, n, self.live[n]) for n in names if self.live[n]))
+        for n in list(self.live):
+            if n not in names:
+                self.live.pop(n, None)
+                self.up.pop(n, None)
+                self.confs.pop(n, None)
+        if self.snapshot_path is not None:
+            await loop.run_in_executor(None, self.publish)
+        if self.pub_ip is None:
+            self.pub_ip = await loop.run_in_executor(None, wg.guess_public_ipv4)
+
+    def publish(self):
+        items = []
+        for n in self.iface_names():
+            try:
+                ent = self.conf(n)
+            except OSError:
+                continue
+            items.append((n, ent["cfg"], ent["peers"], self.up.get(n, False), self.live.get(n, {})))
+        try:
+            snapshot.publish(items, self.snapshot_path)
+        except OSError:
+            pass
+
+    async def refresh_loop(self, interval: float):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                pass
+            await asyncio.sleep(interval)
+
+
+def _blocking(fn, *args):
+    """Run fn in the default executor: parses, key derivations and file I/O must not stall other clients."""
+    return asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+async def _h_ping(state: State):
+    return {"pid": os.getpid()}
+
+
+async def _h_status(state: State):
+    out: list[dict] = []
+    for n in await _blocking(state.iface_names):
+        out.append({"iface": n, "path": str(wg.conf_path(n)), "up": state.up.get(n, False)})
+    return out
+
+
+async def _h_overview(state: State, iface: str):
+    ent = await _blocking(state.conf, iface)
+    return {"cfg": ops.public_cfg(ent["cfg"]), "peers": ent["peers"], "live": state.live.get(iface, {})}
+
+
+async def _h_add_defaults(state: State, iface: str, smart: bool = False):
+    def defaults():
+        ent = state.conf(iface)
+        key = "smart" if smart else "desktop"
+        if key not in ent["defaults"]:
+            ent["defaults"][key] = ops.defaults_for(ent["cfg"], ent["peers"], smart, pub_ip=state.pub_ip)
+        return ent["defaults"][key]
+
+    return await _blocking(defaults)
+
+
+async def _h_add(state: State, iface: str, **kw):
+    # No daemon-side lock: concurrent adds meet in commit.GROUP and share one write.
+    s_pub = await _blocking(state.server_pub, iface)
+    res = await _blocking(lambda: ops.add_peer(iface, s_pub=s_pub, **kw))
+    # don't wait for our own inotify event: the caller may ask for the overview right away
+    state.forget([{"kind": "conf", "iface": iface}, {"kind": "clients", "iface": iface}])
+    return res
+
+
+async def _h_matches(state: State, iface: str, pub: str):
+    return await _blocking(lambda: [p for p in state.saved_confs(iface) if pub and state.client_pub(p) == pub])
+
+
+async def _h_delete(state: State, iface: str, pub: str, matches: list[str] | None = None, apply: bool = False):
+    if matches is None:
+        matches = await _h_matches(state, iface, pub)
+    loop = asyncio.get_running_loop()
+    res = await loop.run_in_executor(None, ops.delete_peer, iface, pub, matches, apply)
+    state.forget([{"kind": "conf", "iface": iface}, {"kind": "clients", "iface": iface}])
+    return res
+
+
+async def _h_apply(state: State, iface: str):
+    loop = asyncio.get_running_loop()
+    async with state.lock(iface):
+        res = await loop.run_in_executor(None, ops.apply, iface)
+    head, live = await loop.run_in_executor(None, wg.live_dump, iface)
+    state.up[iface] = head is not None
+    state.live[iface] = live
+    return res
+
+
+async def _h_save_client(state: State, iface: str, name: str, pub: str, client_text: str):
+    return await _blocking(ops.save_client_conf, iface, name, pub, client_text)
+
+
+async def _h_saved(state: State, iface: str):
+    return await _blocking(state.saved_confs, iface)
+
+
+async def _h_whois(state: State, addr: str):
+    return await _blocking(ops.whois, addr)
+
+
+async def _h_qr_text(state: State, text: str):
+    return await _blocking(ops.qr_text, text)
+
+
+async def _h_qr_saved(state: State, path: str):
+    return await _blocking(ops.qr_saved, path)
+
+
+HANDLERS = {
+    "ping": _h_ping,
+    "status": _h_status,
+    "overview": _h_overview,
+    "add_defaults": _h_add_defaults,
+    "add": _h_add,
+    "matches": _h_matches,
+    "delete": _h_delete,
+    "apply": _h_apply,
+    "save_client": _h_save_client,
+    "saved": _h_saved,
+    "whois": _h_whois,
+    "qr_text": _h_qr_text,
+    "qr_saved": _h_qr_saved,
+}
+
+
+async def _handle_conn(state: State, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        try:
+            line = await reader.readline()  # ValueError past MAX_REQUEST: answered like any other error
+            req = json.loads(line.decode("utf-8"))
+            fn = HANDLERS.get(req.get("op"))
+            if fn is None:
+                resp = {"ok": False, "error": f"unknown op: {req.get('op')}"}
+            else:
+                resp = {"ok": True, "result": await fn(state, **(req.get("args") or {}))}
+        except Exception as e:
+            resp = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        writer.write(json.dumps(resp).encode("utf-8") + b"\n")
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(sock_path: Path, interval: float = REFRESH_INTERVAL, snapshot_path: Path | None = None):
+    state = State()
+    state.snapshot_path = snapshot_path
+    await state.refresh()
+    if sock_path.exists():
+        if running(sock_path):
+            raise DaemonError(f"daemon already running on {sock_path}")
+        sock_path.unlink()
+    sock_path.parent.mkdir(parents=True, exist_ok=True)
+    old_umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(
+            lambda r, w: _handle_conn(state, r, w), path=str(sock_path), limit=MAX_REQUEST
+        )
+    finally:
+        os.umask(old_umask)
+    state.watcher = watch.open_watcher()
+    loop = asyncio.get_running_loop()
+    if state.watcher is not None:
+        loop.add_reader(state.watcher.fileno(), state.on_fs_event)
+    refresher = asyncio.create_task(state.refresh_loop(interval))
+    # SIGTERM (systemctl stop) and ^C end the wait below, so the cleanup still runs
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        refresher.cancel()
+        state.enforcer.close()  # persists the usage accumulated since the last flush
+        state.recorder.close()
+        if state.watcher is not None:
+            loop.remove_reader(state.watcher.fileno())
+            state.watcher.close()
+        try:
+            sock_path.unlink()
+        except OSError:
+            pass
+
+
+def run(sock_path: Path | None = None, interval: float = REFRESH_INTERVAL, snapshot_path: Path | None = None) -> int:
+    if not util.have("wg"):
+        print("wireme daemon: wg not installed")
+        return 1
+    try:
+        asyncio.run(serve(sock_path or SOCKET_PATH, interval, snapshot_path))
+    except KeyboardInterrupt:
+        pass
+    except DaemonError as e:
+        print(f"wireme daemon: {e}")
+        return 1
+    return 0
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import ipaddress
+from typing import Iterator
+
+from . import quota, util, wg
+
+# Drift between the kernel and the configs: peers added with a raw `wg set`, configs
+# edited but never applied, interfaces that are down. One `wg show all dump` covers
+# every running interface; its output is grouped per interface, so each group is
+# hash-joined against that interface's parsed config (a dict by PublicKey, dropped
+# once the group ends) and findings are yielded as the lines go by.
+#
+# AllowedIPs are compared as sets; only lists that differ as text are re-checked as
+# networks (the kernel prints 10.8.0.0/24 for a configured 10.8.0.5/24). A peer whose
+# AllowedIPs were emptied by the quota enforcer is not drift.
+
+NO_IPS = quota.NO_IPS
+NO_PSK = "(none)"
+
+KINDS = ("missing", "extra", "allowed-ips", "psk", "down", "unmanaged")
+
+
+def _ip_set(text: str | None) -> str:
+    if not text or text == NO_IPS:
+        return ""
+    parts = [p for p in text.replace(" ", "").split(",") if p]
+    return ",".join(sorted(parts)) if len(parts) > 1 else (parts[0] if parts else "")
+
+
+def _networks(text: str) -> list[str] | None:
+    try:
+        return sorted(str(ipaddress.ip_network(p, strict=False)) for p in text.split(",") if p)
+    except ValueError:
+        return None
+
+
+def same_ips(conf: str | None, live: str | None) -> bool:
+    a, b = _ip_set(conf), _ip_set(live)
+    if a == b:
+        return True
+    na = _networks(a)
+    return na is not None and na == _networks(b)
+
+
+def _row(iface: str, kind: str, pub: str = "", name: str = "", detail: str = "") -> dict:
+    return {"iface": iface, "kind": kind, "pub": pub, "name": name or "unnamed", "detail": detail}
+
+
+def _index(iface: str) -> dict[str, dict]:
+    _, peers, _ = wg.parse_conf(wg.conf_path(iface))
+    return {p["PublicKey"]: p for p in peers if p.get("PublicKey")}
+
+
+def _quota_off(iface: str) -> set[str]:
+    _, state = quota.load(iface)
+    return {pub for pub, rec in state.items() if rec[3] & quota.DISABLED}
+
+
+def _close(iface: str, index: dict[str, dict]) -> Iterator[dict]:
+    for pub, p in index.items():
+        yield _row(iface, "missing", pub, p.get("name"), "in config, not in the kernel")
+
+
+def scan(ifaces: list[str] | None = None, stats: dict | None = None) -> Iterator[dict]:
+    """
+    Yield one {iface, kind, pub, name, detail} per finding (kind in KINDS) for the
+    given interfaces (default: every config and every running interface). stats, if
+    given, is filled with interfaces/peers checked. Raises RuntimeError when `wg show`
+    fails (not root, wg missing).
+    """
+    configured = [c.stem for c in wg.interfaces()]
+    wanted = set(ifaces) if ifaces else None
+    if stats is None:
+        stats = {}
+    stats.update(interfaces=0, peers=0)
+
+    rc, out, err = util.run(["wg", "show", "all", "dump"], timeout=60)
+    if rc != 0:
+        raise RuntimeError((err or out).strip() or f"wg show all dump: exit {rc}")
+
+    seen: set[str] = set()
+    cur = None  # interface of the current group (None: skipped)
+    index: dict[str, dict] = {}
+    off: set[str] = set()
+    for ln in out.splitlines():
+        parts = ln.split("\t")
+        if len(parts) == 5:  # interface line: iface, private key, public key, port, fwmark
+            if cur is not None:
+                yield from _close(cur, index)
+            iface = parts[0]
+            seen.add(iface)
+            cur, index = None, {}
+            if wanted is not None and iface not in wanted:
+                continue
+            stats["interfaces"] += 1
+            if iface not in configured:
+                yield _row(iface, "unmanaged", detail="running, but there is no config for it")
+                continue
+            cur, index, off = iface, _index(iface), _quota_off(iface)
+            continue
+        if cur is None or len(parts) < 9 or parts[0] != cur:
+            continue
+        _, pub, psk, _ep, allowed = parts[:5]
+        stats["peers"] += 1
+        p = index.pop(pub, None)
+        if p is None:
+            yield _row(cur, "extra", pub, detail=f"in the kernel, not in config (AllowedIPs {allowed})")
+            continue
+        if not same_ips(p.get("AllowedIPs"), allowed) and not (allowed == NO_IPS and pub in off):
+            yield _row(cur, "allowed-ips", pub, p.get("name"), f"config {_ip_set(p.get('AllowedIPs')) or '-'}, kernel {_ip_set(allowed) or '-'}")
+        want_psk = p.get("PresharedKey") or ""
+        have_psk = "" if psk == NO_PSK else psk
+        if want_psk != have_psk:
+            detail = "differs" if want_psk and have_psk else "only in config" if want_psk else "only in the kernel"
+            yield _row(cur, "psk", pub, p.get("name"), f"PresharedKey {detail}")
+    if cur is not None:
+        yield from _close(cur, index)
+
+    for iface in configured:
+        if iface not in seen and (wanted is None or iface in wanted):
+            stats["interfaces"] += 1
+            yield _row(iface, "down", detail="configured, not running")
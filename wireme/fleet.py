@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from . import drift, ops, transport, wg
+
+PARALLEL = 8
+ACTIVE_SECS = 180
+
+
+def fan_out(specs: list[str], fn, parallel: int = PARALLEL, **kwargs):
+    """
+    Run fn(**kwargs) once per host with at most `parallel` hosts in flight; every
+    worker thread routes its wireme I/O through that host's transport. Yields one
+    {"host", "ok", "result", "error", "secs"} dict per host as soon as it finishes.
+    """
+
+    def one(spec: str):
+        t0 = time.time()
+        try:
+            with transport.using(transport.from_spec(spec)):
+                return {"host": spec, "ok": True, "result": fn(**kwargs), "error": "", "secs": time.time() - t0}
+        except Exception as e:
+            return {"host": spec, "ok": False, "result": None, "error": f"{type(e).__name__}: {e}", "secs": time.time() - t0}
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as ex:
+        futs = [ex.submit(one, s) for s in specs]
+        for f in as_completed(futs):
+            yield f.result()
+
+
+def _created_ts(peer: dict) -> int | None:
+    try:
+        return int(datetime.strptime(peer.get("created") or "", "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return None
+
+
+def host_status() -> list[dict]:
+    if not transport.current().have("wg"):
+        raise RuntimeError("wg not installed")
+    out: list[dict] = []
+    now = int(time.time())
+    for c in wg.interfaces():
+        _, peers, _ = wg.parse_conf(c)
+        head, live = wg.live_dump(c.stem)
+        active = sum(1 for li in live.values() if li["hs"].isdigit() and li["hs"] != "0" and now - int(li["hs"]) < ACTIVE_SECS)
+        out.append({"iface": c.stem, "up": head is not None, "peers": len(peers), "active": active})
+    return out
+
+
+def stale_peers(stale_secs: int) -> list[dict]:
+    """Peers whose last handshake (or, if never, creation time) is older than stale_secs."""
+    out: list[dict] = []
+    now = int(time.time())
+    for c in wg.interfaces():
+        _, peers, _ = wg.parse_conf(c)
+        _, live = wg.live_dump(c.stem)
+        for p in peers:
+            pub = p.get("PublicKey") or ""
+            hs = (live.get(pub) or {}).get("hs", "0")
+            last = int(hs) if hs.isdigit() and hs != "0" else _created_ts(p)
+            if last is None or now - last < stale_secs:
+                continue
+            out.append({"iface": c.stem, "name": p.get("name") or "unnamed", "pub": pub, "age": now - last})
+    return out
+
+
+def host_reap(stale_secs: int, delete: bool = False) -> list[dict]:
+    stale = stale_peers(stale_secs)
+    if not delete:
+        return stale
+    for iface in sorted({s["iface"] for s in stale}):
+        mine = [s for s in stale if s["iface"] == iface]
+        ok, msg, info = ops.delete_peers(iface, [s["pub"] for s in mine])
+        for s in mine:
+            s["deleted"] = ok and s["pub"] in info["removed"]
+            s["msg"] = msg
+    for iface in sorted({s["iface"] for s in stale if s.get("deleted")}):
+        rc, _, err = wg.apply_now(iface)
+        for s in stale:
+            if s["iface"] == iface:
+                s["apply"] = "ok" if rc == 0 else (err or f"exit {rc}")
+    return stale
+
+
+def host_apply() -> list[dict]:
+    out: list[dict] = []
+    for c in wg.interfaces():
+        rc, _, err = wg.apply_now(c.stem)
+        out.append({"iface": c.stem, "ok": rc == 0, "error": err if rc != 0 else ""})
+    return out
+
+
+def host_drift(ifaces: list[str] | None = None) -> list[dict]:
+    return list(drift.scan(ifaces))
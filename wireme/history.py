@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from . import transport, wg
+
+# Per-peer traffic/handshake history: one fixed-size file per peer under
+# /etc/wireguard/.wireme/history/<iface>/. Each resolution is a ring of fixed-size
+# records (slot = bucket % slots), so files never grow, old buckets are overwritten in
+# place (that is the retention), and a time range maps to at most two contiguous reads.
+
+HIST_DIR = "history"
+MAGIC = b"WMTS\x01\x00\x00\x00"
+HEADER = 64  # magic + PublicKey (44 ascii) + padding
+REC = struct.Struct("<IIQQ")  # bucket start, last handshake, rx bytes, tx bytes (deltas summed)
+
+# (name, step seconds, slots): retention is step * slots
+RESOLUTIONS = (
+    ("1m", 60, 1440),  # 1 day
+    ("1h", 3600, 24 * 31),  # 31 days
+    ("1d", 86400, 366 * 2),  # 2 years
+)
+
+FD_CACHE = 512  # series files kept open by a Recorder
+SWEEP = 3600.0  # seconds between drops of deleted/rotated keys
+
+_LAYOUT: dict[str, tuple[int, int, int]] = {}
+_off = HEADER
+for _name, _step, _slots in RESOLUTIONS:
+    _LAYOUT[_name] = (_off, _step, _slots)
+    _off += _slots * REC.size
+FILE_SIZE = _off
+del _off, _name, _step, _slots
+
+
+def series_path(iface: str, pub: str) -> Path:
+    # 64 bits of the key: the 8-hex fingerprint collides too easily at 100k peers
+    return wg.WIREGUARD_DIR / ".wireme" / HIST_DIR / iface / f"{hashlib.sha256(pub.encode()).hexdigest()[:16]}.ts"
+
+
+def _real(path: Path) -> Path | None:
+    return transport.current().local_path(path)
+
+
+def _open(path: Path, pub: str, create: bool) -> int | None:
+    """fd of a series file (created and sized on first use), or None."""
+    try:
+        fd = os.open(path, os.O_RDWR | (os.O_CREAT if create else 0), 0o600)
+    except FileNotFoundError:
+        return None
+    head = os.pread(fd, HEADER, 0)
+    if not head and create:
+        os.pwrite(fd, MAGIC + pub.encode("ascii").ljust(HEADER - len(MAGIC), b"\0"), 0)
+        os.ftruncate(fd, FILE_SIZE)
+    elif head[: len(MAGIC)] != MAGIC or head[len(MAGIC) :].rstrip(b"\0").decode("ascii", "replace") != pub:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _add(fd: int, ts: int, hs: int, rx: int, tx: int):
+    for base, step, slots in _LAYOUT.values():
+        bucket = ts - ts % step
+        off = base + (ts // step) % slots * REC.size
+        b_ts, b_hs, b_rx, b_tx = REC.unpack(os.pread(fd, REC.size, off).ljust(REC.size, b"\0"))
+        if b_ts != bucket:  # slot still holds an expired bucket: start over
+            b_hs = b_rx = b_tx = 0
+        os.pwrite(fd, REC.pack(bucket, max(b_hs, hs), b_rx + rx, b_tx + tx), off)
+
+
+def read(iface: str, pub: str, res: str, since: int, until: int) -> list[tuple[int, int, int, int]]:
+    """
+    (bucket start, last handshake, rx, tx) for every recorded bucket of resolution res
+    in [since, until]. Only the slots covering that range are read.
+    """
+    real = _real(series_path(iface, pub))
+    if real is None:
+        return []
+    base, step, slots = _LAYOUT[res]
+    first, last = since // step, until // step
+    first = max(first, last - slots + 1)
+    if last < first:
+        return []
+    fd = _open(real, pub, create=False)
+    if fd is None:
+        return []
+    try:
+        start, n = first % slots, last - first + 1
+        head = min(n, slots - start)
+        buf = os.pread(fd, head * REC.size, base + start * REC.size)
+        if n > head:  # range wraps around the end of the ring
+            buf += os.pread(fd, (n - head) * REC.size, base)
+    finally:
+        os.close(fd)
+    out = []
+    for i, rec in enumerate(REC.iter_unpack(buf)):
+        if rec[0] == (first + i) * step:  # anything else is an older lap or never written
+            out.append(rec)
+    return out
+
+
+def last_handshake(iface: str, pub: str) -> int:
+    """Newest handshake ever recorded (the daily ring covers the whole retention)."""
+    now = int(time.time())
+    _, step, slots = _LAYOUT["1d"]
+    return max((r[1] for r in read(iface, pub, "1d", now - step * slots, now)), default=0)
+
+
+class Recorder:
+    """
+    Turns successive live dumps into per-peer deltas. The first sighting of a peer is
+    only a baseline; a counter that went backwards (interface restarted) counts from 0.
+    One recorder per interface and host: the lock is taken on first use and kept.
+
+    A peer is only written when it moved (traffic or a new handshake), so idle peers
+    cost nothing and never-seen ones get no file. Series fds stay open across ticks (up
+    to FD_CACHE, least recently used closed first). Every SWEEP seconds the series and
+    baselines of keys that are neither in the config nor live (deleted, or rotated
+    away) are dropped.
+    """
+
+    def __init__(self):
+        self.last: dict[tuple[str, str], tuple[int, int, int]] = {}  # (iface, pub) -> rx, tx, hs
+        self.locks: dict[str, int | None] = {}
+        self.fds: OrderedDict[tuple[str, str], int] = OrderedDict()
+        self.swept: dict[str, float] = {}
+        self.mu = threading.Lock()  # the daemon samples its interfaces in parallel threads
+
+    def _claim(self, iface: str, root: Path) -> bool:
+        if iface not in self.locks:
+            fd = os.open(root / ".recorder.lock", os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                fd = None
+            self.locks[iface] = fd
+        return self.locks[iface] is not None
+
+    def _fd(self, iface: str, pub: str, root: Path) -> int | None:
+        key = (iface, pub)
+        with self.mu:
+            fd = self.fds.get(key)
+            if fd is not None:
+                self.fds.move_to_end(key)
+                return fd
+        fd = _open(root / series_path(iface, pub).name, pub, create=True)
+        if fd is None:
+            return None
+        with self.mu:
+            self.fds[key] = fd
+            while len(self.fds) > FD_CACHE:
+                os.close(self.fds.popitem(last=False)[1])
+        return fd
+
+    def _drop(self, key: tuple[str, str]):
+        with self.mu:
+            self.last.pop(key, None)
+            fd = self.fds.pop(key, None)
+        if fd is not None:
+            os.close(fd)
+
+    def sweep(self, iface: str, keep: set[str], root: Path) -> int:
+        """Forget keys of iface not in keep and delete their series files; returns files deleted."""
+        with self.mu:
+            gone = [k for k in set(self.last) | set(self.fds) if k[0] == iface and k[1] not in keep]
+        for key in gone:
+            self._drop(key)
+        wanted = {series_path(iface, pub).name for pub in keep}
+        n = 0
+        for f in root.glob("*.ts"):
+            if f.name not in wanted:
+                try:
+                    f.unlink()
+                    n += 1
+                except OSError:
+                    pass
+        return n
+
+    def sample(self, iface: str, live: dict, now: float | None = None) -> int:
+        """Record one live dump of iface; returns how many peers were written."""
+        root = _real(wg.WIREGUARD_DIR / ".wireme" / HIST_DIR / iface)
+        if root is None or not live:
+            return 0
+        try:
+            root.mkdir(mode=0o700, parents=True, exist_ok=True)
+            if not self._claim(iface, root):
+                return 0
+        except OSError:
+            return 0
+        ts = int(now if now is not None else time.time())
+        if ts - self.swept.get(iface, 0) >= SWEEP:
+            self.swept[iface] = ts
+            try:
+                _, peers, _ = wg.parse_conf(wg.conf_path(iface))
+                self.sweep(iface, {p["PublicKey"] for p in peers if p.get("PublicKey")} | set(live), root)
+            except OSError:
+                pass
+        n = 0
+        for pub, li in live.items():
+            try:
+                rx, tx, hs = int(li["rx"]), int(li["tx"]), int(li["hs"])
+            except (KeyError, ValueError):
+                continue
+            prev = self.last.get((iface, pub))
+            self.last[(iface, pub)] = (rx, tx, hs)
+            if prev is None:
+                drx = dtx = 0
+                moved = hs > 0
+            else:
+                drx = rx - prev[0] if rx >= prev[0] else rx
+                dtx = tx - prev[1] if tx >= prev[1] else tx
+                moved = drx or dtx or hs != prev[2]
+            if not moved:
+                continue
+            try:
+                fd = self._fd(iface, pub, root)
+                if fd is None:
+                    continue
+                _add(fd, ts, hs, drx, dtx)
+            except OSError:
+                self._drop((iface, pub))
+                continue
+            n += 1
+        return n
+
+    def close(self):
+        with self.mu:
+            for fd in self.fds.values():
+                os.close(fd)
+            self.fds.clear()
+        for fd in self.locks.values():
+            if fd is not None:
+                os.close(fd)
+        self.locks.clear()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import socket
+
+# Path-compressed binary (PATRICIA) trie over IP prefixes. Lookups and overlap
+# checks touch at most one node per distinguishing bit, so they stay O(prefix length)
+# no matter how many prefixes are stored (100k+ peers is fine).
+
+_WIDTH = {4: 32, 6: 128}
+_FAMILY = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+
+def parse_prefix(text: str) -> tuple[int, int, int]:
+    """
+    '10.8.0.2/32', 'fd00::/64' or a bare address -> (version, network int, prefix len).
+    Host bits are masked off. Raises ValueError on garbage.
+    """
+    addr, _, plen_s = text.strip().partition("/")
+    version = 6 if ":" in addr else 4
+    try:
+        packed = socket.inet_pton(_FAMILY[version], addr)
+    except OSError:
+        raise ValueError(f"bad address {addr!r}") from None
+    width = _WIDTH[version]
+    if plen_s:
+        if not plen_s.isdigit() or int(plen_s) > width:
+            raise ValueError(f"bad prefix length in {text.strip()!r}")
+        plen = int(plen_s)
+    else:
+        plen = width
+    key = int.from_bytes(packed, "big")
+    key &= ((1 << plen) - 1) << (width - plen)
+    return version, key, plen
+
+
+def format_prefix(version: int, key: int, plen: int) -> str:
+    width = _WIDTH[version]
+    return f"{socket.inet_ntop(_FAMILY[version], key.to_bytes(width // 8, 'big'))}/{plen}"
+
+
+class _Node:
+    __slots__ = ("key", "plen", "values", "kids")
+
+    def __init__(self, key: int, plen: int):
+        self.key = key
+        self.plen = plen
+        self.values: list | None = None
+        self.kids: list = [None, None]
+
+
+class PrefixTrie:
+    """Prefixes of one address family; every stored prefix carries a list of values."""
+
+    def __init__(self, width: int):
+        self.width = width
+        self.root: _Node | None = None
+        self.count = 0
+
+    def _bit(self, key: int, i: int) -> int:
+        return (key >> (self.width - 1 - i)) & 1
+
+    def _common(self, a: int, b: int, limit: int) -> int:
+        return min(limit, self.width - (a ^ b).bit_length())
+
+    def _mask(self, key: int, plen: int) -> int:
+        return key & (((1 << plen) - 1) << (self.width - plen))
+
+    def insert(self, key: int, plen: int, value) -> None:
+        parent, side, node = None, 0, self.root
+        while node is not None:
+            c = self._common(node.key, key, min(node.plen, plen))
+            if c < node.plen:
+                # key diverges inside node's compressed path: split it
+                if c == plen:
+                    new = _Node(key, plen)
+                    new.kids[self._bit(node.key, plen)] = node
+                    leaf = new
+                else:
+                    new = _Node(self._mask(key, c), c)
+                    leaf = _Node(key, plen)
+                    new.kids[self._bit(node.key, c)] = node
+                    new.kids[self._bit(key, c)] = leaf
+                if parent is None:
+                    self.root = new
+                else:
+                    parent.kids[side] = new
+                node = leaf
+                break
+            if plen == node.plen:
+                break
+            parent, side = node, self._bit(key, node.plen)
+            node = node.kids[side]
+        else:
+            node = _Node(key, plen)
+            if parent is None:
+                self.root = node
+            else:
+                parent.kids[side] = node
+        if node.values is None:
+            node.values = []
+            self.count += 1
+        node.values.append(value)
+
+    def longest_match(self, key: int, plen: int | None = None):
+        """Most specific stored prefix containing key/plen -> (key, plen, values) or None."""
+        plen = self.width if plen is None else plen
+        best = None
+        node = self.root
+        while node is not None and node.plen <= plen:
+            if self._common(node.key, key, node.plen) < node.plen:
+                break
+            if node.values:
+                best = (node.key, node.plen, node.values)
+            if node.plen == self.width or node.plen == plen:
+                break
+            node = node.kids[self._bit(key, node.plen)]
+        return best
+
+    def overlaps(self, key: int, plen: int, limit: int = 0) -> list[tuple[int, int, list]]:
+        """
+        Stored prefixes that overlap key/plen: every one containing it (walking down)
+        plus everything inside it (the subtree where the walk stops).
+        """
+        out: list[tuple[int, int, list]] = []
+        node = self.root
+        while node is not None:
+            if node.plen <= plen:
+                if self._common(node.key, key, node.plen) < node.plen:
+                    return out
+                if node.values:
+                    out.append((node.key, node.plen, node.values))
+                if node.plen == plen:
+                    stack = [k for k in node.kids if k is not None]
+                    break
+                node = node.kids[self._bit(key, node.plen)]
+                continue
+            if self._common(node.key, key, plen) < plen:
+                return out
+            stack = [node]
+            break
+        else:
+            return out
+        while stack and not (limit and len(out) >= limit):
+            n = stack.pop()
+            if n.values:
+                out.append((n.key, n.plen, n.values))
+            stack.extend(k for k in n.kids if k is not None)
+        return out
+
+
+class PrefixIndex:
+    """IPv4 + IPv6 PrefixTrie pair addressed by prefix strings."""
+
+    def __init__(self):
+        self.tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+
+    def __len__(self) -> int:
+        return self.tries[4].count + self.tries[6].count
+
+    def add(self, prefix: str, value) -> None:
+        version, key, plen = parse_prefix(prefix)
+        self.tries[version].insert(key, plen, value)
+
+    def lookup(self, addr: str):
+        """Longest match for an address or prefix -> (prefix str, values) or None."""
+        version, key, plen = parse_prefix(addr)
+        hit = self.tries[version].longest_match(key, plen)
+        if hit is None:
+            return None
+        return format_prefix(version, hit[0], hit[1]), hit[2]
+
+    def overlaps(self, prefix: str, limit: int = 0) -> list[tuple[str, list]]:
+        version, key, plen = parse_prefix(prefix)
+        return [(format_prefix(version, k, p), v) for k, p, v in self.tries[version].overlaps(key, plen, limit)]
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SPINNER = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
+NOTIFY_SECS = 6.0
+KEEP_FINISHED = 50
+
+
+def describe_rc(result) -> tuple[bool, str]:
+    """Default summary for util.run-style (rc, out, err) results."""
+    try:
+        rc, out, err = result
+    except (TypeError, ValueError):
+        return True, str(result)
+    if rc == 0:
+        return True, out or "OK"
+    return False, err or out or f"exit {rc}"
+
+
+class Job:
+    def __init__(self, jid: int, label: str, describe):
+        self.id = jid
+        self.label = label
+        self.describe = describe
+        self.state = "running"
+        self.started = time.time()
+        self.finished: float | None = None
+        self.result = None
+        self.ok = False
+        self.text = ""
+        self.done = threading.Event()
+
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+
+class Runner:
+    """
+    Thread pool for slow external commands (wg syncconf, wg-quick, qrencode) so the
+    curses thread only ever draws and reads keys. Workers never touch curses.
+    """
+
+    def __init__(self, workers: int = 4):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wireme-job")
+        self._ids = itertools.count(1)
+        self._mu = threading.Lock()
+        self.jobs: list[Job] = []
+        self._notices: list[Job] = []
+
+    def submit(self, label: str, fn, *args, describe=describe_rc, **kwargs) -> Job:
+        job = Job(next(self._ids), label, describe)
+        with self._mu:
+            self.jobs.append(job)
+            finished = [j for j in self.jobs if j.state != "running"]
+            for j in finished[: max(0, len(finished) - KEEP_FINISHED)]:
+                self.jobs.remove(j)
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn, args, kwargs):
+        try:
+            job.result = fn(*args, **kwargs)
+            job.ok, job.text = job.describe(job.result)
+        except Exception as e:
+            job.ok, job.text = False, f"{type(e).__name__}: {e}"
+        job.state = "done" if job.ok else "failed"
+        job.finished = time.time()
+        with self._mu:
+            self._notices.append(job)
+        job.done.set()
+
+    def running(self) -> list[Job]:
+        with self._mu:
+            return [j for j in self.jobs if j.state == "running"]
+
+    def snapshot(self) -> list[Job]:
+        with self._mu:
+            return list(self.jobs)
+
+    def notice(self) -> Job | None:
+        """Most recent finished job still inside its notification window."""
+        now = time.time()
+        with self._mu:
+            self._notices = [j for j in self._notices if now - (j.finished or now) < NOTIFY_SECS]
+            return self._notices[-1] if self._notices else None
+
+    def active(self) -> bool:
+        """True while something needs periodic repaint (spinner or a fresh notification)."""
+        return bool(self.running()) or self.notice() is not None
+
+
+RUNNER = Runner()
+
+
+def submit(label: str, fn, *args, describe=describe_rc, **kwargs) -> Job:
+    return RUNNER.submit(label, fn, *args, describe=describe, **kwargs)
+
+
+def spinner() -> str:
+    return SPINNER[int(time.time() * 10) % len(SPINNER)]
@@ -0,0 +1,936 @@
+from __future__ import annotations
+
+import ipaddress
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import backups, commit, crypto, iptrie, peerdb, qr, quota, transport, util, wg
+
+
+def new_keypair():
+    rc, priv, err = util.run(["wg", "genkey"])
+    if rc != 0 or not priv:
+        return None, None, f"wg genkey failed:\n{err}"
+    pub = wg.pubkey_from_priv(priv)
+    if not pub:
+        return None, None, "Failed to derive public key."
+    return priv.strip(), pub, ""
+
+
+def new_psk() -> str:
+    rc, psk, _ = util.run(["wg", "genpsk"])
+    return psk.strip() if rc == 0 else ""
+
+
+def add_defaults(iface: str, smart: bool = False) -> dict:
+    cfg, peers, _ = wg.parse_conf(wg.conf_path(iface))
+    return defaults_for(cfg, peers, smart)
+
+
+def defaults_for(cfg: dict, peers, smart: bool = False, pub_ip: str | None = None) -> dict:
+    listen_port = (cfg.get("ListenPort") or "51820").strip()
+    if pub_ip is None:
+        pub_ip = wg.guess_public_ipv4()
+    net_str, server_vpn_ip = wg.iface_network_and_ip(cfg.get("Address") or "")
+    if smart:
+        route = f"{net_str or '10.0.0.0/24'}, {pub_ip + '/32' if pub_ip else 'PUBLIC_IP/32'}"
+        dns = "1.1.1.1"
+    else:
+        route = f"{server_vpn_ip}/32" if server_vpn_ip else ""
+        dns = ""
+    return {
+        "client_ip": wg.next_free_client_ip(cfg.get("Address") or "", peers) or "",
+        "endpoint": f"{pub_ip}:{listen_port}" if pub_ip else f":{listen_port}",
+        "route": route,
+        "dns": dns,
+    }
+
+
+def peer_block(name: str, created: str, profile: str, note: str, pub: str, psk: str, client_ip: str) -> list[str]:
+    block: list[str] = []
+    block.append("\n")
+    block.append(f"# wireme-name: {name}\n")
+    block.append(f"# wireme-created: {created}\n")
+    block.append(f"# wireme-profile: {profile}\n")
+    if note:
+        block.append(f"# wireme-note: {note}\n")
+    block.append("[Peer]\n")
+    block.append(f"PublicKey = {pub}\n")
+    if psk:
+        block.append(f"PresharedKey = {psk}\n")
+    block.append(f"AllowedIPs = {client_ip}\n")
+    return block
+
+
+def client_config_text(
+    name: str,
+    created: str,
+    profile: str,
+    priv: str,
+    client_ip: str,
+    dns: str,
+    s_pub: str,
+    psk: str,
+    endpoint: str,
+    route: str,
+) -> str:
+    client_config: list[str] = []
+    client_config.append(f"# name: {name}\n")
+    client_config.append(f"# created: {created}\n")
+    client_config.append(f"# profile: {profile}\n")
+    client_config.append("[Interface]\n")
+    client_config.append(f"PrivateKey = {priv}\n")
+    client_config.append(f"Address = {client_ip}\n")
+    if dns:
+        client_config.append(f"DNS = {dns}\n")
+    client_config.append("\n[Peer]\n")
+    client_config.append(f"PublicKey = {s_pub}\n")
+    if psk:
+        client_config.append(f"PresharedKey = {psk}\n")
+    client_config.append(f"Endpoint = {endpoint}\n")
+    if route:
+        client_config.append(f"AllowedIPs = {route}\n")
+    client_config.append("PersistentKeepalive = 25\n")
+    return "".join(client_config)
+
+
+def add_peer(
+    iface: str,
+    name: str,
+    client_ip: str,
+    endpoint: str,
+    route: str = "",
+    dns: str = "",
+    profile: str = "desktop",
+    note: str = "",
+    s_pub: str | None = None,
+    apply: bool = False,
+):
+    """
+    Append a new peer to the iface config and build its client config. The write
+    goes through commit.submit, so concurrent adds/deletes share one backup/write/apply.
+    client_ip "auto" picks the next free address at commit time.
+
+    Returns (ok, msg, info); info carries name, pub, backup, client_text (and apply).
+    """
+    if not s_pub:
+        s_pub, err = server_pub(iface)
+        if not s_pub:
+            return False, err, {}
+    mutate, err = _add_mutation(iface, name, client_ip, endpoint, route, dns, profile, note, s_pub)
+    if mutate is None:
+        return False, err, {}
+    return commit.submit(iface, mutate, apply=apply)
+
+
+def add_peers(iface: str, specs: list[dict], apply: bool = False):
+    """
+    Add many peers in one commit (one backup, one write, optional one apply). Each spec
+    takes add_peer's arguments (name required; client_ip defaults to "auto").
+
+    Returns (ok, msg, info); info carries results (one (ok, msg, info) per spec, as
+    add_peer's), backup (and apply). ok means at least one peer was added.
+    """
+    s_pub, err = server_pub(iface)
+    if not s_pub:
+        return False, err, {"results": []}
+    steps = []
+    for spec in specs:
+        kw = {k: spec[k] for k in ("route", "dns", "profile", "note") if spec.get(k) is not None}
+        steps.append(_add_mutation(iface, spec.get("name") or "", spec.get("client_ip") or "auto", spec.get("endpoint") or "", s_pub=s_pub, **kw))
+
+    def mutate(lines: list[str]):
+        results = []
+        changed = False
+        for step, err in steps:
+            if step is None:
+                results.append((False, err, {}))
+                continue
+            new_lines, res = step(lines)
+            if new_lines is not None:
+                lines, changed = new_lines, True
+            results.append(res)
+        n = sum(1 for r in results if r[0])
+        return (lines if changed else None), (n > 0, f"Added {n} of {len(results)} peer(s).", {"results": results})
+
+    return commit.submit(iface, mutate, apply=apply)
+
+
+def server_pub(iface: str) -> tuple[str | None, str]:
+    """(PublicKey derived from iface's PrivateKey, "") or (None, error)."""
+    cfg, _, _ = wg.parse_conf(wg.conf_path(iface))
+    s_priv = cfg.get("PrivateKey")
+    if not s_priv:
+        return None, "Interface PrivateKey not found in config."
+    s_pub = wg.pubkey_from_priv(s_priv)
+    if not s_pub:
+        return None, "Failed to derive server public key."
+    return s_pub, ""
+
+
+def _add_mutation(
+    iface: str,
+    name: str,
+    client_ip: str,
+    endpoint: str,
+    route: str = "",
+    dns: str = "",
+    profile: str = "desktop",
+    note: str = "",
+    s_pub: str = "",
+):
+    """(mutate, "") appending one new peer (keys made now, address picked at commit), or (None, error)."""
+    name = util.sanitize_name(name)
+    if not name:
+        return None, "Cancelled (invalid name)."
+    client_ip = client_ip.strip()
+    if not client_ip:
+        return None, "Cancelled (no IP)."
+    if client_ip != "auto" and "/" not in client_ip:
+        client_ip = client_ip + "/32"
+
+    priv, pub, err = new_keypair()
+    if not pub:
+        return None, err
+    psk = new_psk()
+    created = util.now_utc_iso()
+
+    def mutate(lines: list[str]):
+        out, st = _add_state(iface, lines)
+        ip = client_ip
+        if ip == "auto":
+            # allocated under the lock so parallel adds never hand out the same address
+            ip = _next_free(st)
+            if not ip:
+                return None, (False, "No free client IP left in the interface network.", {})
+        clash = prefix_conflicts(iface, ip, [st["idx"]] + st["others"])
+        if clash:
+            return None, (False, "AllowedIPs overlap:\n" + "\n".join(clash), {})
+        block = peer_block(name, created, profile, note, pub, psk, ip)
+        client_text = client_config_text(name, created, profile, priv, ip, dns, s_pub, psk, endpoint, route)
+        out.extend(block)
+        _state_add(st, iface, {"name": name, "PublicKey": pub, "AllowedIPs": ip})
+        st["n"] = len(out)
+        return out, (True, "Saved.", {"name": name, "pub": pub, "client_ip": ip, "client_text": client_text})
+
+    return mutate, ""
+
+
+def _add_state(iface: str, lines: list[str]) -> tuple[commit.Lines, dict]:
+    """
+    (lines to append to, state) for an add mutation. The state (free addresses, this
+    interface's prefix index, the other server interfaces' indexes) is built once per
+    batch and carried on the returned commit.Lines, so each further add in the same
+    batch costs O(its prefixes) instead of a re-parse of the whole config.
+    """
+    st = getattr(lines, "state", None)
+    if st is not None and st.get("kind") == "add" and st["n"] == len(lines):
+        return st["out"], st
+    cfg, peers, _ = wg.parse_conf_text("".join(lines))
+    net_str, server_ip = wg.iface_network_and_ip(cfg.get("Address") or "")
+    st = {"kind": "add", "net": ipaddress.ip_network(net_str, strict=False) if net_str else None, "used": set(), "cursor": 0}
+    if server_ip:
+        _use(st, server_ip)
+    base = _take_index(iface, getattr(lines, "sig", None))
+    fresh = base is None
+    if fresh:
+        base = _new_entry(iface, cfg)
+    st["ent"] = base
+    st["idx"] = base["idx"]
+    for p in peers:
+        _state_add(st, iface, p, index=fresh)
+    st["others"] = [disk_index(c.stem) for c in wg.interfaces() if c.stem != iface and is_server(c.stem)]
+    out = commit.Lines(lines)
+    out.state = st
+    st["out"], st["n"] = out, len(out)
+    if isinstance(lines, commit.Lines):
+        lines.state = st  # a step that fails returns None, and the next one is handed lines again
+    out.after.append(lambda sig: _put_index(iface, sig, base))
+    return out, st
+
+
+def _use(st: dict, addr: str):
+    """Mark the address part of addr (host bits kept) as taken."""
+    try:
+        version, key, _ = iptrie.parse_prefix(addr.partition("/")[0])
+    except ValueError:
+        return
+    st["used"].add((version, key))
+
+
+def _state_add(st: dict, iface: str, p: dict, index: bool = True):
+    """Record a peer's addresses as used and (with index) add its prefixes to st's index."""
+    for part in (p.get("AllowedIPs") or "").split(","):
+        if part.strip():
+            _use(st, part)
+    if index:
+        _index_peer(st["ent"], iface, p)
+
+
+def _next_free(st: dict) -> str | None:
+    """Like wg.next_free_client_ip, resuming where the last pick of this batch stopped."""
+    net = st["net"]
+    if net is None:
+        return None
+    first, last = int(net.network_address), int(net.broadcast_address)
+    if net.num_addresses > 2:  # same range as net.hosts()
+        first += 1
+        last -= net.version == 4
+    i = max(first, st["cursor"])
+    while i <= last:
+        if (net.version, i) not in st["used"]:
+            st["cursor"] = i + 1
+            return f"{type(net.network_address)(i)}/32"
+        i += 1
+    st["cursor"] = i
+    return None
+
+
+# ---------- AllowedIPs index ----------
+
+_INDEX: dict[tuple, dict] = {}  # (transport, iface) -> {sig, idx, port, peers, wide}
+_INDEX_MU = threading.Lock()
+
+
+def _new_entry(iface: str, cfg: dict) -> dict:
+    """An index entry holding only iface's own interface addresses (peers come via _index_peer)."""
+    idx = iptrie.PrefixIndex()
+    for part in (cfg.get("Address") or "").split(","):
+        # the interface's own addresses as hosts; its network would "overlap" every peer
+        if part.strip():
+            try:
+                idx.add(part.strip().split("/")[0], {"iface": iface, "kind": "interface", "name": iface, "pub": ""})
+            except ValueError:
+                pass
+    return {"sig": None, "idx": idx, "port": bool(cfg.get("ListenPort")), "peers": 0, "wide": 0}
+
+
+def _index_peer(ent: dict, iface: str, p: dict):
+    owner = {"iface": iface, "kind": "peer", "name": p.get("name") or "unnamed", "pub": p.get("PublicKey") or ""}
+    default = False
+    for part in (p.get("AllowedIPs") or "").split(","):
+        if part.strip():
+            try:
+                ent["idx"].add(part, owner)
+                default = default or iptrie.parse_prefix(part)[2] <= 1  # 0.0.0.0/0, or wg-quick's /1 halves
+            except ValueError:
+                pass
+    ent["peers"] += 1
+    ent["wide"] += default
+
+
+def _build_entry(iface: str, text: str) -> dict:
+    cfg, peers, _ = wg.parse_conf_text(text)
+    ent = _new_entry(iface, cfg)
+    for p in peers:
+        _index_peer(ent, iface, p)
+    return ent
+
+
+def _take_index(iface: str, sig: tuple[int, int] | None) -> dict | None:
+    """
+    Remove and return the cached entry of iface if it was built at sig (the add path
+    extends it in place; _put_index puts it back under the signature of the new file).
+    """
+    if sig is None:
+        return None
+    with _INDEX_MU:
+        key = (transport.current(), iface)
+        ent = _INDEX.get(key)
+        if ent is None or ent["sig"] != sig:
+            return None
+        return _INDEX.pop(key)
+
+
+def _put_index(iface: str, sig: tuple[int, int], ent: dict):
+    with _INDEX_MU:
+        ent["sig"] = sig
+        _INDEX[(transport.current(), iface)] = ent
+
+
+def disk_entry(iface: str) -> dict:
+    """The index entry of iface's config on disk (cached until its signature changes)."""
+    path = wg.conf_path(iface)
+    sig = wg.conf_sig(path)
+    key = (transport.current(), iface)
+    with _INDEX_MU:
+        ent = _INDEX.get(key)
+        if ent is not None and sig != (0, 0) and ent["sig"] == sig:
+            return ent
+    ent = _build_entry(iface, wg.read_conf(path))
+    ent["sig"] = sig
+    with _INDEX_MU:
+        _INDEX[key] = ent
+    return ent
+
+
+def disk_index(iface: str) -> iptrie.PrefixIndex:
+    return disk_entry(iface)["idx"]
+
+
+def is_server(iface: str) -> bool:
+    """
+    Whether iface looks like a server config: it has a ListenPort and is not a single
+    peer routing a default route (a wiremec client config installed on the same host).
+    """
+    ent = disk_entry(iface)
+    return ent["port"] and not (ent["peers"] == 1 and ent["wide"] == 1)
+
+
+def forget(changes: list[dict]):
+    """Drop the cached indexes of configs named in watch.changes() output."""
+    with _INDEX_MU:
+        for ch in changes:
+            if ch["kind"] == "overflow":
+                _INDEX.clear()
+            elif ch["kind"] == "conf":
+                for key in [k for k in _INDEX if k[1] == ch["iface"]]:
+                    del _INDEX[key]
+
+
+def _owner_str(prefix: str, owner: dict) -> str:
+    if owner["kind"] == "interface":
+        return f"{prefix} (interface address of {owner['iface']})"
+    return f"{prefix} (peer '{owner['name']}' {wg.pub_fingerprint(owner['pub'])} on {owner['iface']})"
+
+
+def prefix_conflicts(iface: str, allowed_ips: str, idxs: list | None = None) -> list[str]:
+    """
+    Overlaps between allowed_ips and every prefix already routed by iface or by any
+    other server interface on the host (idxs: those indexes, default from disk). Client
+    configs (see is_server) are left out: a full-tunnel client would overlap every address.
+    """
+    if idxs is None:
+        idxs = [disk_index(iface)] + [disk_index(c.stem) for c in wg.interfaces() if c.stem != iface and is_server(c.stem)]
+    out: list[str] = []
+    for part in allowed_ips.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            for idx in idxs:
+                for prefix, owners in idx.overlaps(part, limit=5):
+                    out += [f"{part} overlaps {_owner_str(prefix, o)}" for o in owners]
+        except ValueError as e:
+            out.append(f"{part}: {e}")
+    return out
+
+
+def whois(addr: str) -> dict:
+    """
+    Who routes addr (an address or prefix) across all interfaces: the longest match
+    and, for a prefix, every stored prefix overlapping it.
+    """
+    version, _, plen = iptrie.parse_prefix(addr)
+    wide = plen < (32 if version == 4 else 128)
+    best = None
+    overlaps: list[dict] = []
+    for c in wg.interfaces():
+        idx = disk_index(c.stem)
+        hit = idx.lookup(addr)
+        if hit is not None and (best is None or iptrie.parse_prefix(hit[0])[2] > iptrie.parse_prefix(best["prefix"])[2]):
+            best = {"prefix": hit[0], "owners": hit[1]}
+        if wide:
+            overlaps += [{"prefix": p, "owners": o} for p, o in idx.overlaps(addr)]
+    overlaps.sort(key=lambda o: iptrie.parse_prefix(o["prefix"]))
+    return {"query": addr, "match": best, "overlaps": overlaps}
+
+
+def peer_span(raw_lines: list[str], peer: dict) -> tuple[int, int]:
+    """Line range of a peer block including its leading wireme metadata and blank lines."""
+    start = peer["start"]
+    remove_start = start
+    i = start - 1
+    while i >= 0:
+        ln = raw_lines[i].strip()
+        if ln.startswith(f"# {wg.META_PREFIX}") or ln == "":
+            remove_start = i
+            i -= 1
+            continue
+        break
+    # a peer's range runs up to the next section header, so it also covers the next
+    # peer's metadata comments; stop before those
+    end = peer["end"]
+    while end > start + 1:
+        ln = raw_lines[end - 1].strip()
+        if not (ln.startswith(f"# {wg.META_PREFIX}") or ln == ""):
+            break
+        end -= 1
+    return remove_start, end
+
+
+def saved_client_confs(iface: str) -> list[str]:
+    return [str(p) for p in transport.current().glob(wg.CLIENTS_DIR / iface, "*.conf")]
+
+
+def matching_client_confs(iface: str, pub: str) -> list[str]:
+    # find matching saved client configs by pubkey derived from PrivateKey in file
+    matches: list[str] = []
+    if not pub:
+        return matches
+    indexed = peerdb.saved_for(iface, pub)
+    if indexed is not None:
+        return indexed
+    for f in saved_client_confs(iface):
+        cpub = wg.client_pubkey_from_file(Path(f))
+        if cpub and cpub == pub:
+            matches.append(f)
+    return matches
+
+
+def delete_peer(iface: str, pub: str, matches: list[str] | None = None, apply: bool = False):
+    """
+    Remove the peer with PublicKey pub from the iface config (via commit.submit) and
+    delete the given saved client configs (defaults to the ones matching pub).
+
+    Returns (ok, msg, info); info carries backup, deleted, errors (and apply).
+    """
+    if not pub:
+        return False, "Peer not found in config.", {}
+    if matches is None:
+        matches = matching_client_confs(iface, pub)
+
+    def mutate(lines: list[str]):
+        _, peers, _ = wg.parse_conf_text("".join(lines))
+        peer = next((p for p in peers if p.get("PublicKey") == pub), None)
+        if peer is None:
+            return None, (False, "Peer not found in config.", {})
+        remove_start, end = peer_span(lines, peer)
+        return lines[:remove_start] + lines[end:], (True, "Removed peer.", {})
+
+    ok, msg, info = commit.submit(iface, mutate, apply=apply)
+    if not ok:
+        return ok, msg, info
+
+    deleted_files: list[str] = []
+    delete_errors: list[str] = []
+    t = transport.current()
+    for m in matches:
+        try:
+            t.unlink(Path(m))
+            deleted_files.append(m)
+        except Exception as e:
+            delete_errors.append(f"{m}: {e}")
+    info.update({"deleted": deleted_files, "errors": delete_errors})
+    return ok, msg, info
+
+
+def delete_peers(iface: str, pubs: list[str], apply: bool = False, keep_saved: bool = False):
+    """
+    Remove many peers in one commit (one backup, one write, optional one apply) and,
+    unless keep_saved, their saved client configs.
+
+    Returns (ok, msg, info); info carries removed, missing, deleted, errors, backup.
+    """
+    wanted = set(pubs)
+
+    def mutate(lines: list[str]):
+        _, peers, _ = wg.parse_conf_text("".join(lines))
+        hit = [p for p in peers if p.get("PublicKey") in wanted]
+        if not hit:
+            return None, (False, "None of the peers are in the config.", {})
+        drop: set[int] = set()
+        for peer in hit:
+            drop.update(range(*peer_span(lines, peer)))
+        lines = [ln for i, ln in enumerate(lines) if i not in drop]
+        removed = [p["PublicKey"] for p in hit]
+        missing = sorted(wanted - set(removed))
+        return lines, (True, f"Removed {len(removed)} peer(s).", {"removed": removed, "missing": missing})
+
+    ok, msg, info = commit.submit(iface, mutate, apply=apply)
+    if not ok:
+        return ok, msg, info
+
+    deleted_files: list[str] = []
+    delete_errors: list[str] = []
+    t = transport.current()
+    for pub in [] if keep_saved else info["removed"]:
+        for m in matching_client_confs(iface, pub):
+            try:
+                t.unlink(Path(m))
+                deleted_files.append(m)
+            except Exception as e:
+                delete_errors.append(f"{m}: {e}")
+    info.update({"deleted": deleted_files, "errors": delete_errors})
+    return ok, msg, info
+
+
+def saved_client_map(iface: str) -> dict[str, list[str]]:
+    """PublicKey -> saved client configs of iface, from the sidecar or one scan of the files."""
+    indexed = peerdb.saved_map(iface)
+    if indexed is not None:
+        return indexed
+    out: dict[str, list[str]] = {}
+    files = saved_client_confs(iface)
+    for f, cpub in zip(files, wg.client_pubkeys([Path(f) for f in files])):
+        if cpub:
+            out.setdefault(cpub, []).append(f)
+    return out
+
+
+def _rekey_peer(lines: list[str], start: int, end: int, new: dict):
+    key_at = None
+    has_psk = False
+    for i in range(start, end):
+        key = lines[i].split("=", 1)[0].strip()
+        if key == "PublicKey":
+            lines[i] = f"PublicKey = {new['pub']}\n"
+            key_at = i
+        elif key == "PresharedKey":
+            lines[i] = f"PresharedKey = {new['psk']}\n"
+            has_psk = True
+    if not has_psk and key_at is not None:
+        lines.insert(key_at + 1, f"PresharedKey = {new['psk']}\n")
+
+
+def _rekey_client(text: str, new: dict) -> str:
+    lines = text.splitlines(True)
+    section = None
+    peer_at = None
+    has_psk = False
+    for i, raw in enumerate(lines):
+        ln = raw.strip()
+        if ln.startswith("[") and ln.endswith("]"):
+            section = ln.lower()
+            if section == "[peer]" and peer_at is None:
+                peer_at = i
+            continue
+        key = ln.split("=", 1)[0].strip()
+        if section == "[interface]" and key == "PrivateKey" and new["priv"]:
+            lines[i] = f"PrivateKey = {new['priv']}\n"
+        elif section == "[peer]" and key == "PresharedKey":
+            lines[i] = f"PresharedKey = {new['psk']}\n"
+            has_psk = True
+    if not has_psk and peer_at is not None:
+        lines.insert(peer_at + 1, f"PresharedKey = {new['psk']}\n")
+    return "".join(lines)
+
+
+WRITERS = 8
+STAGED = ".wireme-new"
+
+
+def _material(pub: str, keys: bool, in_process: bool) -> tuple[dict | None, str]:
+    """New {psk, priv, pub} for one peer (priv None without keys), or (None, error)."""
+    psk = crypto.genpsk()  # 32 bytes of os.urandom, as `wg genpsk`
+    if not keys:
+        return {"psk": psk, "priv": None, "pub": pub}, ""
+    if in_process:
+        priv = crypto.genkey()
+        return {"psk": psk, "priv": priv, "pub": crypto.pubkey(priv)}, ""
+    priv, new_pub, err = new_keypair()
+    if not new_pub:
+        return None, err
+    return {"psk": psk, "priv": priv, "pub": new_pub}, ""
+
+
+def rotate_peers(iface: str, pubs: list[str], keys: bool = False, apply: bool = False, force: bool = False, in_process: bool = False):
+    """
+    Give the selected peers a new PresharedKey (with keys, also a new key pair) in one
+    commit and rewrite their saved client configs to match. Peers without a saved
+    client config are skipped unless force: nothing would carry the new material to
+    them, so they lose access until re-provisioned.
+
+    Key pairs come from `wg genkey`/`wg pubkey` (a few at a time); in_process uses
+    wireme's own X25519 instead, which is faster but not constant-time.
+
+    Returns (ok, msg, info); info carries rotated, new_pubs, skipped (with reasons),
+    written, unsaved, errors, backup (and apply). unsaved maps old PublicKeys to new
+    material no client file carries yet: {file, priv, psk, pub}, where file is the
+    staged config a failed rename left behind, or None for a forced peer (then also
+    name, profile, client_ip; see save_rotated).
+    """
+    t = transport.current()
+    saved = saved_client_map(iface)
+    todo = [p for p in dict.fromkeys(pubs) if saved.get(p) or force]
+    skipped = [p for p in dict.fromkeys(pubs) if p not in todo]
+    reasons: dict[str, str] = {}
+    if not todo:
+        return False, "No selected peer has a saved client config (use force to rotate anyway).", {"skipped": skipped}
+
+    new: dict[str, dict] = {}
+    errors: list[str] = []
+
+    def material(p):
+        with transport.using(t):  # pool threads do not inherit the caller's host
+            return _material(p, keys, in_process)
+
+    with ThreadPoolExecutor(max_workers=WRITERS) as ex:
+        for pub, (m, err) in zip(todo, ex.map(material, todo)):
+            if m is None:
+                errors.append(err)
+                reasons[pub] = "no new key pair"
+            else:
+                new[pub] = m
+
+    # Client configs are staged next to the originals (<file>.wireme-new, outside the
+    # *.conf glob) before the server commit and renamed into place after it. A peer
+    # whose client file cannot be read or staged is dropped before the commit, so the
+    # server never holds keys that no client file carries.
+    clients: dict[str, list[tuple[str, str]]] = {}
+    for pub in new:
+        for f in saved.get(pub, []):
+            try:
+                text = t.read_bytes(Path(f)).decode("utf-8", errors="replace")
+            except OSError as e:
+                errors.append(f"{f}: {e}")
+                reasons[pub] = f"cannot read {f}"
+                break
+            clients.setdefault(pub, []).append((f, _rekey_client(text, new[pub])))
+
+    def stage(item):
+        f, text = item
+        try:
+            t.write_atomic(Path(f + STAGED), text.encode("utf-8"), mode=0o600)
+            return f, None
+        except OSError as e:
+            return f, f"{f}: {e}"
+
+    staged: set[str] = set()
+    owner = {f: pub for pub, items in clients.items() for f, _ in items}
+    # each write is an fsync + rename; a few in flight keep the disk busy instead of waiting on each
+    with ThreadPoolExecutor(max_workers=WRITERS) as ex:
+        for f, err in ex.map(stage, [it for pub, items in clients.items() if pub not in reasons for it in items]):
+            if err is None:
+                staged.add(f)
+            else:
+                errors.append(err)
+                reasons[owner[f]] = f"cannot write {f}"
+
+    def unstage(files):
+        for f in files:
+            try:
+                t.unlink(Path(f + STAGED))
+            except OSError:
+                pass
+
+    unstage([f for f in staged if owner[f] in reasons])
+    staged = {f for f in staged if owner[f] not in reasons}
+    skipped += [p for p in todo if p in reasons]
+    todo = [p for p in todo if p not in reasons]
+    new = {p: new[p] for p in todo}
+    if not todo:
+        return False, "No selected peer could be rotated (see reasons).", {"skipped": skipped, "reasons": reasons, "errors": errors}
+
+    def mutate(lines: list[str]):
+        _, peers, _ = wg.parse_conf_text("".join(lines))
+        hit = [p for p in peers if p.get("PublicKey") in new]
+        if not hit:
+            return None, (False, "None of the peers are in the config.", {})
+        lines = list(lines)
+        for p in reversed(hit):  # bottom-up: an inserted PresharedKey line shifts only later peers
+            _rekey_peer(lines, p["start"], p["end"], new[p["PublicKey"]])
+        rotated = [p["PublicKey"] for p in hit]
+        # forced peers have no client file to carry their new material: remember what a new one needs
+        orphans = {p["PublicKey"]: {"name": p.get("name"), "profile": p.get("profile"), "client_ip": p.get("AllowedIPs")} for p in hit if not saved.get(p["PublicKey"])}
+        what = "keys and PresharedKeys" if keys else "PresharedKeys"
+        return lines, (True, f"Rotated {what} of {len(rotated)} peer(s).", {"rotated": rotated, "orphans": orphans})
+
+    ok, msg, info = commit.submit(iface, mutate, apply=apply)
+    if not ok:
+        unstage(staged)
+        info.update({"skipped": skipped, "reasons": reasons, "errors": errors})
+        return ok, msg, info
+
+    rotated = set(info["rotated"])
+    unstage([f for f in staged if owner[f] not in rotated])
+    written: list[tuple[str, str]] = []
+    unsaved: dict[str, dict] = {}
+    for f in sorted(f for f in staged if owner[f] in rotated):
+        pub = owner[f]
+        try:
+            t.rename(Path(f + STAGED), Path(f))
+            written.append((f, new[pub]["pub"]))
+        except OSError as e:
+            # the server already has the new keys: the staged file stays, and the key material is returned
+            errors.append(f"{f}: {e} (new config left in {f + STAGED})")
+            unsaved[pub] = {"file": f + STAGED, "priv": new[pub]["priv"], "psk": new[pub]["psk"], "pub": new[pub]["pub"]}
+    for pub, meta in info.pop("orphans").items():
+        unsaved[pub] = dict(meta, file=None, priv=new[pub]["priv"], psk=new[pub]["psk"], pub=new[pub]["pub"])
+    if keys:
+        peerdb.note_saved_many(iface, written)
+    info.update(
+        {
+            "new_pubs": {p: new[p]["pub"] for p in info["rotated"]},
+            "skipped": skipped,
+            "reasons": reasons,
+            "written": [f for f, _ in written],
+            "unsaved": unsaved,
+            "errors": errors,
+        }
+    )
+    return ok, msg, info
+
+
+def save_rotated(iface: str, unsaved: dict[str, dict]) -> tuple[dict[str, str], list[str]]:
+    """
+    Write new client configs for the forced, re-keyed peers in rotate_peers' unsaved
+    (file None and a priv), with endpoint, route and DNS as `wireme add` would pick.
+    Returns (old PublicKey -> path, errors).
+    """
+    todo = {pub: u for pub, u in unsaved.items() if u["file"] is None and u["priv"]}
+    if not todo:
+        return {}, []
+    s_pub, err = server_pub(iface)
+    if not s_pub:
+        return {}, [err]
+    defaults = add_defaults(iface)
+    created = util.now_utc_iso()
+    paths: dict[str, str] = {}
+    errors: list[str] = []
+    for pub, u in todo.items():
+        name = util.sanitize_name(u["name"] or "") or "unnamed"
+        profile = u["profile"] or "desktop"
+        text = client_config_text(name, created, profile, u["priv"], u["client_ip"] or "", defaults["dns"], s_pub, u["psk"], defaults["endpoint"], defaults["route"])
+        try:
+            paths[pub] = save_client_conf(iface, name, u["pub"], text)
+        except OSError as e:
+            errors.append(f"{name}: {e}")
+    return paths, errors
+
+
+def set_quota(iface: str, pubs: list[str], size: str | None):
+    """
+    Set (or with None, remove) the '# wireme-quota:' line of the selected peers in one
+    commit. Nothing is applied: the quota enforcer picks the change up on its next tick.
+
+    Returns (ok, msg, info); info carries changed, backup.
+    """
+    if size is not None and util.parse_size(size) is None:
+        return False, f"Bad quota {size!r} (e.g. 500M, 50G, 1T).", {}
+    want = set(pubs)
+    tag = f"# {wg.META_PREFIX}{quota.META}:"
+
+    def mutate(lines: list[str]):
+        _, peers, _ = wg.parse_conf_text("".join(lines))
+        out = list(lines)
+        n = 0
+        for p in reversed(peers):  # bottom-up: earlier line numbers stay valid
+            if p.get("PublicKey") not in want:
+                continue
+            start = top = p["start"]
+            while top > 0 and out[top - 1].strip().startswith(f"# {wg.META_PREFIX}"):
+                top -= 1
+            meta = [ln for ln in out[top:start] if not ln.strip().startswith(tag)]
+            if size is not None:
+                meta.append(f"{tag} {size}\n")
+            if meta != out[top:start]:
+                out[top:start] = meta
+                n += 1
+        if not n:
+            return None, (False, "Nothing to change.", {"changed": 0})
+        what = f"set to {size}" if size is not None else "removed"
+        return out, (True, f"Quota {what} for {n} peer(s).", {"changed": n})
+
+    return commit.submit(iface, mutate)
+
+
+def restore_backup(iface: str, ref: str, apply: bool = False):
+    """
+    Put a stored version back as the config, through the normal commit path (so the
+    current contents are backed up first and the indexes follow). iface may name one
+    part of a sharded config ('wg0.d/peers-03', 'wg0.d/interface'); only that part is
+    replaced.
+
+    Returns (ok, msg, info); info carries version, backup (and apply).
+    """
+    ver = backups.resolve(iface, ref)
+    if ver is None:
+        return False, f"No backup {ref!r} for {iface} (see: wireme backups list {iface}).", {}
+    try:
+        data = backups.load(iface, ver["sha"])
+    except (OSError, ValueError, zlib.error) as e:
+        return False, f"Cannot read backup #{ver['seq']}: {e}", {}
+    text = data.decode("utf-8", errors="replace")
+    target, _, part = iface.partition(".d/")
+
+    def mutate(lines: list[str]):
+        new = text
+        if part:
+            if not wg.is_sharded(target):
+                return None, (False, f"{target} is not sharded any more.", {})
+            names = [p.stem for p in wg.shard_parts(target)]
+            if part not in names:
+                return None, (False, f"{target} has no part {part!r} any more.", {})
+            parts = wg.split_text("".join(lines), len(names) - 1)
+            parts[names.index(part)] = text
+            new = "".join(parts)
+        if "".join(lines) == new:
+            return None, (False, f"{iface} already matches backup #{ver['seq']}.", {})
+        return new.splitlines(True), (True, f"Restored {iface} to backup #{ver['seq']}.", {"version": ver})
+
+    return commit.submit(target, mutate, apply=apply)
+
+
+def shard_interface(iface: str, shards: int = 16, merge: bool = False):
+    """
+    Switch iface between a single <iface>.conf and the sharded <iface>.d/ layout (see
+    wg.shard_conf), or re-shard it into a different number of peer files.
+
+    Returns (ok, msg, info); info carries backup.
+    """
+    path = wg.conf_path(iface)
+    if not wg.is_sharded(iface) and not transport.current().exists(path):
+        return False, f"No such interface: {iface}", {}
+    if not merge and not 1 <= shards <= 256:
+        return False, "--shards must be between 1 and 256.", {}
+    with wg.locked(path):
+        sharded = wg.is_sharded(iface)
+        if merge:
+            if not sharded:
+                return False, f"{iface} is not sharded.", {}
+            wg.unshard_conf(iface)
+            backup = backups.save(path)
+            msg = f"Merged {wg.shard_dir(iface)} back into {path}."
+        else:
+            backup = "(sharded already)" if sharded else backups.save(path)
+            wg.shard_conf(iface, shards)
+            msg = f"Sharded {iface} into {wg.shard_dir(iface)} ({shards} peer files)."
+        peerdb.after_write(path, wg.read_conf(path))
+    return True, msg, {"backup": backup}
+
+
+def save_client_conf(iface: str, name: str, pub: str, client_text: str) -> str:
+    t = transport.current()
+    client_dir = wg.CLIENTS_DIR / iface
+    t.mkdir(client_dir)
+    fp = wg.pub_fingerprint(pub)
+    client_conf = client_dir / f"{name}--{fp}.conf"
+    if t.exists(client_conf):
+        client_conf = client_dir / f"{name}--{fp}--{int(time.time())}.conf"
+    t.write_atomic(client_conf, client_text.encode("utf-8"), mode=0o600)
+    peerdb.note_saved(iface, str(client_conf), pub)
+    return str(client_conf)
+
+
+def status() -> list[dict]:
+    out: list[dict] = []
+    for c in wg.interfaces():
+        head, _ = wg.live_dump(c.stem)
+        out.append({"iface": c.stem, "path": str(c), "up": head is not None})
+    return out
+
+
+def overview(iface: str) -> dict:
+    cfg, peers, _ = wg.parse_conf(wg.conf_path(iface))
+    _, live = wg.live_dump(iface)
+    return {"cfg": public_cfg(cfg), "peers": peers, "live": live}
+
+
+def public_cfg(cfg: dict) -> dict:
+    return {k: v for k, v in cfg.items() if k != "PrivateKey"}
+
+
+def apply(iface: str):
+    return wg.apply_now(iface)
+
+
+def qr_text(text: str):
+    return qr.qr_from_text(text)
+
+
+def qr_saved(path: str):
+    return qr.qr_from_text(util.read_text(Path(path)))
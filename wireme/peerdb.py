@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import fnmatch
+import os
+import time
+import zlib
+from contextlib import closing
+from pathlib import Path
+
+from . import transport, util, wg
+
+try:
+    import sqlite3
+except ImportError:  # some minimal Pythons ship without it; everything falls back to parsing
+    sqlite3 = None
+
+# Optional SQLite sidecar per interface (/etc/wireguard/.wireme/<iface>.db): peer
+# metadata, keys, IPs and saved client config paths with indexes. The .conf stays the
+# source of truth; the sidecar is re-synced on every wireme write and rebuilt whenever
+# the config's mtime/size no longer match (hand edits, other tools).
+
+ENABLED = os.environ.get("WIREME_PEERDB", "1") != "0"
+DB_DIR = ".wireme"
+SCHEMA = 1
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS peers (
+    pub TEXT PRIMARY KEY,
+    fp TEXT NOT NULL,
+    name TEXT,
+    created TEXT,
+    profile TEXT,
+    note TEXT,
+    allowed_ips TEXT,
+    endpoint TEXT,
+    keepalive TEXT,
+    has_psk INTEGER NOT NULL DEFAULT 0,
+    h INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS peers_name ON peers (name);
+CREATE INDEX IF NOT EXISTS peers_fp ON peers (fp);
+CREATE INDEX IF NOT EXISTS peers_profile_created ON peers (profile, created);
+CREATE INDEX IF NOT EXISTS peers_created ON peers (created);
+CREATE TABLE IF NOT EXISTS peer_ips (pub TEXT NOT NULL, prefix TEXT NOT NULL, addr TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS peer_ips_pub ON peer_ips (pub);
+CREATE INDEX IF NOT EXISTS peer_ips_addr ON peer_ips (addr);
+CREATE TABLE IF NOT EXISTS saved (path TEXT PRIMARY KEY, pub TEXT, mtime_ns INTEGER, size INTEGER);
+CREATE INDEX IF NOT EXISTS saved_pub ON saved (pub);
+"""
+
+_FIELDS = ("name", "created", "profile", "note", "AllowedIPs", "Endpoint", "PersistentKeepalive")
+
+
+def db_path(iface: str) -> Path:
+    return wg.WIREGUARD_DIR / DB_DIR / f"{iface}.db"
+
+
+def _connect(iface: str):
+    """Open (creating if needed) the sidecar, or None when it is disabled or impossible here."""
+    if not ENABLED or sqlite3 is None:
+        return None
+    real = transport.current().local_path(db_path(iface))
+    if real is None:  # remote host: no local file to put a database in
+        return None
+    try:
+        real.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(real), timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA_SQL)
+        os.chmod(real, 0o600)
+    except (OSError, sqlite3.Error):
+        return None
+    return conn
+
+
+def _meta(conn, key: str) -> str | None:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _row(p: dict) -> tuple:
+    vals = tuple(p.get(k) for k in _FIELDS) + (1 if p.get("PresharedKey") else 0,)
+    h = zlib.crc32("\0".join("" if v is None else str(v) for v in vals).encode("utf-8"))
+    pub = p["PublicKey"]
+    return (pub, wg.pub_fingerprint(pub)) + vals + (h,)
+
+
+def _sync(conn, text: str, sig: tuple[int, int]):
+    _, peers, _ = wg.parse_conf_text(text)
+    new = {r[0]: r for r in (_row(p) for p in peers if p.get("PublicKey"))}
+    old = dict(conn.execute("SELECT pub, h FROM peers"))
+    changed = [r for pub, r in new.items() if old.get(pub) != r[-1]]
+    gone = [(pub,) for pub in old.keys() - new.keys()]
+    ips = []
+    for r in changed:
+        for part in (r[6] or "").split(","):
+            part = part.strip()
+            if part:
+                ips.append((r[0], part, part.split("/")[0]))
+    with conn:
+        conn.executemany("DELETE FROM peers WHERE pub = ?", gone)
+        conn.executemany("DELETE FROM peer_ips WHERE pub = ?", gone + [(r[0],) for r in changed])
+        conn.executemany("INSERT OR REPLACE INTO peers VALUES (?,?,?,?,?,?,?,?,?,?,?)", changed)
+        conn.executemany("INSERT INTO peer_ips VALUES (?,?,?)", ips)
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('sig', ?)", (f"{sig[0]}:{sig[1]}",))
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(SCHEMA),))
+
+
+def after_write(conf_path: Path, text: str):
+    """Called by commit after a successful write: bring the sidecar (if any) in line."""
+    conn = _connect(conf_path.stem)
+    if conn is None:
+        return
+    with closing(conn):
+        try:
+            _sync(conn, text, wg.conf_sig(conf_path))
+        except sqlite3.Error:
+            pass
+
+
+def _open_synced(iface: str):
+    """Connection whose peers match the current config (rebuilt if mtime/size moved)."""
+    conn = _connect(iface)
+    if conn is None:
+        return None
+    path = wg.conf_path(iface)
+    sig = wg.conf_sig(path)
+    try:
+        if _meta(conn, "sig") != f"{sig[0]}:{sig[1]}" or _meta(conn, "schema") != str(SCHEMA):
+            _sync(conn, wg.read_conf(path), sig)
+    except sqlite3.Error:
+        conn.close()
+        return None
+    return conn
+
+
+def _since(text: str | None) -> str | None:
+    """'2026-09', '2026-09-01', full ISO, or a duration ago ('30d') -> ISO prefix to compare."""
+    if not text:
+        return None
+    secs = util.parse_duration(text)
+    if secs is not None:
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - secs))
+    return text
+
+
+_COLUMNS = "pub, name, created, profile, note, allowed_ips, endpoint, keepalive, has_psk"
+
+
+def _peer(r: tuple) -> dict:
+    """A _COLUMNS row as the dict query() returns (no secrets, no line numbers)."""
+    return {
+        "PublicKey": r[0],
+        "name": r[1],
+        "created": r[2],
+        "profile": r[3],
+        "note": r[4],
+        "AllowedIPs": r[5],
+        "Endpoint": r[6],
+        "PersistentKeepalive": r[7],
+        "psk": bool(r[8]),
+    }
+
+
+def _order(p: dict) -> tuple:
+    # ORDER BY created, name, pub: NULLs first, then by code point (= SQLite's BINARY on UTF-8)
+    return (p["created"] is not None, p["created"] or "", p["name"] is not None, p["name"] or "", p["PublicKey"])
+
+
+def _match(p: dict, name, profile, since, until, ip, key) -> bool:
+    pub = p.get("PublicKey") or ""
+    if name and not fnmatch.fnmatchcase(p.get("name") or "", name):
+        return False
+    if profile and p.get("profile") != profile:
+        return False
+    created = p.get("created") or ""
+    if since and not (created and created >= since):
+        return False
+    if until and not (created and created < until):
+        return False
+    if ip and ip not in [a.strip().split("/")[0] for a in (p.get("AllowedIPs") or "").split(",")]:
+        return False
+    if key and key not in (p.get("name"), pub, wg.pub_fingerprint(pub) if pub else None):
+        return False
+    return True
+
+
+def query(
+    iface: str,
+    name: str | None = None,
+    profile: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    ip: str | None = None,
+    key: str | None = None,
+) -> list[dict]:
+    """
+    Peers matching every given filter: name (glob), profile, created since/until
+    (date or duration ago), ip (client address), key (name, PublicKey or fingerprint).
+    Uses the sidecar's indexes when available, else parses the config.
+    """
+    since, until = _since(since), _since(until)
+    conn = _open_synced(iface)
+    if conn is None:
+        # same rows, shape and order as the sidecar, which keeps one (the last) block per PublicKey
+        _, peers, _ = wg.parse_conf(wg.conf_path(iface))
+        latest = {p["PublicKey"]: p for p in peers if p.get("PublicKey")}
+        rows = [_row(p) for p in latest.values() if _match(p, name, profile, since, until, ip, key)]
+        return sorted((_peer((r[0],) + r[2:10]) for r in rows), key=_order)
+
+    where, args = [], []
+    if name:
+        where.append("COALESCE(name, '') GLOB ?")  # unnamed peers match '*', as in the fallback
+        args.append(name)
+    if profile:
+        where.append("profile = ?")
+        args.append(profile)
+    if since:
+        where.append("created >= ?")
+        args.append(since)
+    if until:
+        where.append("created < ?")
+        args.append(until)
+    if ip:
+        where.append("pub IN (SELECT pub FROM peer_ips WHERE addr = ?)")
+        args.append(ip)
+    if key:
+        where.append("(pub = ? OR fp = ? OR name = ?)")
+        args += [key, key, key]
+    sql = f"SELECT {_COLUMNS} FROM peers"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    with closing(conn):
+        rows = conn.execute(sql + " ORDER BY created, name, pub", args).fetchall()
+    return [_peer(r) for r in rows]
+
+
+def _refresh_saved(conn, iface: str):
+    """Bring the saved table in line with CLIENTS_DIR; only new or changed files have their key derived."""
+    t = transport.current()
+    known = {r[0]: (r[1], r[2]) for r in conn.execute("SELECT path, mtime_ns, size FROM saved")}
+    files = [str(p) for p in t.glob(wg.CLIENTS_DIR / iface, "*.conf")]
+    changed = []
+    for f in files:
+        sig = t.stat_sig(Path(f))
+        if known.get(f) != sig:
+            changed.append((f, sig))
+    pubs = wg.client_pubkeys([Path(f) for f, _ in changed])
+    fresh = [(f, pub, sig[0], sig[1]) for (f, sig), pub in zip(changed, pubs)]
+    with conn:
+        conn.executemany("DELETE FROM saved WHERE path = ?", [(f,) for f in known.keys() - set(files)])
+        conn.executemany("INSERT OR REPLACE INTO saved VALUES (?,?,?,?)", fresh)
+
+
+def saved_for(iface: str, pub: str) -> list[str] | None:
+    """Saved client configs whose PrivateKey belongs to pub; None means no sidecar (caller scans the files itself)."""
+    conn = _connect(iface)
+    if conn is None:
+        return None
+    with closing(conn):
+        try:
+            _refresh_saved(conn, iface)
+            return [r[0] for r in conn.execute("SELECT path FROM saved WHERE pub = ? ORDER BY path", (pub,))]
+        except sqlite3.Error:
+            return None
+
+
+def saved_map(iface: str) -> dict[str, list[str]] | None:
+    """PublicKey -> saved client configs for the whole interface (None without a sidecar)."""
+    conn = _connect(iface)
+    if conn is None:
+        return None
+    out: dict[str, list[str]] = {}
+    with closing(conn):
+        try:
+            _refresh_saved(conn, iface)
+            for path, pub in conn.execute("SELECT path, pub FROM saved WHERE pub IS NOT NULL ORDER BY path"):
+                out.setdefault(pub, []).append(path)
+        except sqlite3.Error:
+            return None
+    return out
+
+
+def note_saved(iface: str, path: str, pub: str):
+    note_saved_many(iface, [(path, pub)])
+
+
+def note_saved_many(iface: str, items: list[tuple[str, str]]):
+    """Record (path, pub) of client configs wireme just wrote, in one transaction."""
+    conn = _connect(iface)
+    if conn is None:
+        return
+    t = transport.current()
+    rows = [(path, pub) + t.stat_sig(Path(path)) for path, pub in items]
+    with closing(conn):
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO saved VALUES (?,?,?,?)", rows)
+        except sqlite3.Error:
+            pass
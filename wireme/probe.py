@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import os
+import socket
+import struct
+import time
+
+from . import crypto, util
+
+CONSTRUCTION = b"Noise_IKpsk2_25519_ChaChaPoly_BLAKE2s"
+IDENTIFIER = b"WireGuard v1 zx2c4 Jason@zx2c4.com"
+LABEL_MAC1 = b"mac1----"
+TAI64_BASE = 0x400000000000000A
+
+TIMEOUT = 1.0
+TRIES = 3
+HYSTERESIS = 0.2
+
+
+def split_endpoint(endpoint: str) -> tuple[str, int]:
+    """'host:port' / '[v6]:port' -> (host, port)."""
+    ep = endpoint.strip()
+    if ep.startswith("["):
+        host, _, rest = ep[1:].partition("]")
+        return host, int(rest.lstrip(":"))
+    host, _, port = ep.rpartition(":")
+    return host, int(port)
+
+
+def handshake_initiation(priv: bytes, peer_pub: bytes, sender_index: int) -> bytes:
+    """
+    Build a real WireGuard handshake initiation (Noise_IKpsk2), the only packet a
+    server answers without an established session. mac2 is left zero (no cookie).
+    """
+    ck = crypto.blake2s(CONSTRUCTION)
+    h = crypto.blake2s(ck, IDENTIFIER)
+    h = crypto.blake2s(h, peer_pub)
+
+    e_priv = os.urandom(32)
+    e_pub = crypto.x25519_base(e_priv)
+    ck = crypto.kdf(ck, e_pub, 1)[0]
+    h = crypto.blake2s(h, e_pub)
+
+    ck, key = crypto.kdf(ck, crypto.x25519(e_priv, peer_pub), 2)
+    enc_static = crypto.aead_encrypt(key, crypto.wg_nonce(0), crypto.x25519_base(priv), h)
+    h = crypto.blake2s(h, enc_static)
+
+    ck, key = crypto.kdf(ck, crypto.x25519(priv, peer_pub), 2)
+    now = time.time()
+    tai64n = struct.pack(">QI", TAI64_BASE + int(now), int((now % 1) * 1e9))
+    enc_ts = crypto.aead_encrypt(key, crypto.wg_nonce(0), tai64n, h)
+
+    msg = struct.pack("<BxxxI", 1, sender_index) + e_pub + enc_static + enc_ts
+    mac1 = crypto.blake2s_mac(crypto.blake2s(LABEL_MAC1, peer_pub), msg)
+    return msg + mac1 + b"\x00" * 16
+
+
+def _is_reply(data: bytes, sender_index: int) -> bool:
+    # handshake response (type 2): receiver index at 8; cookie reply (type 3): at 4
+    if len(data) == 92 and data[0] == 2:
+        return struct.unpack_from("<I", data, 8)[0] == sender_index
+    if len(data) == 64 and data[0] == 3:
+        return struct.unpack_from("<I", data, 4)[0] == sender_index
+    return False
+
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.waiting: asyncio.Future | None = None
+        self.sender_index = 0
+
+    def datagram_received(self, data, addr):
+        if self.waiting is not None and not self.waiting.done() and _is_reply(data, self.sender_index):
+            self.waiting.set_result(time.perf_counter())
+
+    def error_received(self, exc):
+        if self.waiting is not None and not self.waiting.done():
+            self.waiting.set_exception(exc)
+
+
+async def probe_endpoint(endpoint: str, priv: bytes, peer_pub: bytes, timeout: float = TIMEOUT, tries: int = TRIES) -> dict:
+    """
+    Send up to `tries` handshake initiations to endpoint; rtt_ms is the best reply time.
+
+    The server answers because the initiation is genuine, and it roams the peer to the
+    probe socket until the real interface sends again; callers with a running tunnel
+    nudge it right after the round (see client_ops.nudge_peer).
+    """
+    res = {"endpoint": endpoint, "addr": None, "rtt_ms": None, "error": ""}
+    loop = asyncio.get_running_loop()
+    try:
+        host, port = split_endpoint(endpoint)
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM)
+    except (OSError, ValueError) as e:
+        res["error"] = f"resolve: {e}"
+        return res
+    addr = infos[0][4]
+    res["addr"] = f"[{addr[0]}]:{addr[1]}" if ":" in addr[0] else f"{addr[0]}:{addr[1]}"
+
+    tr, proto = await loop.create_datagram_endpoint(_ProbeProtocol, remote_addr=addr[:2], family=infos[0][0])
+    try:
+        for _ in range(max(1, tries)):
+            proto.sender_index = int.from_bytes(os.urandom(4), "little")
+            proto.waiting = loop.create_future()
+            pkt = handshake_initiation(priv, peer_pub, proto.sender_index)
+            t0 = time.perf_counter()
+            tr.sendto(pkt)
+            try:
+                t1 = await asyncio.wait_for(proto.waiting, timeout)
+            except asyncio.TimeoutError:
+                res["error"] = res["error"] or "no reply"
+                continue
+            except OSError as e:
+                res["error"] = str(e) or type(e).__name__
+                break
+            rtt = (t1 - t0) * 1000
+            if res["rtt_ms"] is None or rtt < res["rtt_ms"]:
+                res["rtt_ms"] = rtt
+                res["error"] = ""
+    finally:
+        tr.close()
+    return res
+
+
+async def probe_all(endpoints: list[str], priv_b64: str, peer_pub_b64: str, timeout: float = TIMEOUT, tries: int = TRIES) -> list[dict]:
+    priv = base64.b64decode(priv_b64)
+    peer_pub = base64.b64decode(peer_pub_b64)
+    return list(await asyncio.gather(*(probe_endpoint(ep, priv, peer_pub, timeout, tries) for ep in endpoints)))
+
+
+def pick_best(results: list[dict], current_addr: str | None = None, hysteresis: float = HYSTERESIS) -> dict | None:
+    """
+    Fastest reachable result, unless the current endpoint answered and the winner is
+    not at least `hysteresis` (fraction) faster, in which case keep the current one.
+    """
+    ok = [r for r in results if r["rtt_ms"] is not None]
+    if not ok:
+        return None
+    best = min(ok, key=lambda r: r["rtt_ms"])
+    cur = next((r for r in ok if r["addr"] == current_addr), None)
+    if cur is not None and best["rtt_ms"] > cur["rtt_ms"] * (1 - hysteresis):
+        return cur
+    return best
+
+
+def live_endpoint(iface: str, peer_pub_b64: str) -> str | None:
+    rc, out, _ = util.run(["wg", "show", iface, "endpoints"])
+    if rc != 0:
+        return None
+    for ln in out.splitlines():
+        parts = ln.split("\t")
+        if len(parts) == 2 and parts[0] == peer_pub_b64 and parts[1] != "(none)":
+            return parts[1]
+    return None
+
+
+def set_live_endpoint(iface: str, peer_pub_b64: str, endpoint: str):
+    """Point the running interface at endpoint in place (no down/up)."""
+    return util.run(["wg", "set", iface, "peer", peer_pub_b64, "endpoint", endpoint])
+
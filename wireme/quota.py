@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import fcntl
+import os
+import struct
+import time
+from pathlib import Path
+
+from . import transport, util, wg
+
+# Monthly traffic quotas: '# wireme-quota: 50G' above a [Peer] caps its rx+tx per
+# calendar month (UTC). Usage is accumulated from live dumps into one compact state
+# file per interface (.wireme/quota/<iface>.state: a header and a 64-byte record per
+# capped peer), so it survives enforcer restarts, interface restarts and counter
+# resets. A peer over its quota is disabled by emptying its AllowedIPs with `wg set`
+# (batched, no syncconf); it gets its configured AllowedIPs back when the month rolls
+# over or its quota is raised or removed.
+#
+# A tick only walks the capped peers, and the config is re-parsed only when it changes.
+# The state file is rewritten at most every PERSIST seconds, or when a peer flips.
+
+QUOTA_DIR = "quota"
+META = "quota"
+MAGIC = b"WMQUOTA\x01"
+HEADER = struct.Struct("<8sII")  # magic, period (YYYYMM), records
+REC = struct.Struct("<32sQQQI4x")  # raw PublicKey, last rx, last tx, used this period, flags
+DISABLED = 1
+
+PERSIST = 60.0
+BATCH = 256  # peers per `wg set` call (argv stays well under ARG_MAX)
+NO_IPS = "(none)"  # what `wg show dump` prints for an empty AllowedIPs
+
+_LIMITS: dict[tuple, tuple] = {}  # (transport, iface) -> (conf sig, limits, allowed)
+
+
+def state_path(iface: str) -> Path:
+    return wg.WIREGUARD_DIR / ".wireme" / QUOTA_DIR / f"{iface}.state"
+
+
+def period_of(ts: float) -> int:
+    t = time.gmtime(ts)
+    return t.tm_year * 100 + t.tm_mon
+
+
+def limits(iface: str) -> tuple[dict[str, int], dict[str, str]]:
+    """({pub: quota bytes} for capped peers, {pub: configured AllowedIPs} for all), cached per config."""
+    t = transport.current()
+    path = wg.conf_path(iface)
+    sig = wg.conf_sig(path)
+    hit = _LIMITS.get((t, iface))
+    if hit is not None and hit[0] == sig:
+        return hit[1], hit[2]
+    _, peers, _ = wg.parse_conf(path)
+    caps: dict[str, int] = {}
+    allowed: dict[str, str] = {}
+    for p in peers:
+        pub = p.get("PublicKey")
+        if not pub:
+            continue
+        allowed[pub] = (p.get("AllowedIPs") or "").replace(" ", "")
+        n = util.parse_size(p.get(META) or "")
+        if n is not None:
+            caps[pub] = n
+    _LIMITS[(t, iface)] = (sig, caps, allowed)
+    return caps, allowed
+
+
+def _raw(pub: str) -> bytes | None:
+    try:
+        raw = base64.b64decode(pub, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return raw if len(raw) == 32 else None
+
+
+def load(iface: str) -> tuple[int, dict[str, list[int]]]:
+    """(period, {pub: [last rx, last tx, used, flags]}) from the state file ((0, {}) if none)."""
+    try:
+        data = transport.current().read_bytes(state_path(iface))
+    except OSError:
+        return 0, {}
+    if len(data) < HEADER.size:
+        return 0, {}
+    magic, period, n = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or len(data) < HEADER.size + n * REC.size:
+        return 0, {}
+    out: dict[str, list[int]] = {}
+    for raw, rx, tx, used, flags in REC.iter_unpack(data[HEADER.size : HEADER.size + n * REC.size]):
+        out[base64.b64encode(raw).decode("ascii")] = [rx, tx, used, flags]
+    return period, out
+
+
+def save(iface: str, period: int, peers: dict[str, list[int]]):
+    buf = bytearray(HEADER.pack(MAGIC, period, 0))
+    n = 0
+    for pub, (rx, tx, used, flags) in peers.items():
+        raw = _raw(pub)
+        if raw is not None:
+            buf += REC.pack(raw, rx, tx, used, flags)
+            n += 1
+    HEADER.pack_into(buf, 0, MAGIC, period, n)
+    t = transport.current()
+    t.mkdir(state_path(iface).parent)
+    t.write_atomic(state_path(iface), bytes(buf), mode=0o600)
+
+
+def wg_set_allowed(iface: str, items: list[tuple[str, str]]) -> tuple[set[str], list[str]]:
+    """Set AllowedIPs of (pub, ips) pairs ('' empties them) in batched `wg set` calls; returns (done pubs, errors)."""
+    done: set[str] = set()
+    errors: list[str] = []
+    for i in range(0, len(items), BATCH):
+        chunk = items[i : i + BATCH]
+        argv = ["wg", "set", iface]
+        for pub, ips in chunk:
+            argv += ["peer", pub, "allowed-ips", ips]
+        rc, out, err = util.run(argv, timeout=30)
+        if rc == 0:
+            done.update(pub for pub, _ in chunk)
+        else:
+            errors.append(f"wg set {iface} ({len(chunk)} peers): {(err or out).strip()}")
+    return done, errors
+
+
+class Enforcer:
+    """
+    Accumulates usage from successive live dumps and flips peers at their quota. The
+    first sighting of a peer is only a baseline; a counter that went backwards
+    (interface restarted) counts from 0. One enforcer per interface and host: the lock
+    is taken on first use and kept.
+    """
+
+    def __init__(self):
+        self.state: dict[str, tuple[int, dict[str, list[int]]]] = {}
+        self.locks: dict[str, int | None] = {}
+        self.saved_at: dict[str, float] = {}
+        self.dirty: set[str] = set()
+
+    def _claim(self, iface: str) -> bool:
+        if iface not in self.locks:
+            real = transport.current().local_path(state_path(iface).parent)
+            fd = None
+            if real is not None:
+                real.mkdir(mode=0o700, parents=True, exist_ok=True)
+                fd = os.open(real / f".{iface}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    fd = None
+            self.locks[iface] = fd
+            if fd is not None:
+                self.state[iface] = load(iface)
+        return self.locks[iface] is not None
+
+    def tick(self, iface: str, live: dict, now: float | None = None) -> dict | None:
+        """
+        Account one live dump of iface and enforce; returns {"disabled", "enabled",
+        "errors"} (pubs / messages), or None when another process enforces iface.
+        """
+        try:
+            if not self._claim(iface):
+                return None
+            caps, allowed = limits(iface)
+        except OSError:
+            return None
+        now = time.time() if now is None else now
+        period, peers = self.state[iface]
+        if period != period_of(now):  # new month: everyone starts from 0 (and over-quota peers come back)
+            period = period_of(now)
+            for rec in peers.values():
+                rec[2] = 0
+            self.dirty.add(iface)
+
+        for pub in [p for p in peers if p not in caps]:
+            if peers[pub][3] & DISABLED and pub in allowed and pub in live:
+                continue  # quota removed: re-enabled below, then dropped
+            del peers[pub]
+            self.dirty.add(iface)
+
+        disable: list[tuple[str, str]] = []
+        enable: list[tuple[str, str]] = []
+        for pub, rec in peers.items():
+            if pub not in caps:
+                enable.append((pub, allowed[pub]))
+        for pub, cap in caps.items():
+            li = live.get(pub)
+            if li is None:
+                continue
+            try:
+                rx, tx = int(li["rx"]), int(li["tx"])
+            except (KeyError, ValueError):
+                continue
+            rec = peers.get(pub)
+            if rec is None:
+                peers[pub] = rec = [rx, tx, 0, 0]
+            else:
+                used = (rx - rec[0] if rx >= rec[0] else rx) + (tx - rec[1] if tx >= rec[1] else tx)
+                rec[0], rec[1], rec[2] = rx, tx, rec[2] + used
+            self.dirty.add(iface)
+            if rec[2] >= cap:
+                # also catches a syncconf/wg-quick that handed the AllowedIPs back
+                if not rec[3] & DISABLED or li.get("allowed", NO_IPS) != NO_IPS:
+                    disable.append((pub, ""))
+            elif rec[3] & DISABLED:
+                enable.append((pub, allowed.get(pub, "")))
+
+        done_off, errors = wg_set_allowed(iface, disable)
+        done_on, errs = wg_set_allowed(iface, enable)
+        errors += errs
+        for pub in done_off:
+            peers[pub][3] |= DISABLED
+        for pub in done_on:
+            if pub in caps:
+                peers[pub][3] &= ~DISABLED
+            else:
+                del peers[pub]
+        self.state[iface] = (period, peers)
+        if done_off or done_on or now - self.saved_at.get(iface, 0) >= PERSIST:
+            self.flush(iface, now)
+        return {"disabled": sorted(done_off), "enabled": sorted(done_on), "errors": errors}
+
+    def flush(self, iface: str, now: float | None = None):
+        if iface in self.dirty and iface in self.state:
+            try:
+                save(iface, *self.state[iface])
+            except OSError:
+                return
+            self.dirty.discard(iface)
+            self.saved_at[iface] = time.time() if now is None else now
+
+    def close(self):
+        for iface in list(self.state):
+            self.flush(iface)
+        for fd in self.locks.values():
+            if fd is not None:
+                os.close(fd)
+        self.locks.clear()
+        self.state.clear()
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Iterator
+
+from . import transport, wg
+
+# Shared status snapshot for readers without root: the daemon (every refresh) or
+# `wireme snapshot` (from a timer) writes one world-readable file, replaced atomically,
+# and `wireme status --snapshot` or any other reader mmaps it. Readers never touch
+# /etc/wireguard or run `wg`, and a reader holding the old file keeps a consistent copy.
+#
+# Only what a status page needs is published: interface names, ports and up/down, and
+# per peer its name, AllowedIPs, fingerprint, latest handshake and rx/tx. No keys, no
+# config paths, no client endpoints.
+#
+# Layout (little endian): HEADER, then one IFACE record per interface, one PEER record
+# per peer (grouped by interface), then a table of UTF-8 strings the peers point into.
+# Records are fixed-size, so a reader can jump to any interface or peer.
+
+SNAPSHOT_PATH = Path(os.environ.get("WIREME_SNAPSHOT", "/run/wireme/status.snap"))
+MAGIC = b"WMSNAP\x01\x00"
+HEADER = struct.Struct("<8sqIIII")  # magic, generated (epoch), interfaces, peers, strings offset, strings size
+IFACE = struct.Struct("<16sIIHB5x")  # name, first peer, peers, listen port, up
+PEER = struct.Struct("<IHHIHHqQQ4s4x")  # name off/len, iface, AllowedIPs off/len, flags, handshake, rx, tx, fingerprint
+LIVE = 1  # flags: the peer was in the kernel's dump
+
+
+def _num(text: str | None) -> int:
+    try:
+        return int(text or 0)
+    except ValueError:
+        return 0
+
+
+def build(items, now: float | None = None) -> bytes:
+    """Snapshot bytes from (iface, cfg, peers, up, live) tuples (parse_conf / live_dump shapes)."""
+    ifaces = bytearray()
+    peers = bytearray()
+    strings = bytearray()
+    n_if = n_peers = 0
+
+    def put(text: str) -> tuple[int, int]:
+        raw = text.encode("utf-8")[:65535]
+        off = len(strings)
+        strings.extend(raw)
+        return off, len(raw)
+
+    for iface, cfg, conf_peers, up, live in items:
+        first = n_peers
+        for p in conf_peers:
+            pub = p.get("PublicKey") or ""
+            li = live.get(pub)
+            n_off, n_len = put(p.get("name") or "unnamed")
+            a_off, a_len = put((p.get("AllowedIPs") or "").replace(" ", ""))
+            fp = bytes.fromhex(wg.pub_fingerprint(pub)) if pub else b"\0" * 4
+            if li is None:
+                peers += PEER.pack(n_off, n_len, n_if, a_off, a_len, 0, 0, 0, 0, fp)
+            else:
+                peers += PEER.pack(n_off, n_len, n_if, a_off, a_len, LIVE, _num(li.get("hs")), _num(li.get("rx")), _num(li.get("tx")), fp)
+            n_peers += 1
+        port = _num(cfg.get("ListenPort"))
+        ifaces += IFACE.pack(iface.encode("utf-8")[:16], first, n_peers - first, port if port < 65536 else 0, 1 if up else 0)
+        n_if += 1
+
+    str_off = HEADER.size + len(ifaces) + len(peers)
+    head = HEADER.pack(MAGIC, int(time.time() if now is None else now), n_if, n_peers, str_off, len(strings))
+    return head + bytes(ifaces) + bytes(peers) + bytes(strings)
+
+
+def collect() -> Iterator[tuple]:
+    """(iface, cfg, peers, up, live) for every config, read directly (no daemon)."""
+    for c in wg.interfaces():
+        cfg, peers, _ = wg.parse_conf(c)
+        head, live = wg.live_dump(c.stem)
+        yield c.stem, cfg, peers, head is not None, live
+
+
+def publish(items=None, path: Path | None = None) -> int:
+    """Write a snapshot of items (default: collect()) atomically, mode 0644; returns its size."""
+    path = path or SNAPSHOT_PATH
+    data = build(collect() if items is None else items)
+    t = transport.current()
+    if not t.exists(path.parent):
+        t.mkdir(path.parent)
+        t.chmod(path.parent, 0o755)
+    t.write_atomic(path, data, mode=0o644)
+    return len(data)
+
+
+class Snapshot:
+    """A published snapshot, mmapped read-only. Raises OSError (missing) or ValueError (not a snapshot)."""
+
+    def __init__(self, path: Path | None = None):
+        path = path or SNAPSHOT_PATH
+        real = transport.current().local_path(path)
+        if real is None:  # remote transport: a plain read instead of a mapping
+            self.buf = memoryview(transport.current().read_bytes(path))
+        else:
+            with open(real, "rb") as f:
+                self.buf = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        if len(self.buf) < HEADER.size:
+            raise ValueError(f"{path}: not a wireme snapshot")
+        magic, self.generated, self.n_ifaces, self.n_peers, self._str_off, str_len = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or len(self.buf) < self._str_off + str_len:
+            raise ValueError(f"{path}: not a wireme snapshot (or truncated)")
+        self._peer_off = HEADER.size + self.n_ifaces * IFACE.size
+
+    def _str(self, off: int, n: int) -> str:
+        return bytes(self.buf[self._str_off + off : self._str_off + off + n]).decode("utf-8", "replace")
+
+    def interfaces(self) -> list[dict]:
+        out = []
+        for i in range(self.n_ifaces):
+            name, first, n, port, up = IFACE.unpack_from(self.buf, HEADER.size + i * IFACE.size)
+            out.append({"iface": name.rstrip(b"\0").decode("utf-8", "replace"), "first": first, "peers": n, "port": port, "up": bool(up)})
+        return out
+
+    def peers(self, iface: str) -> Iterator[dict]:
+        """Peers of iface: name, ips, fingerprint, live, hs (epoch, 0 = never), rx, tx."""
+        for it in self.interfaces():
+            if it["iface"] != iface:
+                continue
+            for k in range(it["first"], it["first"] + it["peers"]):
+                n_off, n_len, _, a_off, a_len, flags, hs, rx, tx, fp = PEER.unpack_from(self.buf, self._peer_off + k * PEER.size)
+                yield {
+                    "name": self._str(n_off, n_len),
+                    "ips": self._str(a_off, a_len),
+                    "fingerprint": fp.hex(),
+                    "live": bool(flags & LIVE),
+                    "hs": hs,
+                    "rx": rx,
+                    "tx": tx,
+                }
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import base64
+import fcntl
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from shutil import which
+
+
+def run_local(cmd, timeout: int = 20, check: bool = False, input_text: str | None = None, env: dict | None = None):
+    try:
+        p = subprocess.run(
+            cmd,
+            text=True,
+            input=input_text,
+            capture_output=True,
+            timeout=timeout,
+            check=check,
+            env=env,
+        )
+        return p.returncode, (p.stdout or "").rstrip("\n"), (p.stderr or "").rstrip("\n")
+    except subprocess.TimeoutExpired:
+        return 124, "", "timeout"
+    except FileNotFoundError:
+        return 127, "", "not found"
+    except subprocess.CalledProcessError as e:
+        return e.returncode, (e.stdout or "").rstrip("\n"), (e.stderr or "").rstrip("\n")
+
+
+class Transport:
+    """
+    File and command I/O for one host. wg.py, ops.py, client_ops.py and util.run go
+    through current(), so the same code manages the local box, a remote hub or a sandbox.
+    """
+
+    name = "?"
+
+    def run(self, cmd, timeout: int = 20, check: bool = False, input_text: str | None = None):
+        raise NotImplementedError
+
+    def have(self, cmd: str) -> bool:
+        raise NotImplementedError
+
+    def local_path(self, path: Path) -> Path | None:
+        """Where path lives on this machine's filesystem, or None for remote hosts."""
+        return None
+
+    def read_bytes(self, path: Path) -> bytes:
+        raise NotImplementedError
+
+    def write_atomic(self, path: Path, data: bytes, mode: int | None = None):
+        raise NotImplementedError
+
+    def exists(self, path: Path) -> bool:
+        raise NotImplementedError
+
+    def glob(self, directory: Path, pattern: str) -> list[Path]:
+        raise NotImplementedError
+
+    def stat_sig(self, path: Path) -> tuple[int, int]:
+        raise NotImplementedError
+
+    def mode(self, path: Path) -> int | None:
+        raise NotImplementedError
+
+    def chmod(self, path: Path, mode: int):
+        raise NotImplementedError
+
+    def mkdir(self, path: Path):
+        raise NotImplementedError
+
+    def unlink(self, path: Path):
+        raise NotImplementedError
+
+    def rename(self, src: Path, dst: Path):
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self, path: Path):
+        yield
+
+
+class LocalTransport(Transport):
+    name = "local"
+
+    def _p(self, path: Path) -> Path:
+        return Path(path)
+
+    def run(self, cmd, timeout: int = 20, check: bool = False, input_text: str | None = None):
+        return run_local(cmd, timeout=timeout, check=check, input_text=input_text)
+
+    def have(self, cmd: str) -> bool:
+        return which(cmd) is not None
+
+    def local_path(self, path: Path) -> Path | None:
+        return self._p(path)
+
+    def read_bytes(self, path: Path) -> bytes:
+        return self._p(path).read_bytes()
+
+    def write_atomic(self, path: Path, data: bytes, mode: int | None = None):
+        real = self._p(path)
+        if mode is None:
+            mode = self.mode(path) or 0o600
+        fd, tmp = tempfile.mkstemp(dir=real.parent, prefix=f".{real.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                os.fchmod(f.fileno(), mode)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, real)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def exists(self, path: Path) -> bool:
+        return self._p(path).exists()
+
+    def glob(self, directory: Path, pattern: str) -> list[Path]:
+        real = self._p(directory)
+        if not real.is_dir():
+            return []
+        return sorted(Path(directory) / p.name for p in real.glob(pattern) if p.is_file())
+
+    def stat_sig(self, path: Path) -> tuple[int, int]:
+        try:
+            st = self._p(path).stat()
+        except FileNotFoundError:
+            return 0, 0
+        return st.st_mtime_ns, st.st_size
+
+    def mode(self, path: Path) -> int | None:
+        try:
+            return self._p(path).stat().st_mode & 0o777
+        except FileNotFoundError:
+            return None
+
+    def chmod(self, path: Path, mode: int):
+        os.chmod(self._p(path), mode)
+
+    def mkdir(self, path: Path):
+        self._p(path).mkdir(parents=True, exist_ok=True)
+
+    def unlink(self, path: Path):
+        self._p(path).unlink()
+
+    def rename(self, src: Path, dst: Path):
+        os.replace(self._p(src), self._p(dst))
+
+    @contextmanager
+    def lock(self, path: Path):
+        real = self._p(path)
+        fd = os.open(real.with_name(f".{real.name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class SandboxTransport(LocalTransport):
+    """
+    Local stand-in for tests: absolute paths live under root (e.g. root/etc/wireguard),
+    and commands run with root/bin first on PATH so fake wg/wg-quick scripts can be used.
+    """
+
+    name = "sandbox"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _p(self, path: Path) -> Path:
+        return self.root / str(path).lstrip("/")
+
+    def _env(self) -> dict:
+        env = dict(os.environ)
+        env["PATH"] = f"{self.root / 'bin'}{os.pathsep}{env.get('PATH', '')}"
+        return env
+
+    def run(self, cmd, timeout: int = 20, check: bool = False, input_text: str | None = None):
+        return run_local(cmd, timeout=timeout, check=check, input_text=input_text, env=self._env())
+
+    def have(self, cmd: str) -> bool:
+        return which(cmd, path=self._env()["PATH"]) is not None
+
+
+class CommandTransport(Transport):
+    """
+    Runs everything behind a command prefix, e.g. ["ssh", "-o", "BatchMode=yes", "hub1"]
+    or ["docker", "exec", "wg"]. With remote_shell (ssh) the command is sent as one
+    quoted string, otherwise it is appended as argv.
+
+    lock() holds flock(1) on the same hidden .<name>.lock file LocalTransport uses, in
+    one remote process kept open for the duration, so remote and local edits of a
+    config exclude each other. stat_sig has nanosecond mtimes where stat supports them.
+    """
+
+    def __init__(self, prefix: list[str], remote_shell: bool = False, name: str | None = None):
+        self.prefix = list(prefix)
+        self.remote_shell = remote_shell
+        self.name = name or " ".join(prefix)
+
+    def _argv(self, cmd) -> list[str]:
+        if self.remote_shell:
+            return self.prefix + [shlex.join(cmd)]
+        return self.prefix + list(cmd)
+
+    def run(self, cmd, timeout: int = 20, check: bool = False, input_text: str | None = None):
+        return run_local(self._argv(cmd), timeout=timeout, check=check, input_text=input_text)
+
+    def _sh(self, script: str, *args: str, input_text: str | None = None, timeout: int = 20):
+        return self.run(["sh", "-c", script, "sh", *args], timeout=timeout, input_text=input_text)
+
+    def have(self, cmd: str) -> bool:
+        rc, _, _ = self._sh('command -v "$1" >/dev/null 2>&1', cmd)
+        return rc == 0
+
+    def read_bytes(self, path: Path) -> bytes:
+        rc, out, err = self._sh('base64 < "$1"', str(path), timeout=60)
+        if rc != 0:
+            raise FileNotFoundError(f"{self.name}:{path}: {err}")
+        return base64.b64decode(out)
+
+    def write_atomic(self, path: Path, data: bytes, mode: int | None = None):
+        if mode is None:
+            mode = self.mode(path) or 0o600
+        script = 'set -e; t="$1.wireme-tmp.$$"; umask 077; base64 -d > "$t"; chmod "$2" "$t"; mv -f "$t" "$1"'
+        rc, _, err = self._sh(script, str(path), f"{mode:o}", input_text=base64.b64encode(data).decode("ascii"), timeout=60)
+        if rc != 0:
+            raise OSError(f"{self.name}:{path}: {err}")
+
+    def exists(self, path: Path) -> bool:
+        rc, _, _ = self._sh('test -e "$1"', str(path))
+        return rc == 0
+
+    def glob(self, directory: Path, pattern: str) -> list[Path]:
+        rc, out, _ = self._sh('cd "$1" 2>/dev/null || exit 0; for f in $2; do [ -f "$f" ] && echo "$f"; done', str(directory), pattern)
+        if rc != 0:
+            return []
+        return sorted(Path(directory) / ln for ln in out.splitlines() if ln)
+
+    def stat_sig(self, path: Path) -> tuple[int, int]:
+        # whole seconds would let two same-size writes (a key rotation) within a second pass the check
+        rc, out, _ = self._sh('stat -c "%.9Y %s" "$1" 2>/dev/null || stat -c "%Y %s" "$1"', str(path))
+        if rc != 0 or not out:
+            return 0, 0
+        mtime, size = out.split()
+        sec, _, frac = mtime.partition(".")
+        return int(sec) * 1_000_000_000 + int(frac.ljust(9, "0")[:9] or 0), int(size)
+
+    def mode(self, path: Path) -> int | None:
+        rc, out, _ = self._sh('stat -c "%a" "$1"', str(path))
+        return int(out, 8) if rc == 0 and out else None
+
+    def chmod(self, path: Path, mode: int):
+        self._sh('chmod "$2" "$1"', str(path), f"{mode:o}")
+
+    def mkdir(self, path: Path):
+        rc, _, err = self._sh('mkdir -p "$1"', str(path))
+        if rc != 0:
+            raise OSError(f"{self.name}:{path}: {err}")
+
+    def unlink(self, path: Path):
+        rc, _, err = self._sh('rm -f "$1"', str(path))
+        if rc != 0:
+            raise OSError(f"{self.name}:{path}: {err}")
+
+    def rename(self, src: Path, dst: Path):
+        rc, _, err = self._sh('mv -f "$1" "$2"', str(src), str(dst))
+        if rc != 0:
+            raise OSError(f"{self.name}:{src}: {err}")
+
+    @contextmanager
+    def lock(self, path: Path):
+        lock_path = Path(path).with_name(f".{Path(path).name}.lock")
+        # the remote flock lives as long as this process: closing its stdin (or losing the connection) releases it
+        script = 'umask 077; exec flock -x "$1" sh -c "echo locked; exec cat >/dev/null"'
+        proc = subprocess.Popen(
+            self._argv(["sh", "-c", script, "sh", str(lock_path)]),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            if proc.stdout.readline().strip() != "locked":
+                proc.stdin.close()
+                err = proc.stderr.read().strip()
+                proc.wait()
+                raise OSError(f"{self.name}:{lock_path}: cannot lock: {err or 'exit ' + str(proc.returncode)}")
+            yield
+        finally:
+            if proc.poll() is None:
+                proc.stdin.close()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+            proc.stdout.close()
+            proc.stderr.close()
+
+
+def from_spec(spec: str) -> Transport:
+    """
+    "local" -> this host; "sandbox:/some/dir" -> SandboxTransport; "hub1" or
+    "admin@hub1" -> ssh; anything with spaces is taken as a full command prefix
+    (e.g. "ssh -p 2222 hub1 sudo -n").
+    """
+    spec = spec.strip()
+    if spec in ("", "local", "localhost"):
+        return LocalTransport()
+    if spec.startswith("sandbox:"):
+        return SandboxTransport(Path(spec[len("sandbox:") :]))
+    if " " in spec:
+        prefix = shlex.split(spec)
+    else:
+        prefix = ["ssh", "-o", "BatchMode=yes", spec]
+    return CommandTransport(prefix, remote_shell=os.path.basename(prefix[0]) == "ssh", name=spec)
+
+
+_LOCAL = LocalTransport()
+_tls = threading.local()
+
+
+def current() -> Transport:
+    return getattr(_tls, "transport", None) or _LOCAL
+
+
+@contextmanager
+def using(t: Transport):
+    """Route this thread's wireme I/O through t (threads in a fan-out each get their own host)."""
+    prev = getattr(_tls, "transport", None)
+    _tls.transport = t
+    try:
+        yield t
+    finally:
+        _tls.transport = prev
@@ -1,11 +1,10 @@
 from __future__ import annotations
 
 import curses
-import time
 from pathlib import Path
 
-from . import qr, util, wg
-from .ui import confirm_typed, draw_box, init_curses, menu, msg_any_key, prompt, draw_header
+from . import daemon, jobs, ops, ui, util, watch, wg
+from .ui import KEY_CHANGED, confirm_typed, draw_box, getch, init_curses, menu, msg_any_key, prompt, draw_header, wait_job
 
 APP_NAME = "wireme"
 
@@ -15,11 +14,14 @@ APP_NAME = "wireme"
 
 def iface_overview_screen(stdscr, conf_path: Path):
     iface = conf_path.stem
-    cfg, peers, _ = wg.parse_conf(conf_path)
-    _, live = wg.live_dump(iface) or (None, {})
-    net_str, server_ip = wg.iface_network_and_ip(cfg.get("Address") or "")
+    stale = True
 
     while True:
+        if stale:
+            ov = daemon.call_or(ops.overview, "overview", iface=iface)
+            cfg, peers, live = ov["cfg"], ov["peers"], ov["live"] or {}
+            net_str, server_ip = wg.iface_network_and_ip(cfg.get("Address") or "")
+            stale = False
         stdscr.erase()
         draw_header(stdscr, APP_NAME, f"{iface} • Overview")
         h, w_ = stdscr.getmaxyx()
@@ -76,34 +78,48 @@ def iface_overview_screen(stdscr, conf_path: Path):
         stdscr.attroff(curses.A_DIM)
         stdscr.refresh()
 
-        k = stdscr.getch()
+        k = getch(stdscr, changes=True)
+        if k == KEY_CHANGED:
+            stale = True
         if k in (ord("q"), 27, curses.KEY_BACKSPACE, 127):
             return
 
 
 def wg_show_qr_saved(stdscr, iface: str):
     base = wg.CLIENTS_DIR / iface
-    if not base.exists():
-        msg_any_key(stdscr, APP_NAME, "QR", f"No saved client configs at:\n{base}")
-        return
-    confs = sorted(base.glob("*.conf"))
-    if not confs:
-        msg_any_key(stdscr, APP_NAME, "QR", f"No *.conf in:\n{base}")
-        return
-    act, idx = menu(stdscr, APP_NAME, f"{iface}", [c.name for c in confs] + ["Back"], subtitle="Show QR (saved configs)")
+    idx = 0
+    while True:
+        confs = [Path(c) for c in daemon.call_or(ops.saved_client_confs, "saved", iface=iface)]
+        if not confs:
+            msg_any_key(stdscr, APP_NAME, "QR", f"No saved client configs (*.conf) at:\n{base}")
+            return
+        act, idx = menu(stdscr, APP_NAME, f"{iface}", [c.name for c in confs] + ["Back"], subtitle="Show QR (saved configs)", idx=idx, changes=True)
+        if act != "changed":
+            break
     if act != "open" or idx == len(confs):
         return
     target = confs[idx]
-    rc, out, err = qr.qr_from_text(util.read_text(target))
+    job = jobs.submit(f"qr {iface}/{target.stem}", daemon.call_or, ops.qr_saved, "qr_saved", path=str(target))
+    show_qr_job(stdscr, f"QR • {iface}/{target.stem}", job)
+
+
+def show_qr_job(stdscr, title: str, job):
+    if wait_job(stdscr, APP_NAME, title, job) is None:
+        msg_any_key(stdscr, APP_NAME, "QR", "Still rendering in the background.\nPress J in any menu to open it when done.")
+        return
+    rc, out, err = job.result if job.result else (1, "", job.text)
     if rc != 0 or not out:
         msg_any_key(stdscr, APP_NAME, "QR", f"QR failed:\n{err or out}")
         return
-    msg_any_key(stdscr, APP_NAME, f"QR • {iface}/{target.stem}", out)
+    msg_any_key(stdscr, APP_NAME, title, out, nowrap=True)
+
+
+def apply_in_background(iface: str):
+    return jobs.submit(f"apply {iface}", daemon.call_or, ops.apply, "apply", iface=iface)
 
 
 def wg_add_peer(stdscr, conf_path: Path):
     iface = conf_path.stem
-    cfg, peers, raw_lines = wg.parse_conf(conf_path)
 
     smart = prompt(stdscr, "Is this for a smartphone? (y/N):", default="n").lower().startswith("y")
     profile = "smartphone" if smart else "desktop"
@@ -114,7 +130,8 @@ def wg_add_peer(stdscr, conf_path: Path):
         msg_any_key(stdscr, APP_NAME, "Add peer", "Cancelled (invalid name).")
         return
 
-    suggested_ip = wg.next_free_client_ip(cfg.get("Address") or "", peers) or ""
+    defaults = daemon.call_or(ops.add_defaults, "add_defaults", iface=iface, smart=smart)
+    suggested_ip = defaults["client_ip"]
     client_ip = prompt(
         stdscr,
         f"Client VPN IP (suggested {suggested_ip or '10.0.0.2/32'}):",
@@ -123,116 +140,52 @@ def wg_add_peer(stdscr, conf_path: Path):
     if not client_ip:
         msg_any_key(stdscr, APP_NAME, "Add peer", "Cancelled (no IP).")
         return
-    if "/" not in client_ip:
-        client_ip = client_ip + "/32"
 
-    rc, priv, err = util.run(["wg", "genkey"])
-    if rc != 0 or not priv:
-        msg_any_key(stdscr, APP_NAME, "Add peer", f"wg genkey failed:\n{err}")
-        return
-    pub = wg.pubkey_from_priv(priv)
-    if not pub:
-        msg_any_key(stdscr, APP_NAME, "Add peer", "Failed to derive public key.")
-        return
-    rc, psk, _ = util.run(["wg", "genpsk"])
-    psk = psk.strip() if rc == 0 else ""
-
-    s_priv = cfg.get("PrivateKey")
-    if not s_priv:
-        msg_any_key(stdscr, APP_NAME, "Add peer", "Interface PrivateKey not found in config.")
-        return
-    s_pub = wg.pubkey_from_priv(s_priv)
-    if not s_pub:
-        msg_any_key(stdscr, APP_NAME, "Add peer", "Failed to derive server public key.")
-        return
-
-    listen_port = (cfg.get("ListenPort") or "51820").strip()
-    pub_ip = wg.guess_public_ipv4()
-    default_ep = f"{pub_ip}:{listen_port}" if pub_ip else f":{listen_port}"
+    default_ep = defaults["endpoint"]
     endpoint = prompt(stdscr, f"Endpoint host:port (default {default_ep}):", default=default_ep).strip()
 
-    net_str, server_vpn_ip = wg.iface_network_and_ip(cfg.get("Address") or "")
-    if smart:
-        route_default = f"{net_str or '10.0.0.0/24'}, {pub_ip + '/32' if pub_ip else 'PUBLIC_IP/32'}"
-        dns_default = "1.1.1.1"
-    else:
-        route_default = f"{server_vpn_ip}/32" if server_vpn_ip else ""
-        dns_default = ""
-
+    route_default = defaults["route"]
+    dns_default = defaults["dns"]
     route = prompt(stdscr, f"Client AllowedIPs (default {route_default}):", default=route_default).strip()
     dns = prompt(stdscr, f"Client DNS (default {dns_default or '(empty)'}):", default=dns_default).strip()
     note = prompt(stdscr, "Note (optional):", default="").strip()
 
-    backup = wg.backup(conf_path)
-    created = util.now_utc_iso()
-
-    block: list[str] = []
-    block.append("\n")
-    block.append(f"# wireme-name: {name}\n")
-    block.append(f"# wireme-created: {created}\n")
-    block.append(f"# wireme-profile: {profile}\n")
-    if note:
-        block.append(f"# wireme-note: {note}\n")
-    block.append("[Peer]\n")
-    block.append(f"PublicKey = {pub}\n")
-    if psk:
-        block.append(f"PresharedKey = {psk}\n")
-    block.append(f"AllowedIPs = {client_ip}\n")
-
-    conf_path.write_text("".join(raw_lines) + "".join(block))
-
-    client_config: list[str] = []
-    client_config.append(f"# name: {name}\n")
-    client_config.append(f"# created: {created}\n")
-    client_config.append(f"# profile: {profile}\n")
-    client_config.append("[Interface]\n")
-    client_config.append(f"PrivateKey = {priv.strip()}\n")
-    client_config.append(f"Address = {client_ip}\n")
-    if dns:
-        client_config.append(f"DNS = {dns}\n")
-    client_config.append("\n[Peer]\n")
-    client_config.append(f"PublicKey = {s_pub}\n")
-    if psk:
-        client_config.append(f"PresharedKey = {psk}\n")
-    client_config.append(f"Endpoint = {endpoint}\n")
-    if route:
-        client_config.append(f"AllowedIPs = {route}\n")
-    client_config.append("PersistentKeepalive = 25\n")
-    client_text = "".join(client_config)
+    ok, msg, info = daemon.call_or(
+        ops.add_peer,
+        "add",
+        iface=iface,
+        name=name,
+        client_ip=client_ip,
+        endpoint=endpoint,
+        route=route,
+        dns=dns,
+        profile=profile,
+        note=note,
+    )
+    if not ok:
+        msg_any_key(stdscr, APP_NAME, "Add peer", msg)
+        return
+    backup = info["backup"]
+    pub = info["pub"]
+    client_text = info["client_text"]
 
     apply_now = prompt(stdscr, "Apply now (wg syncconf)? (y/N):", default="n").lower().startswith("y")
     if apply_now:
-        rc, _, aerr = wg.apply_now(iface)
-        if rc != 0:
-            msg_any_key(
-                stdscr,
-                APP_NAME,
-                "Add peer",
-                f"Saved, but apply failed.\n\nBackup: {backup}\n\nError:\n{aerr}",
-            )
-        else:
-            msg_any_key(stdscr, APP_NAME, "Add peer", f"Saved + applied.\n\nBackup: {backup}")
+        apply_in_background(iface)
+        msg_any_key(stdscr, APP_NAME, "Add peer", f"Saved; applying in the background (result shows in the header).\n\nBackup: {backup}")
     else:
         msg_any_key(stdscr, APP_NAME, "Add peer", f"Saved (not applied).\n\nBackup: {backup}")
 
     show_qr = prompt(stdscr, "Show QR now? (y/N):", default="n").lower().startswith("y")
     if show_qr:
-        rc, out, qerr = qr.qr_from_text(client_text)
-        if rc == 0 and out:
-            msg_any_key(stdscr, APP_NAME, f"QR • {iface}/{name}", out)
-        else:
-            msg_any_key(stdscr, APP_NAME, "QR", f"QR failed:\n{qerr or out}")
+        job = jobs.submit(f"qr {iface}/{name}", daemon.call_or, ops.qr_text, "qr_text", text=client_text)
+        show_qr_job(stdscr, f"QR • {iface}/{name}", job)
 
     save = prompt(stdscr, "Save client config on disk? (y/N):", default="n").lower().startswith("y")
     if save:
-        client_dir = wg.CLIENTS_DIR / iface
-        client_dir.mkdir(parents=True, exist_ok=True)
-        fp = wg.pub_fingerprint(pub)
-        client_conf = client_dir / f"{name}--{fp}.conf"
-        if client_conf.exists():
-            client_conf = client_dir / f"{name}--{fp}--{int(time.time())}.conf"
-        client_conf.write_text(client_text)
-        client_conf.chmod(0o600)
+        client_conf = daemon.call_or(
+            ops.save_client_conf, "save_client", iface=iface, name=info["name"], pub=pub, client_text=client_text
+        )
         msg_any_key(stdscr, APP_NAME, "Saved client config", f"Saved:\n{client_conf}")
     else:
         msg_any_key(stdscr, APP_NAME, "Client config not saved", "Not saved on disk.\n(You can re-run add and choose to save next time.)")
@@ -240,7 +193,7 @@ def wg_add_peer(stdscr, conf_path: Path):
 
 def wg_delete_peer(stdscr, conf_path: Path):
     iface = conf_path.stem
-    _, peers, raw_lines = wg.parse_conf(conf_path)
+    peers = daemon.call_or(ops.overview, "overview", iface=iface)["peers"]
     if not peers:
         msg_any_key(stdscr, APP_NAME, "Delete peer", "No peers in config.")
         return
@@ -263,27 +216,11 @@ def wg_delete_peer(stdscr, conf_path: Path):
     name = peer.get("name") or "(unnamed)"
     pub = peer.get("PublicKey") or ""
     aips = peer.get("AllowedIPs") or "-"
-    start = peer["start"]
-    end = peer["end"]
-
-    remove_start = start
-    i = start - 1
-    while i >= 0:
-        ln = raw_lines[i].strip()
-        if ln.startswith(f"# {wg.META_PREFIX}") or ln == "":
-            remove_start = i
-            i -= 1
-            continue
-        break
-
-    # find matching saved client configs by pubkey derived from PrivateKey in file
-    matches: list[Path] = []
-    base = wg.CLIENTS_DIR / iface
-    if base.exists():
-        for f in sorted(base.glob("*.conf")):
-            cpub = wg.client_pubkey_from_file(f)
-            if cpub and pub and cpub == pub:
-                matches.append(f)
+    if not pub:
+        msg_any_key(stdscr, APP_NAME, "Delete peer", "Peer has no PublicKey; edit the config by hand.")
+        return
+
+    matches = daemon.call_or(ops.matching_client_confs, "matches", iface=iface, pub=pub)
 
     extra = ""
     if matches:
@@ -301,32 +238,19 @@ def wg_delete_peer(stdscr, conf_path: Path):
         msg_any_key(stdscr, APP_NAME, "Delete peer", "Cancelled.")
         return
 
-    backup = wg.backup(conf_path)
-    new_lines = raw_lines[:remove_start] + raw_lines[end:]
-    conf_path.write_text("".join(new_lines))
-
-    deleted_files: list[str] = []
-    delete_errors: list[str] = []
-    for m in matches:
-        try:
-            m.unlink()
-            deleted_files.append(str(m))
-        except Exception as e:
-            delete_errors.append(f"{m}: {e}")
+    ok, msg, info = daemon.call_or(ops.delete_peer, "delete", iface=iface, pub=pub, matches=matches)
+    if not ok:
+        msg_any_key(stdscr, APP_NAME, "Delete peer", msg)
+        return
+    backup = info["backup"]
+    deleted_files = info["deleted"]
+    delete_errors = info["errors"]
 
     apply_now = prompt(stdscr, "Apply now (wg syncconf)? (y/N):", default="n").lower().startswith("y")
-    if apply_now:
-        rc, _, aerr = wg.apply_now(iface)
-        if rc != 0:
-            msg_any_key(
-                stdscr,
-                APP_NAME,
-                "Delete peer",
-                f"Removed from config, but apply failed.\n\nBackup: {backup}\n\nError:\n{aerr}",
-            )
-            return
-
     msg = f"Removed peer.\n\nBackup: {backup}"
+    if apply_now:
+        apply_in_background(iface)
+        msg += "\n\nApplying in the background (result shows in the header)."
     if deleted_files:
         msg += "\n\nDeleted matching client config(s):\n" + "\n".join(deleted_files)
     if delete_errors:
@@ -341,21 +265,26 @@ def _main(stdscr):
         msg_any_key(stdscr, APP_NAME, "WireGuard", "wg not installed.")
         return
 
+    ui.WATCH = watch.open_watcher()
+    ui.ON_CHANGE = ops.forget
+
     confs = wg.interfaces()
     if not confs:
         msg_any_key(stdscr, APP_NAME, "WireGuard", "No /etc/wireguard/*.conf found.")
         return
 
+    sel = 0
     while True:
+        confs = wg.interfaces()
         items: list[str] = []
+        status = {st["iface"]: st["up"] for st in daemon.call_or(ops.status, "status")}
         for c in confs:
             iface = c.stem
-            _, live = wg.live_dump(iface) or (None, {})
-            status = "up" if live is not None else "down"
-            items.append(f"{iface}  •  {status}  •  {c}")
+            items.append(f"{iface}  •  {'up' if status.get(iface) else 'down'}  •  {c}")
         items.append("Quit")
 
-        act, idx = menu(stdscr, APP_NAME, "WireGuard", items, subtitle=("root" if util.is_root() else "not root"))
+        act, idx = menu(stdscr, APP_NAME, "WireGuard", items, subtitle=("root" if util.is_root() else "not root"), idx=sel, changes=True)
+        sel = idx or 0
         if act in ("quit",):
             return
         if act == "open":
@@ -370,6 +299,7 @@ def _main(stdscr):
                     "Add peer (QR + optional save)",
                     "Show QR (saved configs)",
                     "Delete peer (typed confirmation + deletes matching saved config)",
+                    "Apply config now (wg syncconf, in background)",
                     "Back",
                 ]
                 act2, j = menu(stdscr, APP_NAME, iface, choices, subtitle="Actions")
@@ -393,6 +323,11 @@ def _main(stdscr):
                         else:
                             wg_delete_peer(stdscr, conf_path)
                     elif j == 4:
+                        if not util.is_root():
+                            msg_any_key(stdscr, APP_NAME, "Apply", "Run as root for apply.")
+                        else:
+                            apply_in_background(iface)
+                    elif j == 5:
                         break
 
 
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
 import curses
+import select
+import sys
 import textwrap
 
-HELP = "↑↓ move  •  Enter select  •  Esc/Backspace back  •  q quit"
+from . import jobs, watch
+
+HELP = "↑↓ move  •  Enter select  •  Esc/Backspace back  •  J jobs  •  q quit"
 
 
 def init_curses(stdscr):
@@ -26,27 +30,79 @@ def draw_header(stdscr, app_name: str, title: str):
     stdscr.addnstr(0, 0, f" {app_name}  •  {title}", w - 1)
     stdscr.attroff(curses.color_pair(1) | curses.A_BOLD)
 
-    stdscr.attron(curses.A_DIM)
+    running = jobs.RUNNER.running()
+    if running:
+        labels = ", ".join(j.label for j in running[:3]) + (" …" if len(running) > 3 else "")
+        tag = f" {jobs.spinner()} {len(running)} job{'s' if len(running) > 1 else ''}: {labels} "
+        x = max(0, w - 1 - len(tag))
+        stdscr.attron(curses.color_pair(3))
+        stdscr.addnstr(0, x, tag, w - 1 - x)
+        stdscr.attroff(curses.color_pair(3))
+
     stdscr.addnstr(1, 0, " " * (w - 1), w - 1)
-    stdscr.addnstr(1, 2, HELP, w - 4)
-    stdscr.attroff(curses.A_DIM)
+    notice = jobs.RUNNER.notice()
+    if notice is not None:
+        first = (notice.text.splitlines() or [""])[0]
+        mark = "✓" if notice.ok else "✗"
+        attr = curses.color_pair(2) if notice.ok else curses.color_pair(4)
+        stdscr.attron(attr | curses.A_BOLD)
+        stdscr.addnstr(1, 2, f"{mark} {notice.label}: {first}  (J for details)", w - 4)
+        stdscr.attroff(attr | curses.A_BOLD)
+    else:
+        stdscr.attron(curses.A_DIM)
+        stdscr.addnstr(1, 2, HELP, w - 4)
+        stdscr.attroff(curses.A_DIM)
+
+
+KEY_CHANGED = curses.KEY_MAX + 1  # a watched config/client file changed (see getch)
+WATCH: watch.Watcher | None = None  # set by the TUI when inotify is available
+ON_CHANGE = None  # called with watch.changes() output before any screen hears of it
+RESIZE_CHECK = 0.5  # with a watcher we sit in select(); wake now and then to notice SIGWINCH
+
+
+def getch(stdscr, changes: bool = False, timeout: float | None = None) -> int:
+    """
+    getch that wakes up periodically while jobs run, so spinners and notices stay live.
+    With a watcher it also wakes when a config or client file changes: ON_CHANGE drops
+    the caches, and callers that pass changes=True get KEY_CHANGED to redraw with.
+    With timeout (seconds) it returns -1 at least that often (screens on a timer).
+    """
+    wait = 0.15 if jobs.RUNNER.active() else None
+    if timeout is not None:
+        wait = timeout if wait is None else min(wait, timeout)
+    if WATCH is None:
+        stdscr.timeout(-1 if wait is None else int(wait * 1000))
+        return stdscr.getch()
+    stdscr.timeout(0)
+    k = stdscr.getch()  # input (or a resize) curses already has
+    while k == -1:
+        r, _, _ = select.select([sys.stdin, WATCH], [], [], wait or RESIZE_CHECK)
+        if WATCH in r:
+            ch = watch.changes(WATCH)
+            if ch and ON_CHANGE is not None:
+                ON_CHANGE(ch)
+            if ch and changes:
+                return KEY_CHANGED
+        stdscr.timeout(50 if sys.stdin in r else 0)
+        k = stdscr.getch()
+        if k == -1 and wait is not None and not r:
+            return -1
+    return k
 
 
 def draw_box(stdscr, y: int, x: int, h: int, w: int, title: str | None = None):
     if h < 3 or w < 4:
         return
-    stdscr.attron(curses.A_DIM)
-    stdscr.addch(y, x, "┌")
-    stdscr.addch(y, x + w - 1, "┐")
-    stdscr.addch(y + h - 1, x, "└")
-    stdscr.addch(y + h - 1, x + w - 1, "┘")
-    for i in range(1, w - 1):
-        stdscr.addch(y, x + i, "─")
-        stdscr.addch(y + h - 1, x + i, "─")
+    attr = curses.A_DIM
+    stdscr.addch(y, x, "┌", attr)
+    stdscr.addch(y, x + w - 1, "┐", attr)
+    stdscr.addch(y + h - 1, x, "└", attr)
+    stdscr.addch(y + h - 1, x + w - 1, "┘", attr)
+    stdscr.addstr(y, x + 1, "─" * (w - 2), attr)
+    stdscr.addstr(y + h - 1, x + 1, "─" * (w - 2), attr)
     for j in range(1, h - 1):
-        stdscr.addch(y + j, x, "│")
-        stdscr.addch(y + j, x + w - 1, "│")
-    stdscr.attroff(curses.A_DIM)
+        stdscr.addch(y + j, x, "│", attr)
+        stdscr.addch(y + j, x + w - 1, "│", attr)
 
     if title:
         t = f" {title} "
@@ -55,45 +111,265 @@ def draw_box(stdscr, y: int, x: int, h: int, w: int, title: str | None = None):
         stdscr.attroff(curses.color_pair(1) | curses.A_BOLD)
 
 
+class Frame:
+    """
+    Persistent windows for one terminal size: header (rows 0-1), body (rows 2..h-2,
+    holding the box) and footer (last row). Screens paint a frame once, then redraw
+    only the cells that changed and push them with a single doupdate(), so a keypress
+    costs a few rows on the wire instead of a full repaint.
+    """
+
+    def __init__(self, h: int, w: int):
+        self.h, self.w = h, w
+        self.head = curses.newwin(2, w, 0, 0)
+        self.body = curses.newwin(max(1, h - 3), w, 2, 0)
+        self.foot = curses.newwin(1, w, h - 1, 0)
+        self.foot.keypad(True)
+
+    def paint(self, app_name: str, title: str, box_title: str, footer: str, box_h: int | None = None):
+        self.header(app_name, title)
+        self.body.erase()
+        draw_box(self.body, 0, 2, box_h or self.h - 4, self.w - 4, title=box_title)
+        self.footer(footer)
+
+    def header(self, app_name: str, title: str):
+        self.head.erase()
+        draw_header(self.head, app_name, title)
+
+    def footer(self, text: str):
+        self.foot.erase()
+        self.foot.addnstr(0, 2, text, max(0, self.w - 4), curses.A_DIM)
+
+    def row(self, y: int, text: str, attr: int = 0):
+        """Rewrite one line inside the box (body coordinates), leaving the border alone."""
+        width = max(0, self.w - 10)
+        self.body.addnstr(y, 4, " " * width, width)
+        self.body.addnstr(y, 4, text, width, attr)
+
+    def flush(self):
+        for win in (self.head, self.body, self.foot):
+            win.noutrefresh()
+        curses.doupdate()
+
+    def getch(self, changes: bool = False, timeout: float | None = None) -> int:
+        return getch(self.foot, changes, timeout)
+
+
+_FRAME: Frame | None = None
+
+
+def frame(stdscr) -> Frame:
+    """The shared Frame for the current terminal size (rebuilt after a resize)."""
+    global _FRAME
+    h, w = stdscr.getmaxyx()
+    if _FRAME is None or (_FRAME.h, _FRAME.w) != (h, w):
+        _FRAME = Frame(h, w)
+    return _FRAME
+
+
+def wrap_line(ln: str, width: int) -> list[str]:
+    if not ln:
+        return [""]
+    return (
+        textwrap.wrap(
+            ln,
+            width=width,
+            replace_whitespace=False,
+            drop_whitespace=False,
+        )
+        or [""]
+    )
+
+
 def wrap(text: str, width: int) -> list[str]:
     out: list[str] = []
     for ln in text.splitlines():
-        if not ln:
-            out.append("")
-            continue
-        out.extend(
-            textwrap.wrap(
-                ln,
-                width=width,
-                replace_whitespace=False,
-                drop_whitespace=False,
-            )
-            or [""]
-        )
+        out.extend(wrap_line(ln, width))
     return out
 
 
-def msg_any_key(stdscr, app_name: str, title: str, text: str):
+class Pager:
+    """
+    Scrollable view of a long text. Lines are wrapped lazily, only once they scroll
+    into view, and cached per width, so tens of thousands of lines open instantly.
+    The position is (line, wrapped row within it), which survives a resize.
+    """
+
+    def __init__(self, text: str, nowrap: bool = False):
+        self.lines = text.splitlines() or [""]
+        self.nowrap = nowrap
+        self.top = (0, 0)
+        self.xoff = 0
+        self.query = ""
+        self._cache: dict[int, dict[int, list[str]]] = {}
+        self._width: int | None = None
+
+    def rows(self, i: int, width: int) -> list[str]:
+        if self.nowrap:
+            return [self.lines[i].expandtabs()[self.xoff : self.xoff + width]]
+        cache = self._cache.setdefault(width, {})
+        rows = cache.get(i)
+        if rows is None:
+            rows = cache[i] = wrap_line(self.lines[i], width)
+        return rows
+
+    def _next(self, pos: tuple[int, int], width: int) -> tuple[int, int] | None:
+        i, sub = pos
+        if sub + 1 < len(self.rows(i, width)):
+            return i, sub + 1
+        return (i + 1, 0) if i + 1 < len(self.lines) else None
+
+    def _prev(self, pos: tuple[int, int], width: int) -> tuple[int, int] | None:
+        i, sub = pos
+        if sub > 0:
+            return i, sub - 1
+        return (i - 1, len(self.rows(i - 1, width)) - 1) if i > 0 else None
+
+    def visible(self, width: int, height: int) -> list[tuple[int, str]]:
+        i, sub = self.top
+        sub = min(sub, len(self.rows(i, width)) - 1)
+        self.top = (i, sub)
+        out: list[tuple[int, str]] = []
+        while i < len(self.lines) and len(out) < height:
+            out += [(i, r) for r in self.rows(i, width)[sub : sub + height - len(out)]]
+            i, sub = i + 1, 0
+        return out
+
+    def fits(self, width: int, height: int) -> bool:
+        if self.nowrap and self.xoff == 0 and self.widest() > width:
+            return False
+        return self.top == (0, 0) and self.xoff == 0 and len(self.visible(width, height + 1)) <= height
+
+    def widest(self) -> int:
+        if self._width is None:
+            self._width = max(len(ln.expandtabs()) for ln in self.lines)
+        return self._width
+
+    def down(self, width: int, height: int, n: int = 1):
+        bottom = self.top
+        for _ in range(height - 1):
+            nxt = self._next(bottom, width)
+            if nxt is None:
+                return
+            bottom = nxt
+        for _ in range(n):
+            nb = self._next(bottom, width)
+            if nb is None:
+                return
+            bottom = nb
+            self.top = self._next(self.top, width) or self.top
+
+    def up(self, width: int, n: int = 1):
+        for _ in range(n):
+            prev = self._prev(self.top, width)
+            if prev is None:
+                return
+            self.top = prev
+
+    def home(self):
+        self.top = (0, 0)
+
+    def end(self, width: int, height: int):
+        last = len(self.lines) - 1
+        self.top = (last, len(self.rows(last, width)) - 1)
+        self.up(width, height - 1)
+
+    def find(self, query: str, forward: bool = True) -> bool:
+        """Jump to the next (or previous) line containing query, wrapping around."""
+        self.query = query
+        q = query.lower()
+        n = len(self.lines)
+        step = 1 if forward else -1
+        for k in range(1, n + 1):
+            i = (self.top[0] + step * k) % n
+            if q in self.lines[i].lower():
+                self.top = (i, 0)
+                return True
+        return False
+
+
+PAGER_HELP = "↑↓←→ PgUp/PgDn Home/End scroll  •  / search  n/N next/prev  •  Enter/Esc close"
+
+
+def msg_any_key(stdscr, app_name: str, title: str, text: str, nowrap: bool = False):
+    """
+    Show text in the message box. Short texts close on any key; longer ones become a
+    scrollable, searchable pager (nowrap keeps lines intact, e.g. QR codes, with ←→).
+    """
+    pg = Pager(text, nowrap=nowrap)
+    painted = None
+    shown = None
+    note = ""
     while True:
-        stdscr.erase()
-        draw_header(stdscr, app_name, title)
-        h, w = stdscr.getmaxyx()
-        box_h = h - 4
-        box_w = w - 4
-        draw_box(stdscr, 2, 2, box_h, box_w, title="Message")
-        lines = wrap(text, max(20, box_w - 4))
-        max_body = box_h - 4
-        for i in range(min(max_body, len(lines))):
-            stdscr.addnstr(3 + i, 4, lines[i], box_w - 6)
-        stdscr.attron(curses.A_DIM)
-        stdscr.addnstr(h - 1, 2, "Press any key to continue", w - 4)
-        stdscr.attroff(curses.A_DIM)
-        stdscr.refresh()
-        stdscr.getch()
-        return
+        fr = frame(stdscr)
+        width, height = max(1, fr.w - 10), max(1, fr.h - 6)
+        paging = not pg.fits(width, height)
+        if painted is not fr:
+            fr.paint(app_name, title, "Message", "")
+            painted, shown = fr, None
+        else:
+            fr.header(app_name, title)
+
+        state = (pg.top, pg.xoff, pg.query, note, width, height)
+        if state != shown:
+            rows = pg.visible(width, height)
+            q = pg.query.lower()
+
+            def draw(y: int):
+                ln = rows[y][1] if y < len(rows) else ""
+                fr.row(1 + y, ln)
+                start = ln.lower().find(q) if q else -1
+                while start >= 0:
+                    fr.body.addnstr(1 + y, 4 + start, ln[start : start + len(q)], max(0, width - start), curses.A_REVERSE)
+                    start = ln.lower().find(q, start + len(q))
+
+            for y in range(height):
+                draw(y)
+            shown = state
+            if paging:
+                last = rows[-1][0] + 1 if rows else 0
+                pos = f"lines {pg.top[0] + 1}-{last} of {len(pg.lines)}"
+                fr.footer(f"{pos}  •  {note or PAGER_HELP}")
+            else:
+                fr.footer("Press any key to continue")
+        fr.flush()
+
+        k = fr.getch()
+        if k in (-1, curses.KEY_RESIZE):
+            continue
+        if not paging:
+            return
+        note = ""
+        if k in (27, ord("q"), 10, 13, curses.KEY_ENTER, curses.KEY_BACKSPACE, 127):
+            return
+        if k in (curses.KEY_DOWN, ord("j")):
+            pg.down(width, height)
+        elif k in (curses.KEY_UP, ord("k")):
+            pg.up(width)
+        elif k in (curses.KEY_NPAGE, ord(" ")):
+            pg.down(width, height, height - 1)
+        elif k in (curses.KEY_PPAGE, ord("b")):
+            pg.up(width, height - 1)
+        elif k in (curses.KEY_HOME, ord("g")):
+            pg.home()
+        elif k in (curses.KEY_END, ord("G")):
+            pg.end(width, height)
+        elif k == curses.KEY_RIGHT and nowrap:
+            pg.xoff = min(pg.xoff + max(1, width // 2), max(0, pg.widest() - width))
+        elif k == curses.KEY_LEFT and nowrap:
+            pg.xoff = max(0, pg.xoff - max(1, width // 2))
+        elif k == ord("/"):
+            query = prompt(stdscr, "Search:", default="")
+            painted = None
+            if query and not pg.find(query):
+                note = f"not found: {query}"
+        elif k in (ord("n"), ord("N")) and pg.query:
+            if not pg.find(pg.query, forward=k == ord("n")):
+                note = f"not found: {pg.query}"
 
 
 def prompt(stdscr, prompt_text: str, default: str = "", secret: bool = False) -> str:
+    stdscr.timeout(-1)
     curses.curs_set(1)
     h, w = stdscr.getmaxyx()
     stdscr.attron(curses.A_REVERSE)
@@ -120,40 +396,95 @@ def prompt(stdscr, prompt_text: str, default: str = "", secret: bool = False) ->
     return val if val else default
 
 
+def prompt_multiline(stdscr, app_name: str, title: str, hint: str = "") -> str:
+    """
+    Read pasted multi-line text until a line containing only ".". Rows scroll when
+    the paste is taller than the screen.
+    """
+    stdscr.timeout(-1)
+    stdscr.erase()
+    draw_header(stdscr, app_name, title)
+    h, w = stdscr.getmaxyx()
+    top = 3
+    info = (hint + "  " if hint else "") + "Finish with a line containing only '.'"
+    stdscr.addnstr(2, 0, info, w - 1, curses.A_DIM)
+    stdscr.setscrreg(top, h - 1)
+    stdscr.scrollok(True)
+    curses.curs_set(1)
+    curses.echo()
+    lines: list[str] = []
+    y = top
+    try:
+        while True:
+            try:
+                ln = stdscr.getstr(y, 0, 4096).decode("utf-8", errors="replace").rstrip("\r")
+            except Exception:
+                break
+            if ln.strip() == ".":
+                break
+            lines.append(ln)
+            y = stdscr.getyx()[0] + 1
+            if y > h - 1:
+                stdscr.scroll(1)
+                y = h - 1
+    finally:
+        curses.noecho()
+        curses.curs_set(0)
+        stdscr.scrollok(False)
+        stdscr.setscrreg(0, h - 1)
+    text = "\n".join(lines).strip()
+    return text + "\n" if text else ""
+
+
 def confirm_typed(stdscr, app_name: str, title: str, text: str, expected: str) -> bool:
     msg_any_key(stdscr, app_name, title, text + f"\n\nType exactly: {expected}")
     typed = prompt(stdscr, "Confirm:", default="")
     return typed == expected
 
 
-def menu(stdscr, app_name: str, title: str, items: list[str], subtitle: str | None = None):
-    idx = 0
+def menu(stdscr, app_name: str, title: str, items: list[str], subtitle: str | None = None, idx: int = 0, changes: bool = False):
+    """
+    Returns (action, index): "open", "back", "quit", or with changes=True also
+    "changed" (a watched file changed; the caller rebuilds items and calls again with idx).
+    """
+    idx = max(0, min(idx, len(items) - 1))
+    start = 0
+    shown = None  # (frame, start, idx) currently on screen; None forces a full paint
     while True:
-        stdscr.erase()
-        draw_header(stdscr, app_name, title)
-        h, w = stdscr.getmaxyx()
-        box_h = h - 4
-        box_w = w - 4
-        draw_box(stdscr, 2, 2, box_h, box_w, title=subtitle or "Select")
-
-        y0 = 4
-        max_items = box_h - 4
-        start = 0
-        if idx >= max_items:
+        fr = frame(stdscr)
+        max_items = max(1, fr.h - 8)
+        if idx < start:
+            start = idx
+        elif idx >= start + max_items:
             start = idx - max_items + 1
-        vis = items[start : start + max_items]
-
-        for i, it in enumerate(vis):
-            y = y0 + i
-            if start + i == idx:
-                stdscr.attron(curses.A_REVERSE)
-                stdscr.addnstr(y, 4, it, box_w - 6)
-                stdscr.attroff(curses.A_REVERSE)
-            else:
-                stdscr.addnstr(y, 4, it, box_w - 6)
 
-        stdscr.refresh()
-        k = stdscr.getch()
+        def draw_row(i: int):
+            fr.row(2 + i - start, items[i], curses.A_REVERSE if i == idx else 0)
+
+        if shown is None or shown[0] is not fr:
+            fr.paint(app_name, title, subtitle or "Select", "")
+            for i in range(start, min(len(items), start + max_items)):
+                draw_row(i)
+        elif shown[1] != start:
+            for i in range(start, min(len(items), start + max_items)):
+                draw_row(i)
+        elif shown[2] != idx:
+            draw_row(shown[2])
+            draw_row(idx)
+        else:
+            fr.header(app_name, title)
+        shown = (fr, start, idx)
+        fr.flush()
+
+        k = fr.getch(changes)
+        if k == -1:
+            continue
+        if k == KEY_CHANGED:
+            return "changed", idx
+        if k == ord("J"):
+            jobs_screen(stdscr, app_name)
+            shown = None
+            continue
         if k == ord("q"):
             return "quit", None
         if k in (27, curses.KEY_BACKSPACE, 127):
@@ -165,3 +496,67 @@ def menu(stdscr, app_name: str, title: str, items: list[str], subtitle: str | No
         elif k in (curses.KEY_ENTER, 10, 13):
             return "open", idx
 
+
+def jobs_screen(stdscr, app_name: str):
+    idx = 0
+    painted = None
+    while True:
+        snap = list(reversed(jobs.RUNNER.snapshot()))
+        fr = frame(stdscr)
+        if painted is not fr:
+            fr.paint(app_name, "Jobs", f"Background jobs ({len(snap)})", "Enter: show output  •  Esc/Backspace: back")
+            painted = fr
+        else:
+            fr.header(app_name, "Jobs")
+            draw_box(fr.body, 0, 2, fr.h - 4, fr.w - 4, title=f"Background jobs ({len(snap)})")
+        idx = min(idx, max(0, len(snap) - 1))
+        max_items = fr.h - 8
+        start = max(0, idx - max_items + 1)
+        rows = []
+        for j in snap[start : start + max_items]:
+            mark = jobs.spinner() if j.state == "running" else ("✓" if j.ok else "✗")
+            first = (j.text.splitlines() or [""])[0]
+            rows.append(f"{mark} #{j.id:<3} {j.label[:28]:<28} {j.elapsed():6.1f}s  {first}")
+        if not snap:
+            rows.append("No jobs yet.")
+        for i in range(max_items):
+            if i < len(rows):
+                fr.row(2 + i, rows[i], curses.A_REVERSE if snap and start + i == idx else 0)
+            else:
+                fr.row(2 + i, "")
+        fr.flush()
+
+        k = fr.getch()
+        if k in (ord("q"), 27, curses.KEY_BACKSPACE, 127):
+            return
+        if k in (curses.KEY_DOWN, ord("j")):
+            idx = min(max(0, len(snap) - 1), idx + 1)
+        elif k in (curses.KEY_UP, ord("k")):
+            idx = max(0, idx - 1)
+        elif k in (curses.KEY_ENTER, 10, 13) and snap:
+            j = snap[idx]
+            state = "running" if j.state == "running" else ("OK" if j.ok else "failed")
+            msg_any_key(stdscr, app_name, f"Job #{j.id}", f"{j.label}\nState: {state}\n\n{j.text}")
+            painted = None
+
+
+def wait_job(stdscr, app_name: str, title: str, job: jobs.Job) -> jobs.Job | None:
+    """
+    Show a spinner until job finishes and return it. Esc leaves it running in the
+    background (its result then shows up as a notification / in the jobs screen).
+    """
+    painted = None
+    while not job.done.is_set():
+        fr = frame(stdscr)
+        if painted is not fr:
+            fr.paint(app_name, title, "Working", "Esc: keep running in background", box_h=5)
+            painted = fr
+        else:
+            fr.header(app_name, title)
+        fr.row(2, f"{jobs.spinner()} {job.label} … {job.elapsed():.1f}s")
+        fr.flush()
+        fr.foot.timeout(100)
+        k = fr.foot.getch()
+        if k in (27, curses.KEY_BACKSPACE, 127, ord("q")):
+            return None
+    return job
@@ -2,33 +2,18 @@ from __future__ import annotations
 
 import os
 import re
-import subprocess
 from datetime import datetime, timezone
 from pathlib import Path
-from shutil import which
+
+from . import transport
 
 
 def have(cmd: str) -> bool:
-    return which(cmd) is not None
+    return transport.current().have(cmd)
 
 
 def run(cmd, timeout: int = 20, check: bool = False, input_text: str | None = None):
-    try:
-        p = subprocess.run(
-            cmd,
-            text=True,
-            input=input_text,
-            capture_output=True,
-            timeout=timeout,
-            check=check,
-        )
-        return p.returncode, (p.stdout or "").rstrip("\n"), (p.stderr or "").rstrip("\n")
-    except subprocess.TimeoutExpired:
-        return 124, "", "timeout"
-    except FileNotFoundError:
-        return 127, "", "not found"
-    except subprocess.CalledProcessError as e:
-        return e.returncode, (e.stdout or "").rstrip("\n"), (e.stderr or "").rstrip("\n")
+    return transport.current().run(cmd, timeout=timeout, check=check, input_text=input_text)
 
 
 def bash(cmd: str, timeout: int = 20):
@@ -37,7 +22,7 @@ def bash(cmd: str, timeout: int = 20):
 
 def read_text(path: Path, max_bytes: int = 2_000_000) -> str:
     try:
-        data = path.read_bytes()
+        data = transport.current().read_bytes(path)
         if len(data) > max_bytes:
             data = data[:max_bytes] + b"\n\n[truncated]\n"
         return data.decode("utf-8", errors="replace")
@@ -59,3 +44,27 @@ def sanitize_name(name: str) -> str:
     name = re.sub(r"[^a-zA-Z0-9._-]", "", name)
     name = name.strip("._-")
     return name[:64] if name else ""
+
+
+_DURATION_RE = re.compile(r"^\s*(\d+)\s*([smhdw]?)\s*$")
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_duration(text: str) -> int | None:
+    """'90' / '15m' / '12h' / '30d' / '2w' -> seconds (None if unparseable)."""
+    m = _DURATION_RE.match(text or "")
+    if not m:
+        return None
+    return int(m.group(1)) * _DURATION_UNITS[m.group(2)]
+
+
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+def parse_size(text: str) -> int | None:
+    """'1048576' / '500M' / '50G' / '1.5TiB' -> bytes, binary units (None if unparseable)."""
+    m = _SIZE_RE.match(text or "")
+    if not m:
+        return None
+    return int(float(m.group(1)) * _SIZE_UNITS[m.group(2).lower()])
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+from pathlib import Path
+
+from . import transport, wg
+
+# inotify (via ctypes, Linux only) over WIREGUARD_DIR, every sharded <iface>.d/,
+# CLIENTS_DIR and every CLIENTS_DIR/<iface>/, so caches can be dropped for exactly the file that changed
+# instead of stat-checking or re-parsing on every visit. Elsewhere (other OSes, remote
+# transports, no libc) open_watcher() returns None and callers keep their old checks.
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# no IN_MODIFY: writers that go through write_atomic only ever rename into place, and a
+# hand edit is complete at IN_CLOSE_WRITE
+MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+_EVENT = struct.Struct("iIII")
+_libc = None
+
+
+def _lib():
+    global _libc
+    if _libc is None:
+        name = ctypes.util.find_library("c")
+        _libc = ctypes.CDLL(name, use_errno=True) if name else False
+    return _libc or None
+
+
+class Watcher:
+    """One inotify fd; read() returns (logical dir, name, mask) per event."""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.dirs: dict[int, Path] = {}
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add(self, directory: Path) -> bool:
+        real = transport.current().local_path(directory)
+        if real is None:
+            return False
+        wd = _lib().inotify_add_watch(self.fd, os.fsencode(real), MASK)
+        if wd < 0:
+            return False
+        self.dirs[wd] = Path(directory)
+        return True
+
+    def read(self) -> list[tuple[Path | None, str, int]]:
+        out: list[tuple[Path | None, str, int]] = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return out
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                return out
+            off = 0
+            while off + _EVENT.size <= len(buf):
+                wd, mask, _cookie, n = _EVENT.unpack_from(buf, off)
+                name = buf[off + _EVENT.size : off + _EVENT.size + n].rstrip(b"\0").decode("utf-8", "replace")
+                off += _EVENT.size + n
+                if mask & IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                out.append((self.dirs.get(wd), name, mask))
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def open_watcher() -> Watcher | None:
+    """A Watcher over the config and client dirs, or None where inotify is not usable."""
+    if not sys.platform.startswith("linux") or _lib() is None:
+        return None
+    if transport.current().local_path(wg.WIREGUARD_DIR) is None:
+        return None
+    fd = _lib().inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        return None
+    w = Watcher(fd)
+    if not w.add(wg.WIREGUARD_DIR):
+        w.close()
+        return None
+    for sub in _subdirs(wg.WIREGUARD_DIR):
+        if sub.name.endswith(".d"):
+            w.add(sub)
+    if w.add(wg.CLIENTS_DIR):
+        for sub in _subdirs(wg.CLIENTS_DIR):
+            w.add(sub)
+    return w
+
+
+def _subdirs(directory: Path) -> list[Path]:
+    real = transport.current().local_path(directory)
+    try:
+        return sorted(directory / e.name for e in os.scandir(real) if e.is_dir())
+    except OSError:
+        return []
+
+
+def changes(w: Watcher) -> list[dict]:
+    """
+    Drain pending events into changes, one per file: {"kind": "conf", "iface"} for
+    /etc/wireguard/<iface>.conf or anything in <iface>.d/, {"kind": "client", "iface", "path"} for a saved
+    client config, {"kind": "clients", "iface"} when a whole client dir came or went,
+    {"kind": "overflow"} when the kernel dropped events (drop everything).
+    """
+    out: dict[tuple, dict] = {}
+    for directory, name, mask in w.read():
+        if mask & IN_Q_OVERFLOW or directory is None:
+            out[("overflow",)] = {"kind": "overflow"}
+            continue
+        if name.startswith("."):  # write_atomic temp files and lock files
+            continue
+        if directory == wg.WIREGUARD_DIR:
+            if name.endswith(".conf"):
+                iface = name[: -len(".conf")]
+                out[("conf", iface)] = {"kind": "conf", "iface": iface}
+            elif name.endswith(".d") and mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    w.add(wg.WIREGUARD_DIR / name)
+                iface = name[: -len(".d")]
+                out[("conf", iface)] = {"kind": "conf", "iface": iface}
+            elif name == wg.CLIENTS_DIR.name and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                w.add(wg.CLIENTS_DIR)
+                for sub in _subdirs(wg.CLIENTS_DIR):
+                    w.add(sub)
+                    out[("clients", sub.name)] = {"kind": "clients", "iface": sub.name}
+        elif directory.parent == wg.WIREGUARD_DIR and directory.name.endswith(".d"):
+            iface = directory.name[: -len(".d")]
+            out[("conf", iface)] = {"kind": "conf", "iface": iface}
+        elif directory == wg.CLIENTS_DIR:
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    w.add(wg.CLIENTS_DIR / name)
+                out[("clients", name)] = {"kind": "clients", "iface": name}
+        elif directory.parent == wg.CLIENTS_DIR and name.endswith(".conf"):
+            path = str(directory / name)
+            out[("client", path)] = {"kind": "client", "iface": directory.name, "path": path}
+    return list(out.values())
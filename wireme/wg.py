@@ -2,12 +2,18 @@ from __future__ import annotations
 
 import hashlib
 import ipaddress
+import os
 import re
 import shlex
+import shutil
+import tempfile
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from . import util
+from . import transport, util
 
 WIREGUARD_DIR = Path("/etc/wireguard")
 CLIENTS_DIR = Path("/etc/wireguard/clients")
@@ -17,9 +23,11 @@ _META_RE = re.compile(r"#\s*wireme-([a-zA-Z0-9_-]+)\s*:\s*(.*)$")
 
 
 def interfaces() -> list[Path]:
-    if not WIREGUARD_DIR.exists():
-        return []
-    return sorted([p for p in WIREGUARD_DIR.glob("*.conf") if p.is_file()])
+    return transport.current().glob(WIREGUARD_DIR, "*.conf")
+
+
+def conf_path(iface: str) -> Path:
+    return WIREGUARD_DIR / f"{iface}.conf"
 
 
 def live_dump(iface: str):
@@ -43,8 +51,207 @@ def live_dump(iface: str):
     return rows[0], live
 
 
+def read_conf(conf_path: Path) -> str:
+    # full contents: util.read_text caps at 2 MB for display, which would truncate big configs on rewrite
+    if _sharded_path(conf_path):
+        return "".join(t for _, _, t in read_parts(conf_path.stem))
+    try:
+        return transport.current().read_bytes(conf_path).decode("utf-8", errors="replace")
+    except OSError:
+        return ""
+
+
 def parse_conf(conf_path: Path):
-    txt = util.read_text(conf_path)
+    if _sharded_path(conf_path):
+        return _parse_sharded(conf_path.stem)
+    return parse_conf_text(read_conf(conf_path))
+
+
+# ---------- Sharded layout ----------
+#
+# Optional: /etc/wireguard/wg0.d/interface.conf (everything before the first peer) plus
+# peers-00.conf .. peers-NN.conf, each peer in the shard picked by a hash of its
+# PublicKey. The .d directory is the source of truth; wg0.conf is assembled from it
+# (streamed) after every commit and on apply, for wg-quick/syncconf. Edits and backups
+# touch only the shards whose text changed, and parses are cached per shard.
+
+SHARD_HEAD = "interface.conf"
+ASSEMBLED_NOTE = b"# Assembled by wireme from the .d directory next to this file; edit with wireme.\n"
+
+SHARD_CACHE = 256  # parsed parts kept (LRU); keyed by transport, so fleet/api hosts share the bound
+_SHARD_PARSE: OrderedDict[tuple, tuple] = OrderedDict()
+_SHARD_MU = threading.Lock()
+
+
+def shard_dir(iface: str) -> Path:
+    return WIREGUARD_DIR / f"{iface}.d"
+
+
+def is_sharded(iface: str) -> bool:
+    return transport.current().exists(shard_dir(iface) / SHARD_HEAD)
+
+
+def _sharded_path(conf_path: Path) -> bool:
+    return Path(conf_path).parent == WIREGUARD_DIR and Path(conf_path).suffix == ".conf" and is_sharded(Path(conf_path).stem)
+
+
+def shard_parts(iface: str) -> list[Path]:
+    """interface.conf first, then the peer shards in order (their concatenation is the config)."""
+    d = shard_dir(iface)
+    return [d / SHARD_HEAD] + transport.current().glob(d, "peers-*.conf")
+
+
+def shard_of(pub: str, n: int) -> int:
+    return int(hashlib.sha256(pub.encode("utf-8")).hexdigest()[:8], 16) % n
+
+
+def read_parts(iface: str) -> list[tuple[Path, tuple[int, int], str]]:
+    t = transport.current()
+    out = []
+    for p in shard_parts(iface):
+        sig = t.stat_sig(p)
+        out.append((p, sig, t.read_bytes(p).decode("utf-8", errors="replace")))
+    return out
+
+
+def split_blocks(lines: list[str]) -> tuple[list[str], list[tuple[str, list[str]]]]:
+    """
+    Lines -> (head, [(PublicKey, block lines)]). A peer block starts at the wireme
+    metadata/blank lines right above its [Peer] and runs up to the next block.
+    """
+    starts: list[int] = []
+    floor = 0
+    for i, raw in enumerate(lines):
+        if raw.strip().lower() == "[peer]":
+            j = i
+            while j > floor and (lines[j - 1].strip() == "" or lines[j - 1].strip().startswith(f"# {META_PREFIX}")):
+                j -= 1
+            starts.append(j)
+            floor = i + 1
+    if not starts:
+        return list(lines), []
+    blocks = []
+    for a, b in zip(starts, starts[1:] + [len(lines)]):
+        block = lines[a:b]
+        pub = ""
+        for ln in block:
+            k, eq, v = ln.partition("=")
+            if eq and k.strip() == "PublicKey":
+                pub = v.strip()
+                break
+        blocks.append((pub, block))
+    return lines[: starts[0]], blocks
+
+
+def split_text(text: str, n: int) -> list[str]:
+    """Config text -> [interface part, shard 0 .. shard n-1] texts."""
+    head, blocks = split_blocks(text.splitlines(True))
+    shards: list[list[str]] = [[] for _ in range(n)]
+    for pub, block in blocks:
+        if block and not block[-1].endswith("\n"):
+            block = block[:-1] + [block[-1] + "\n"]
+        shards[shard_of(pub, n) if pub else 0].extend(block)
+    if head and not head[-1].endswith("\n"):
+        head = head[:-1] + [head[-1] + "\n"]
+    return ["".join(head)] + ["".join(s) for s in shards]
+
+
+def parse_part(path: Path):
+    """parse_conf_text of one part, cached per file until its mtime/size change."""
+    t = transport.current()
+    sig = t.stat_sig(path)
+    key = (t, str(path))
+    with _SHARD_MU:
+        hit = _SHARD_PARSE.get(key)
+        if hit is not None and hit[0] == sig:
+            _SHARD_PARSE.move_to_end(key)
+            return hit[1]
+    res = parse_conf_text(t.read_bytes(path).decode("utf-8", errors="replace"))
+    with _SHARD_MU:
+        _SHARD_PARSE[key] = (sig, res)
+        _SHARD_PARSE.move_to_end(key)
+        while len(_SHARD_PARSE) > SHARD_CACHE:
+            _SHARD_PARSE.popitem(last=False)
+    return res
+
+
+def _parse_sharded(iface: str):
+    parts = shard_parts(iface)
+    cfg, _, lines = parse_part(parts[0])
+    lines = list(lines)
+    peers: list[dict] = []
+    for p in parts[1:]:
+        _, ps, ls = parse_part(p)
+        off = len(lines)
+        peers += [dict(x, start=x["start"] + off, end=x["end"] + off) for x in ps]
+        lines += ls
+    return cfg, peers, lines
+
+
+def shard_conf(iface: str, n: int):
+    """Split iface's single config into iface.d/ (n peer shards) and re-assemble it."""
+    t = transport.current()
+    text = read_conf(conf_path(iface))
+    d = shard_dir(iface)
+    t.mkdir(d)
+    parts = split_text(text, n)
+    names = [f"peers-{i:02d}.conf" for i in range(n)]
+    for name, part in zip(names, parts[1:]):
+        t.write_atomic(d / name, part.encode("utf-8"), mode=0o600)
+    for p in t.glob(d, "peers-*.conf"):  # re-sharding into fewer files
+        if p.name not in names:
+            t.unlink(p)
+    t.write_atomic(d / SHARD_HEAD, parts[0].encode("utf-8"), mode=0o600)  # last: marks the layout live
+    assemble(iface)
+
+
+def unshard_conf(iface: str):
+    """Back to a single wg0.conf (assembled from the shards, without the note) and drop iface.d/."""
+    t = transport.current()
+    text = read_conf(conf_path(iface))
+    parts = shard_parts(iface)
+    t.unlink(parts[0])  # first: the layout is off before the single file is written
+    t.write_atomic(conf_path(iface), text.encode("utf-8"), mode=0o600)
+    for p in parts[1:]:
+        t.unlink(p)
+    real = t.local_path(shard_dir(iface))
+    if real is not None:
+        try:
+            real.rmdir()
+        except OSError:
+            pass
+
+
+def assemble(iface: str) -> Path:
+    """Concatenate iface.d/ into iface.conf for wg-quick (streamed, atomically replaced)."""
+    t = transport.current()
+    target = conf_path(iface)
+    parts = shard_parts(iface)
+    real = t.local_path(target)
+    if real is None:
+        t.write_atomic(target, ASSEMBLED_NOTE + b"".join(t.read_bytes(p) for p in parts), mode=0o600)
+        return target
+    fd, tmp = tempfile.mkstemp(dir=real.parent, prefix=f".{real.name}.")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            os.fchmod(out.fileno(), 0o600)
+            out.write(ASSEMBLED_NOTE)
+            for p in parts:
+                with open(t.local_path(p), "rb") as f:
+                    shutil.copyfileobj(f, out, 1 << 20)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, real)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return target
+
+
+def parse_conf_text(txt: str):
     lines = txt.splitlines(True)
 
     iface = {"Address": None, "ListenPort": None, "PrivateKey": None, "DNS": None}
@@ -111,21 +318,44 @@ def parse_conf(conf_path: Path):
     return iface, peers, lines
 
 
+class ConfChanged(Exception):
+    """The config changed on disk between read and write (someone bypassed the lock)."""
+
+
+def conf_sig(conf_path: Path) -> tuple[int, int]:
+    t = transport.current()
+    if _sharded_path(conf_path):
+        # newest part and total size: any shard edit moves it, re-assembling wg0.conf does not
+        sigs = [t.stat_sig(p) for p in shard_parts(Path(conf_path).stem)]
+        return max(s[0] for s in sigs), sum(s[1] for s in sigs)
+    return t.stat_sig(conf_path)
+
+
+def locked(conf_path: Path):
+    """Exclusive per-interface lock (flock on a hidden sibling file; the config itself gets replaced)."""
+    return transport.current().lock(conf_path)
+
+
+def write_conf(conf_path: Path, text: str, expect_sig: tuple[int, int] | None = None):
+    """Atomically replace conf_path, keeping its mode; raise ConfChanged if expect_sig is stale."""
+    if expect_sig is not None and conf_sig(conf_path) != expect_sig:
+        raise ConfChanged(str(conf_path))
+    transport.current().write_atomic(conf_path, text.encode("utf-8"))
+
+
 def pubkey_from_priv(priv: str):
     rc, out, _ = util.run(["wg", "pubkey"], input_text=(priv.strip() + "\n"))
     return out.strip() if rc == 0 else None
 
 
-def backup(conf_path: Path) -> Path:
-    ts = time.strftime("%Y%m%d-%H%M%S")
-    b = conf_path.with_name(conf_path.name + f".bak-{ts}")
-    b.write_bytes(conf_path.read_bytes())
-    return b
-
-
 def apply_now(iface: str):
     if not util.have("wg-quick"):
         return 1, "", "wg-quick missing"
+    if is_sharded(iface):
+        try:
+            assemble(iface)
+        except OSError as e:
+            return 1, "", f"assembling {conf_path(iface)} failed: {e}"
     return util.bash(
         f"wg syncconf {shlex.quote(iface)} <(wg-quick strip {shlex.quote(iface)})",
         timeout=20,
@@ -222,3 +452,20 @@ def client_pubkey_from_file(path: Path):
     if not priv:
         return None
     return pubkey_from_priv(priv)
+
+
+PUBKEY_JOBS = 8  # `wg pubkey` runs in flight when deriving many saved client keys
+
+
+def client_pubkeys(paths: list[Path]) -> list[str | None]:
+    """client_pubkey_from_file for many files, a few at a time."""
+    if len(paths) < 2:
+        return [client_pubkey_from_file(p) for p in paths]
+    t = transport.current()
+
+    def one(path: Path):
+        with transport.using(t):
+            return client_pubkey_from_file(path)
+
+    with ThreadPoolExecutor(max_workers=PUBKEY_JOBS) as ex:
+        return list(ex.map(one, paths))